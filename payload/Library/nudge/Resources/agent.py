@@ -0,0 +1,277 @@
+# The resident agent. Instead of launchd starting nudge every 30 minutes,
+# one process stays up with the config, device facts and softwareupdate scan
+# already loaded. It checks on its own schedule, when a watched config file
+# changes and when asked to over its control socket.
+#
+# Checks run on the agent's own thread. What a check does and how its result
+# is shown are passed in, so the agent runs without the UI, and off macOS.
+#
+# The control socket takes one command per connection, as a line of text, and
+# answers with a line of JSON:
+#   status   what the agent last decided and when it checks next
+#   check    check now and answer once the check is done
+#   reload   forget the loaded config and device facts, then check
+
+import json
+import os
+import socket
+import threading
+import time
+from datetime import datetime
+
+
+SOCKET_NAME = 'agent.sock'
+CHECK_INTERVAL = 1800
+# How often watched files are looked at
+WATCH_INTERVAL = 10
+# How long check and reload wait for the check to finish
+COMMAND_TIMEOUT = 600
+# Longest command accepted on the socket
+MAX_COMMAND_BYTES = 64
+
+
+def timestamp(seconds):
+    if seconds is None:
+        return None
+    return datetime.utcfromtimestamp(seconds).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def file_signature(path):
+    '''Return what changes when path is written, or None if it is missing'''
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+class Agent(object):
+    '''Runs check() every interval seconds, when a file in watch_paths
+    changes, and when asked to. check returns a dict to report in the
+    status. present is then called with it, to show or hide nudge. reload
+    is called before a check that should start from scratch.'''
+    def __init__(self, check, present, reload, socket_path,
+                 interval=CHECK_INTERVAL, watch_paths=(), log=None,
+                 clock=time.time):
+        self.check = check
+        self.present = present
+        self.reload = reload
+        self.socket_path = socket_path
+        self.interval = interval
+        self.watch_paths = list(watch_paths)
+        self.log = log or (lambda text: None)
+        self.clock = clock
+        self.started = clock()
+        self.next_check = self.started
+        self.checks_started = 0
+        self.checks_done = 0
+        self.last_check = None
+        self.last_trigger = None
+        self.result = None
+        self.error = None
+        self.signatures = dict(
+            (path, file_signature(path)) for path in self.watch_paths)
+        self._requested = False
+        self._reload_requested = False
+        self._stopping = False
+        self._cond = threading.Condition()
+        self._server = None
+        self._threads = []
+
+    def start(self):
+        '''Open the control socket and start checking, the first check runs
+        straight away'''
+        # Only one agent runs per user, a socket left behind is stale
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self.socket_path)
+        os.chmod(self.socket_path, 0o600)
+        self._server.listen(5)
+        for target, name in ((self._work, 'agent'),
+                             (self._serve, 'agent-socket')):
+            thread = threading.Thread(target=target, name=name)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._server is not None:
+            self._server.close()
+            try:
+                os.unlink(self.socket_path)
+            except OSError:
+                pass
+
+    def request(self, reload=False):
+        '''Ask for a check as soon as possible. Returns the number of the
+        check to wait for with wait().'''
+        with self._cond:
+            self._requested = True
+            self._reload_requested = self._reload_requested or reload
+            self._cond.notify_all()
+            return self.checks_started + 1
+
+    def wait(self, number, timeout=None):
+        '''Wait for the check with this number to finish. Returns True if
+        it has.'''
+        deadline = None if timeout is None else self.clock() + timeout
+        with self._cond:
+            while self.checks_done < number and not self._stopping:
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - self.clock()
+                    if remaining <= 0:
+                        break
+                self._cond.wait(remaining)
+            return self.checks_done >= number
+
+    def status(self):
+        with self._cond:
+            return {
+                'pid': os.getpid(),
+                'started': timestamp(self.started),
+                'checks': self.checks_done,
+                'checking': self.checks_started > self.checks_done,
+                'last_check': timestamp(self.last_check),
+                'last_trigger': self.last_trigger,
+                'result': self.result,
+                'error': self.error,
+                'next_check': timestamp(self.next_check),
+            }
+
+    def handle_command(self, command):
+        '''Return the answer to a control socket command'''
+        if command == 'status':
+            return self.status()
+        if command in ('check', 'reload'):
+            number = self.request(reload=command == 'reload')
+            if not self.wait(number, COMMAND_TIMEOUT):
+                return dict(self.status(), error='Timed out waiting for the '
+                                                 'check')
+            return self.status()
+        return {'error': 'Unknown command: %s' % command}
+
+    def changed_paths(self):
+        '''Return the watched files that changed since the last look'''
+        changed = []
+        for path in self.watch_paths:
+            signature = file_signature(path)
+            if signature != self.signatures.get(path):
+                self.signatures[path] = signature
+                changed.append(path)
+        return changed
+
+    def _next_trigger(self):
+        '''Wait until it is time to check and return why, or None to stop'''
+        with self._cond:
+            while not self._stopping:
+                if self._requested:
+                    reload = self._reload_requested
+                    self._requested = self._reload_requested = False
+                    return 'reload' if reload else 'requested'
+                now = self.clock()
+                if now >= self.next_check:
+                    return 'scheduled'
+                timeout = self.next_check - now
+                if self.watch_paths:
+                    timeout = min(timeout, WATCH_INTERVAL)
+                self._cond.wait(timeout)
+                if self._stopping or self._requested:
+                    continue
+                changed = self.changed_paths()
+                if changed:
+                    self.log('Agent: %s changed' % ', '.join(changed))
+                    return 'changed'
+        return None
+
+    def _work(self):
+        while True:
+            trigger = self._next_trigger()
+            if trigger is None:
+                return
+            self.run_check(trigger)
+
+    def run_check(self, trigger):
+        '''Check now, trigger says why'''
+        with self._cond:
+            self.checks_started += 1
+        result = None
+        error = None
+        try:
+            if trigger in ('reload', 'changed'):
+                self.reload()
+            result = self.check()
+        except (Exception, SystemExit) as err:
+            # nudge exits when it can't get a config, that only fails
+            # this check
+            error = '%s: %s' % (type(err).__name__, err)
+            self.log('Agent: check failed, %s' % error)
+        with self._cond:
+            self.checks_done += 1
+            self.last_check = self.clock()
+            self.last_trigger = trigger
+            self.result = result
+            self.error = error
+            self.next_check = self.last_check + self.interval
+            self._cond.notify_all()
+        if result is None:
+            return
+        try:
+            self.present(result)
+        except Exception as err:
+            # Keep checking, the next check presents again
+            self.log('Agent: could not present the check, %s: %s' % (
+                type(err).__name__, err))
+
+    def _serve(self):
+        while not self._stopping:
+            try:
+                connection, _ = self._server.accept()
+            except OSError:
+                # Closed by stop()
+                return
+            thread = threading.Thread(
+                target=self._handle_connection, args=(connection,),
+                name='agent-command')
+            thread.daemon = True
+            thread.start()
+
+    def _handle_connection(self, connection):
+        with connection:
+            connection.settimeout(5)
+            data = b''
+            try:
+                while b'\n' not in data and len(data) < MAX_COMMAND_BYTES:
+                    chunk = connection.recv(MAX_COMMAND_BYTES)
+                    if not chunk:
+                        break
+                    data += chunk
+                command = data.decode('utf-8', 'replace').strip()
+                reply = self.handle_command(command)
+                connection.sendall(
+                    json.dumps(reply, default=str).encode('utf-8') + b'\n')
+            except OSError:
+                pass
+
+
+def send_command(socket_path, command, timeout=COMMAND_TIMEOUT + 10):
+    '''Send a command to the running agent and return its answer. Raises
+    OSError if there is no agent.'''
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    with client:
+        client.settimeout(timeout)
+        client.connect(socket_path)
+        client.sendall(command.encode('utf-8') + b'\n')
+        data = b''
+        while not data.endswith(b'\n'):
+            chunk = client.recv(65536)
+            if not chunk:
+                break
+            data += chunk
+    if not data:
+        raise OSError('No answer from the agent')
+    return json.loads(data.decode('utf-8'))
@@ -0,0 +1,169 @@
+# Remote logo and screenshot images. Each download is stored under the
+# SHA-256 of its content, so two URLs serving the same image share one file.
+# The index maps each URL to its content and the validators it was served
+# with, so an unchanged image only costs a 304. The least recently used
+# images are evicted once the cache grows past its size limit. Downloads over
+# the per image limit are cancelled as soon as the Content-Length or the
+# bytes received go past it.
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+# Larger downloads are discarded
+MAX_ASSET_BYTES = 10 * 1024 * 1024
+# Least recently used images are evicted past this
+MAX_CACHE_BYTES = 50 * 1024 * 1024
+
+
+def is_remote(path):
+    return path.startswith(('http://', 'https://'))
+
+
+def file_digest(path):
+    '''Return the SHA-256 of a file's contents'''
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def over_limit(connection, max_bytes):
+    '''True if the expected or received length of a gurl connection is
+    past max_bytes'''
+    return max(connection.expectedLength, connection.bytesReceived) > max_bytes
+
+
+class AssetCache(object):
+    '''Downloads remote images into cache_dir. download is called with a
+    gurl options dict and returns the finished connection. It should cancel
+    the download once over_limit() is true for the options' max_bytes.'''
+    def __init__(self, cache_dir, download, log,
+                 max_asset_bytes=MAX_ASSET_BYTES,
+                 max_cache_bytes=MAX_CACHE_BYTES):
+        self.cache_dir = cache_dir
+        self.download = download
+        self.log = log
+        self.max_asset_bytes = max_asset_bytes
+        self.max_cache_bytes = max_cache_bytes
+        self.index_path = os.path.join(cache_dir, 'index.json')
+        self._lock = threading.Lock()
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir, exist_ok=True)
+        try:
+            with open(self.index_path) as f:
+                self.index = json.load(f)
+        except (IOError, OSError, ValueError):
+            self.index = {}
+
+    def content_path(self, digest):
+        return os.path.join(self.cache_dir, digest)
+
+    def cached_path(self, url):
+        '''Return the cached file for url, or None'''
+        entry = self.index.get(url)
+        if entry and os.path.isfile(self.content_path(entry['sha256'])):
+            return self.content_path(entry['sha256'])
+        return None
+
+    def path_for(self, url):
+        '''Return a local file with the image at url, revalidating the cached
+        copy. Falls back to the cached copy if the download fails. Returns
+        None if there is neither.'''
+        cached_path = self.cached_path(url)
+        fd, download_path = tempfile.mkstemp(
+            prefix='download-', dir=self.cache_dir)
+        os.close(fd)
+        try:
+            options = {'url': url, 'file': download_path,
+                       'name': os.path.basename(url),
+                       'follow_redirects': 'https',
+                       'download_only_if_changed': True,
+                       'max_bytes': self.max_asset_bytes}
+            # Another thread may evict the entry at any point
+            entry = self.index.get(url)
+            if cached_path and entry is not None:
+                options['cache_data'] = entry.get('headers', {})
+            connection = self.download(options)
+            if connection.status == 304 and cached_path:
+                self.log('Asset cache hit: %s not modified' % url)
+                return self._used(url, cached_path)
+            # A cancelled download can look finished, so check the limit
+            # before the status
+            if over_limit(connection, self.max_asset_bytes):
+                self.log('%s is over the %s byte limit' % (
+                    url, self.max_asset_bytes))
+                return self._used(url, cached_path)
+            if (connection.error is not None or
+                    not str(connection.status).startswith('2')):
+                self.log('Unable to download %s' % url)
+                return self._used(url, cached_path)
+            size = os.path.getsize(download_path)
+
+            digest = file_digest(download_path)
+            path = self.content_path(digest)
+            if not os.path.isfile(path):
+                os.rename(download_path, path)
+            headers = dict((str(k).lower(), str(v)) for k, v in
+                           (connection.headers or {}).items())
+            with self._lock:
+                self.index[url] = {
+                    'sha256': digest, 'size': size, 'used': time.time(),
+                    'headers': dict((k, headers[k])
+                                    for k in ('etag', 'last-modified')
+                                    if k in headers)}
+                self._evict(keep=digest)
+                self._save()
+            self.log('Asset cache miss: downloaded %s' % url)
+            return path
+        finally:
+            if os.path.isfile(download_path):
+                os.unlink(download_path)
+
+    def _used(self, url, path):
+        if path:
+            with self._lock:
+                entry = self.index.get(url)
+                if entry is not None:
+                    entry['used'] = time.time()
+                    self._save()
+        return path
+
+    def _evict(self, keep):
+        '''Drop the least recently used images until the cache fits'''
+        sizes = {}
+        used = {}
+        for entry in self.index.values():
+            sizes[entry['sha256']] = entry['size']
+            used[entry['sha256']] = max(used.get(entry['sha256'], 0),
+                                        entry['used'])
+        total = sum(sizes.values())
+        for digest in sorted(used, key=used.get):
+            if total <= self.max_cache_bytes:
+                break
+            if digest == keep:
+                continue
+            for url in [u for u, e in self.index.items()
+                        if e['sha256'] == digest]:
+                del self.index[url]
+            try:
+                os.unlink(self.content_path(digest))
+            except OSError:
+                pass
+            total -= sizes[digest]
+
+    def _save(self):
+        try:
+            # Write then rename so a concurrent reader never sees a partial
+            # file
+            tmp_path = self.index_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self.index, f)
+            os.rename(tmp_path, self.index_path)
+        except (IOError, OSError):
+            pass
@@ -0,0 +1,445 @@
+# Validating and compiling nudge.json. Compiling checks every key against
+# SCHEMA, fills in the defaults and marks the result, so a config that was
+# compiled ahead of time with nudge-compile is loaded without checking it
+# again. The client keeps the compiled form as JSON, keyed by the digest of
+# the config it came from, so an unchanged config is not checked again. The
+# compiled format is part of the key, so a cache left by an older nudge is
+# compiled again rather than used.
+#
+# A config can also carry rules, for cohorts and staged rollouts - see
+# targeting.py. The rules are compiled along with the rest, and their index
+# is built when the config is loaded and kept with it.
+
+import hashlib
+import json
+import os
+from datetime import datetime
+
+import decision
+import logwriter
+import targeting
+import versions
+
+
+# Marks a compiled config, and the compiled format it is in. Format 3 writes
+# every date in full, like 2019-12-31-00:00.
+COMPILED_KEY = 'nudge_compiled'
+COMPILED_FORMAT = 3
+# Where the client keeps the compiled config, in its cache directory
+CACHE_NAME = 'compiled_config.json'
+
+
+def check_string(value):
+    if not isinstance(value, str):
+        return 'expected a string'
+
+
+def check_bool(value):
+    if not isinstance(value, bool):
+        return 'expected true or false'
+
+
+def check_number(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return 'expected a number'
+
+
+def check_date(value):
+    if not isinstance(value, str):
+        return 'expected a date like 2019-12-31-00:00'
+    try:
+        datetime.strptime(value, decision.DATE_FORMAT)
+    except ValueError:
+        return 'expected a date like 2019-12-31-00:00'
+
+
+def check_version(value):
+    if not isinstance(value, str) or not versions.VERSION.match(value):
+        return 'expected a version like 10.14.6'
+
+
+def check_build(value):
+    if not isinstance(value, str) or not versions.BUILD.match(value):
+        return 'expected a build like 18G103'
+
+
+def check_log_level(value):
+    if value not in logwriter.LEVELS:
+        return 'expected debug, info, warning or error'
+
+
+def check_strings(value):
+    if (not isinstance(value, list) or
+            not all(isinstance(item, str) for item in value)):
+        return 'expected a list of strings'
+
+
+def check_percent(value):
+    if isinstance(value, list) and len(value) == 2:
+        start, end = value
+    else:
+        start, end = 0, value
+    if (check_number(start) or check_number(end) or
+            not 0 <= start <= end <= 100):
+        return 'expected a percentage or [start, end] from 0 to 100'
+
+
+def check_rule_match(value):
+    if value not in targeting.MATCH_ORDERS:
+        return 'expected first or priority'
+
+
+def or_false(check):
+    '''Allow false, used to turn an optional setting off, as well'''
+    def check_or_false(value):
+        if value is not False:
+            return check(value)
+    return check_or_false
+
+
+# Every preference nudge reads, with its default and how to check it
+SCHEMA = {
+    'button_sub_titletext': ('Click on the button below.', check_string),
+    'button_title_text': ('Ready to start the update?', check_string),
+    'cut_off_date': (False, or_false(check_date)),
+    'cut_off_date_warning': (3, check_number),
+    'days_between_notifications': (0, check_number),
+    'dismissal_count_threshold': (9999999, check_number),
+    'local_url_for_upgrade': (False, or_false(check_string)),
+    'log_level': ('info', check_log_level),
+    'log_to_nslog': (True, check_bool),
+    'logo_path': ('company_logo.png', check_string),
+    'main_subtitle_text': ('A friendly reminder from your local IT team',
+                           check_string),
+    'main_title_text': ('macOS Update', check_string),
+    'minimum_os_sub_build_version': ('10A00', check_build),
+    'minimum_os_version': ('10.14.6', check_version),
+    'more_info_url': (False, or_false(check_string)),
+    'no_timer': (False, check_bool),
+    'paragraph1_text': ('A fully up-to-date device is required to ensure that '
+                        'IT can your accurately protect your computer.',
+                        check_string),
+    'paragraph2_text': ('If you do not update your computer, you may lose '
+                        'access to some items necessary for your day-to-day '
+                        'tasks.', check_string),
+    'paragraph3_text': ('To begin the update, simply click on the button '
+                        'below and follow the provided steps.', check_string),
+    'paragraph_title_text': ('A security update is required on your machine.',
+                             check_string),
+    'path_to_app': ('/Applications/Install macOS Mojave.app', check_string),
+    'random_delay': (False, check_bool),
+    'screenshot_path': ('update_ss.png', check_string),
+    'timer_day_1': (600, check_number),
+    'timer_day_3': (7200, check_number),
+    'timer_elapsed': (10, check_number),
+    'timer_final': (60, check_number),
+    'timer_initial': (14400, check_number),
+    'update_minor': (False, check_bool),
+    'update_minor_days': (14, check_number),
+    'update_scan_background': (False, check_bool),
+    'update_scan_ttl': (21600, check_number),
+}
+
+# Keys of a software_updates entry, and whether they are required
+SOFTWARE_UPDATE_SCHEMA = {
+    'name': (True, check_string),
+    'force_install_date': (True, check_date),
+    'grace_period_days': (False, check_number),
+}
+
+# Top level keys for rules, with their default and how to check them
+RULES_SCHEMA = {
+    'rollout_seed': ('', check_string),
+    'rule_match': ('first', check_rule_match),
+}
+
+# Keys of a rule besides preferences and software_updates, with their
+# default
+RULE_SCHEMA = {
+    'match': ({}, None),
+    'name': (None, check_string),
+    'priority': (0, check_number),
+}
+
+# What a rule can match devices on. A rule matches a device if every key it
+# has matches.
+MATCH_SCHEMA = {
+    'models': check_strings,
+    'os_max': check_version,
+    'os_min': check_version,
+    'percent': check_percent,
+    'serials': check_strings,
+}
+
+
+def validate_preferences(nudge_prefs, where=''):
+    '''Return a list of everything wrong with a preferences object'''
+    errors = []
+    for key, value in sorted(nudge_prefs.items()):
+        if key not in SCHEMA:
+            errors.append('%sUnknown preference: %s' % (where, key))
+            continue
+        error = SCHEMA[key][1](value)
+        if error:
+            errors.append('%s%s: %s, got %r' % (where, key, error, value))
+    return errors
+
+
+def validate_software_updates(software_updates, where='software_updates'):
+    '''Return a list of everything wrong with a software_updates list'''
+    if not isinstance(software_updates, list):
+        return ['%s: expected a list' % where]
+    errors = []
+    for index, item in enumerate(software_updates):
+        item_where = '%s[%s]' % (where, index)
+        if not isinstance(item, dict):
+            errors.append('%s: expected an object' % item_where)
+            continue
+        for key in item:
+            if key not in SOFTWARE_UPDATE_SCHEMA:
+                errors.append('%s: unknown key %s' % (item_where, key))
+        for key, (required, check) in sorted(SOFTWARE_UPDATE_SCHEMA.items()):
+            if key not in item:
+                if required:
+                    errors.append('%s: missing %s' % (item_where, key))
+                continue
+            error = check(item[key])
+            if error:
+                errors.append('%s.%s: %s, got %r' % (
+                    item_where, key, error, item[key]))
+    return errors
+
+
+def validate_match(match, where):
+    '''Return a list of everything wrong with the match of a rule'''
+    if not isinstance(match, dict):
+        return ['%s: expected an object' % where]
+    errors = []
+    for key, value in sorted(match.items()):
+        if key not in MATCH_SCHEMA:
+            errors.append('%s: unknown key %s' % (where, key))
+            continue
+        error = MATCH_SCHEMA[key](value)
+        if error:
+            # Serial lists can be long, don't repeat them back
+            errors.append('%s.%s: %s' % (where, key, error))
+    return errors
+
+
+def validate_rules(rules):
+    '''Return a list of everything wrong with the rules list'''
+    if not isinstance(rules, list):
+        return ['rules: expected a list']
+    errors = []
+    for index, rule in enumerate(rules):
+        where = 'rules[%s]' % index
+        if not isinstance(rule, dict):
+            errors.append('%s: expected an object' % where)
+            continue
+        for key in rule:
+            if key not in RULE_SCHEMA and key not in (
+                    'preferences', 'software_updates'):
+                errors.append('%s: unknown key %s' % (where, key))
+        for key in ('name', 'priority'):
+            if key in rule:
+                error = RULE_SCHEMA[key][1](rule[key])
+                if error:
+                    errors.append('%s.%s: %s, got %r' % (
+                        where, key, error, rule[key]))
+        errors.extend(validate_match(rule.get('match', {}), where + '.match'))
+        rule_prefs = rule.get('preferences', {})
+        if isinstance(rule_prefs, dict):
+            errors.extend(validate_preferences(
+                rule_prefs, '%s.preferences: ' % where))
+        else:
+            errors.append('%s.preferences: expected an object' % where)
+        if 'software_updates' in rule:
+            errors.extend(validate_software_updates(
+                rule['software_updates'], where + '.software_updates'))
+    return errors
+
+
+def validate(nudge_json):
+    '''Return a list of everything wrong with nudge_json'''
+    if not isinstance(nudge_json, dict):
+        return ['The config must be a JSON object']
+    errors = []
+    for key in nudge_json:
+        if key not in ('preferences', 'software_updates', 'rules',
+                       COMPILED_KEY) and key not in RULES_SCHEMA:
+            errors.append('Unknown key: %s' % key)
+
+    nudge_prefs = nudge_json.get('preferences')
+    if not isinstance(nudge_prefs, dict):
+        errors.append('preferences: expected an object')
+        nudge_prefs = {}
+    errors.extend(validate_preferences(nudge_prefs))
+    errors.extend(validate_software_updates(
+        nudge_json.get('software_updates', [])))
+
+    for key, (_, check) in sorted(RULES_SCHEMA.items()):
+        if key in nudge_json:
+            error = check(nudge_json[key])
+            if error:
+                errors.append('%s: %s, got %r' % (key, error, nudge_json[key]))
+    errors.extend(validate_rules(nudge_json.get('rules', [])))
+    return errors
+
+
+def is_compiled(nudge_json):
+    return (isinstance(nudge_json, dict) and
+            nudge_json.get(COMPILED_KEY) == COMPILED_FORMAT)
+
+
+def compile_software_updates(software_updates):
+    '''Return the valid entries of a software_updates list'''
+    if not isinstance(software_updates, list):
+        return []
+    compiled_updates = []
+    for item in software_updates:
+        if not isinstance(item, dict):
+            continue
+        compiled_item = {}
+        for key, (required, check) in SOFTWARE_UPDATE_SCHEMA.items():
+            if key in item and not check(item[key]):
+                compiled_item[key] = item[key]
+            elif required:
+                break
+        else:
+            compiled_updates.append(compiled_item)
+    return compiled_updates
+
+
+def compile_rule(rule, index):
+    '''Return the rule with every key set, or None if it can't be used. A
+    rule with anything wrong in its match is dropped rather than left to
+    match more devices than it should.'''
+    if not isinstance(rule, dict):
+        return None
+    match = rule.get('match', {})
+    if validate_match(match, 'match'):
+        return None
+    compiled_rule = {}
+    for key, (default, check) in RULE_SCHEMA.items():
+        value = rule.get(key, default)
+        compiled_rule[key] = default if check and check(value) else value
+    if compiled_rule['name'] is None:
+        compiled_rule['name'] = 'rules[%s]' % index
+    if 'percent' in match:
+        compiled_rule['match'] = dict(match, percent=list(
+            targeting.percent_range(match['percent'])))
+    # Only the preferences the rule sets, the rest come from the config
+    rule_prefs = rule.get('preferences')
+    if not isinstance(rule_prefs, dict):
+        rule_prefs = {}
+    compiled_rule['preferences'] = dict(
+        (key, value) for key, value in rule_prefs.items()
+        if key in SCHEMA and not SCHEMA[key][1](value))
+    if 'software_updates' in rule:
+        compiled_rule['software_updates'] = compile_software_updates(
+            rule['software_updates'])
+    return compiled_rule
+
+
+def compile_config(nudge_json):
+    '''Return nudge_json with every preference set. Unknown keys are dropped
+    and invalid values replaced by their default, so validate() first to
+    find out about them.'''
+    nudge_prefs = nudge_json.get('preferences')
+    if not isinstance(nudge_prefs, dict):
+        nudge_prefs = {}
+    compiled_prefs = {}
+    for key, (default, check) in SCHEMA.items():
+        value = nudge_prefs.get(key, default)
+        compiled_prefs[key] = default if check(value) else value
+
+    compiled = {COMPILED_KEY: COMPILED_FORMAT, 'preferences': compiled_prefs,
+                'software_updates': compile_software_updates(
+                    nudge_json.get('software_updates', []))}
+
+    for key, (default, check) in RULES_SCHEMA.items():
+        value = nudge_json.get(key, default)
+        compiled[key] = default if check(value) else value
+    rules = nudge_json.get('rules', [])
+    if not isinstance(rules, list):
+        rules = []
+    compiled['rules'] = [
+        compiled_rule for compiled_rule in (
+            compile_rule(rule, index) for index, rule in enumerate(rules))
+        if compiled_rule is not None]
+    return convert_dates(compiled, write_date)
+
+
+def write_date(value):
+    '''Return a valid date written in full'''
+    return datetime.strptime(value, decision.DATE_FORMAT).strftime(
+        decision.DATE_FORMAT)
+
+
+def read_date(value):
+    '''Return a date written in full as a datetime, without strptime'''
+    return datetime.fromisoformat(value[:10] + ' ' + value[11:])
+
+
+def convert_dates(nudge_json, convert):
+    '''Replace every date in a compiled config with convert(date), in place,
+    and return it'''
+    for holder in [nudge_json] + nudge_json['rules']:
+        nudge_prefs = holder['preferences']
+        if nudge_prefs.get('cut_off_date'):
+            nudge_prefs['cut_off_date'] = convert(nudge_prefs['cut_off_date'])
+        for item in holder.get('software_updates', []):
+            item['force_install_date'] = convert(item['force_install_date'])
+    return nudge_json
+
+
+def parse_dates(nudge_json):
+    '''Parse the dates of a compiled config in place and return it'''
+    return convert_dates(nudge_json, read_date)
+
+
+def prepare(nudge_json):
+    '''Return a compiled config ready to use: its dates parsed and the
+    index of its rules built. nudge_json is changed in place.'''
+    nudge_json = parse_dates(nudge_json)
+    if nudge_json['rules']:
+        nudge_json[targeting.INDEX_KEY] = targeting.RuleIndex(
+            nudge_json['rules'], nudge_json['rule_match'],
+            nudge_json['rollout_seed'])
+    return nudge_json
+
+
+def load(json_raw, cache_path, log):
+    '''Return the config in json_raw, compiled and with its dates parsed.
+    A config that wasn't compiled with nudge-compile is validated first and
+    anything wrong with it logged. The compiled config is kept in cache_path
+    for as long as json_raw and the compiled format don't change.'''
+    if isinstance(json_raw, str):
+        json_raw = json_raw.encode('utf-8')
+    digest = hashlib.sha256(json_raw).hexdigest()
+    try:
+        with open(cache_path) as f:
+            cached = json.load(f)
+        if cached['digest'] == digest and is_compiled(cached['config']):
+            return prepare(cached['config'])
+    except (IOError, OSError, ValueError, KeyError, TypeError):
+        # Missing, unreadable or not a cache
+        pass
+
+    nudge_json = json.loads(json_raw)
+    if is_compiled(nudge_json):
+        # Already as quick to load as the cache would be
+        return prepare(nudge_json)
+    for error in validate(nudge_json):
+        log('Config: %s' % error)
+    nudge_json = compile_config(nudge_json)
+
+    try:
+        # Write then rename so a concurrent reader never sees a partial file
+        tmp_path = cache_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'digest': digest, 'config': nudge_json}, f)
+        os.rename(tmp_path, cache_path)
+    except (IOError, OSError):
+        pass
+    return prepare(nudge_json)
@@ -0,0 +1,302 @@
+# The compliance decision nudge makes on every run, kept free of side effects.
+# evaluate() takes the config, the device facts, the softwareupdate results
+# and the current time, and returns a Plan saying whether to show the UI and
+# how aggressive it should be. Acting on the Plan is left to the caller.
+
+import collections
+from datetime import datetime, timedelta
+
+import versions
+
+
+# Format of cut_off_date and force_install_date
+DATE_FORMAT = '%Y-%m-%d-%H:%M'
+# Format of the first_seen/last_seen preferences
+SEEN_FORMAT = '%Y-%m-%d %H:%M:%S +0000'
+
+# What the minor update path decides on. restart_required is None if it is
+# unknown, which is treated as required.
+ScanResult = collections.namedtuple(
+    'ScanResult', ['pending_updates', 'restart_required', 'updates'])
+
+Plan = collections.namedtuple('Plan', [
+    'show',                 # True if the UI should be shown
+    'reason',               # Why, for logging
+    'error',                # True if nudge should exit non-zero
+    'needs_scan',           # True if a softwareupdate scan is needed first
+    'reset_seen',           # True if first_seen/last_seen should be cleared
+    'upgrade',              # 'major', 'minor' or None
+    'tier',                 # 'elapsed', 'final', 'day_1', 'day_3',
+                            # 'initial' or None without a deadline
+    'timer',                # Seconds between bringing the UI back, or None
+    'show_ok',
+    'show_understand',
+    'show_more_info',
+    'show_days_remaining',
+    'days_remaining',
+    'seconds_remaining',
+])
+
+
+def skip(reason, error=False, needs_scan=False, reset_seen=False,
+         upgrade=None):
+    '''Return a Plan that does not show the UI'''
+    return Plan(False, reason, error, needs_scan, reset_seen, upgrade, None,
+                None, False, False, False, False, None, None)
+
+
+def parse_date(value):
+    '''Return a cut_off_date or force_install_date as a datetime. Compiled
+    configs have them parsed already.'''
+    if isinstance(value, datetime):
+        return value
+    return datetime.strptime(value, DATE_FORMAT)
+
+
+def os_version_major(os_version):
+    '''Return the major part of an OS version, or None if it can't be
+    determined'''
+    # Handle Big Sur and higher since major version is now the first portion
+    split_os = os_version.split('.')
+    if versions.version(split_os[0]) >= '11':
+        return versions.version(split_os[0])
+    # Sometimes the OS version will return without the dot release
+    # For example, it may show as 10.15.0 instead of 10.15
+    if len(split_os) == 3:
+        return versions.version(os_version.rsplit('.', 1)[0])
+    elif len(split_os) == 2:
+        return versions.version(os_version)
+    return None
+
+
+def minimum_os_version_major(minimum_os_version):
+    '''Return the major part of minimum_os_version'''
+    minimum_major = minimum_os_version.rsplit('.', 1)[0]
+    # If the admin put '10.14' and not '10.14.0' the major version will be '10'
+    # so make sure this error doesn't happen and the comparison doesn't fail.
+    if '.' not in minimum_major:
+        minimum_major = minimum_os_version
+    # Handle Big Sur and higher since major version is now the first portion
+    split_minimum_major = minimum_major.split('.')
+    if versions.version(split_minimum_major[0]) >= '11':
+        minimum_major = split_minimum_major[0]
+    return minimum_major
+
+
+class UpdateCatalog(object):
+    '''The software_updates section compiled into an index of deadlines.
+    A name ending in * matches every product key or label starting with the
+    rest of it. grace_period_days pushes an entry's force_install_date back.
+    Entries without a valid force_install_date are left out.'''
+    def __init__(self, software_updates):
+        self.exact = {}
+        self.prefixes = {}
+        self.invalid = []
+        for item in software_updates:
+            name = str(item.get('name', ''))
+            try:
+                deadline = parse_date(item['force_install_date'])
+                deadline += timedelta(
+                    days=float(item.get('grace_period_days', 0)))
+            except (KeyError, TypeError, ValueError):
+                self.invalid.append(name)
+                continue
+            if name.endswith('*'):
+                index, name = self.prefixes, name[:-1]
+            else:
+                index = self.exact
+            if name not in index or deadline < index[name]:
+                index[name] = deadline
+        # Only the prefix lengths in use need to be tried for each name
+        self.prefix_lengths = sorted(set(len(p) for p in self.prefixes))
+
+    def deadline(self, name):
+        '''Return the earliest deadline matching name, or None'''
+        deadlines = [self.prefixes[name[:length]]
+                     for length in self.prefix_lengths
+                     if length <= len(name) and name[:length] in self.prefixes]
+        if name in self.exact:
+            deadlines.append(self.exact[name])
+        return min(deadlines) if deadlines else None
+
+    def earliest(self, names):
+        '''Return the earliest deadline matching any of names, or None'''
+        deadlines = [deadline for deadline in map(self.deadline, names)
+                     if deadline is not None]
+        return min(deadlines) if deadlines else None
+
+
+# The last catalog compiled, so evaluating the same config again reuses it
+_compiled = (None, None)
+
+
+def update_catalog(software_updates):
+    '''Return the UpdateCatalog for a software_updates list, reusing the
+    previous one if it is the same list'''
+    global _compiled
+    if isinstance(software_updates, UpdateCatalog):
+        return software_updates
+    if _compiled[0] is not software_updates:
+        _compiled = (software_updates, UpdateCatalog(software_updates))
+    return _compiled[1]
+
+
+def get_minimum_minor_update_days(update_minor_days, pending_apple_updates,
+                                  nudge_su_prefs, updates=None, now=None):
+    '''Lowest number of days before something is forced
+    Software updates are matched on their product key, or on their
+    softwareupdate label if the parsed updates are passed in. nudge_su_prefs
+    is the software_updates list or an UpdateCatalog of it.'''
+    if pending_apple_updates == [] or pending_apple_updates is None:
+        return update_minor_days
+
+    pending_names = [str(update['Product Key']) for update in pending_apple_updates]
+    if updates:
+        pending_names.extend(update.label for update in updates)
+    deadline = update_catalog(nudge_su_prefs).earliest(pending_names)
+    if deadline is None:
+        return update_minor_days
+    todays_date = now or datetime.utcnow()
+    date_diff_seconds = (deadline - todays_date).total_seconds()
+    return min(update_minor_days, int(round(date_diff_seconds / 86400)))
+
+
+def evaluate(nudge_json, facts, now, scan=None, first_seen=None,
+             last_seen=None):
+    '''Decide what nudge should do.
+    nudge_json is the parsed config, facts the DeviceFacts and now the current
+    UTC datetime. scan is a ScanResult once softwareupdate has been run for
+    the minor update path, first_seen and last_seen the stored preference
+    strings.'''
+    nudge_prefs = nudge_json['preferences']
+    minimum_os_version = nudge_prefs.get('minimum_os_version', '10.14.6')
+    minimum_os_sub_build_version = nudge_prefs.get(
+        'minimum_os_sub_build_version', '10A00')
+    update_minor = (nudge_prefs.get('update_minor', False) and
+                    minimum_os_sub_build_version != '10A00')
+    minimum_major = minimum_os_version_major(minimum_os_version)
+
+    os_version = versions.version(facts.os_version)
+    os_major = os_version_major(facts.os_version)
+    os_build = versions.build(facts.os_build)
+    # Unreadable versions sort below every other, don't nudge on them
+    if not os_version.parsed:
+        return skip('Cannot read the OS version: %r' % facts.os_version,
+                    error=True)
+    if update_minor and not os_build.parsed:
+        return skip('Cannot read the OS build: %r' % facts.os_build,
+                    error=True)
+    if os_major is None:
+        return skip('Cannot reliably determine OS major version.', error=True)
+
+    # Bail if python framework was not built on Big Sur
+    if os_major == '10.16':
+        return skip('Detected Big Sur running version 10.16. Nudge cannot be '
+                    'reliably enforced. To fix this, create a '
+                    'Python.framework file on a machine running Big Sur or '
+                    'higher.', error=True)
+
+    # Example 10.14.6 (18G103) >=  10.14.6 (18G84)
+    if update_minor and os_build >= versions.build(minimum_os_sub_build_version):
+        return skip('OS version sub build is higher or equal to the minimum '
+                    'threshold: %s' % os_build)
+    # Example: 10.14.6 >= 10.14.6
+    if not update_minor and os_version >= versions.version(minimum_os_version):
+        return skip('OS version is higher or equal to the minimum threshold: '
+                    '%s' % os_version)
+    # Example: 10.14/10.14.0 >= 10.14
+    if not update_minor and os_major >= versions.version(minimum_major):
+        return skip('OS major version is higher or equal to the minimum '
+                    'threshold and minor updates not enabled: %s' % os_version)
+    reason = 'OS version is below the minimum threshold: %s' % os_version
+
+    minor_updates_required = False
+    upgrade = None
+    if versions.version(minimum_major) > os_major:
+        # This is a major upgrade now and needs the app. We shouldn't
+        # perform minor updates.
+        upgrade = 'major'
+    elif update_minor:
+        upgrade = 'minor'
+        reason = ('OS version is below the minimum threshold subversion: %s'
+                  % os_build)
+        if scan is None:
+            return skip('A softwareupdate scan is needed', needs_scan=True,
+                        upgrade=upgrade)
+        if not scan.pending_updates:
+            return skip('No Software updates to install', reset_seen=True,
+                        upgrade=upgrade)
+        if scan.restart_required is False:
+            return skip('Only updates that can be installed in the background '
+                        'pending.', reset_seen=True, upgrade=upgrade)
+        # Allow admin to not show nudge all the time
+        days_between_notifications = nudge_prefs.get(
+            'days_between_notifications', 0)
+        if days_between_notifications > 0 and first_seen and last_seen:
+            difference = now - datetime.strptime(last_seen, SEEN_FORMAT)
+            if difference.days < days_between_notifications:
+                return skip('Last seen date is within notification threshold: '
+                            '%s' % days_between_notifications, upgrade=upgrade)
+        minor_updates_required = True
+
+    cut_off_date = nudge_prefs.get('cut_off_date', False)
+    more_info = bool(nudge_prefs.get('more_info_url', False))
+    timer_day_1 = nudge_prefs.get('timer_day_1', 600)
+    timer_day_3 = nudge_prefs.get('timer_day_3', 7200)
+    timer_elapsed = nudge_prefs.get('timer_elapsed', 10)
+    timer_final = nudge_prefs.get('timer_final', 60)
+    timer_initial = nudge_prefs.get('timer_initial', 14400)
+    minimum_minor_update_days = nudge_prefs.get('update_minor_days', 14)
+    if minor_updates_required:
+        minimum_minor_update_days = get_minimum_minor_update_days(
+            minimum_minor_update_days, scan.pending_updates,
+            nudge_json.get('software_updates', []), scan.updates, now)
+
+    if not (cut_off_date or
+            (minor_updates_required and minimum_minor_update_days > 0)):
+        # If you elect not to use a cutoff date, then the UI will only
+        # appear one time per run, and only use the ok button
+        return Plan(True, reason, False, False, False, upgrade, None, None,
+                    True, False, more_info, False, None, None)
+
+    if not cut_off_date: # fix for minor updates logic
+        cut_off_date_strp = now + timedelta(days=minimum_minor_update_days)
+    else:
+        cut_off_date_strp = parse_date(cut_off_date)
+    date_diff_seconds = (cut_off_date_strp - now).total_seconds()
+    date_diff_days = int(round(date_diff_seconds / 86400))
+    cut_off_warn = bool(date_diff_seconds < int(
+        nudge_prefs.get('cut_off_date_warning', 3)) * 86400)
+
+    if date_diff_seconds <= 0:
+        # If the cutoff date is over, get stupidly aggressive and disable
+        # all buttons so the user cannot exit out of the application
+        tier, timer, show_ok, show_understand = (
+            'elapsed', timer_elapsed, False, False)
+    elif date_diff_seconds <= 3600:
+        # If the cutoff date is within one hour, get very agressive
+        tier, timer, show_ok, show_understand = (
+            'final', timer_final, False, False)
+    elif date_diff_seconds <= 86400:
+        # If the cutoff date is within 24 hours, start getting more agressive
+        # and require users to press understand button first
+        tier, timer, show_ok, show_understand = (
+            'day_1', timer_day_1, False, True)
+    elif cut_off_warn:
+        # If the cutoff date is within 72 hours or whatever the admin set,
+        # start getting a bit more agressive
+        tier, timer, show_ok, show_understand = (
+            'day_3', timer_day_3, False, True)
+    else:
+        # Otherwise don't be that aggressive and only require the ok button
+        tier, timer, show_ok, show_understand = (
+            'initial', timer_initial, True, False)
+
+    # Use cut off dates, but don't use the timer functionality
+    if nudge_prefs.get('no_timer', False):
+        timer = None
+    else:
+        timer = float(timer)
+    return Plan(True, reason, False, False, False, upgrade, tier, timer,
+                show_ok, show_understand, more_info, True, date_diff_days,
+                date_diff_seconds)
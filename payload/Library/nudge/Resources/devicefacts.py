@@ -0,0 +1,114 @@
+# A snapshot of the device facts nudge makes its decisions on. Collecting the
+# serial number means loading IOKit, so the snapshot is cached on disk and only
+# collected again after a reboot or an OS update.
+
+import json
+import os
+import platform
+
+from ctypes import CDLL, byref, c_size_t, create_string_buffer
+from ctypes.util import find_library
+
+
+libc = CDLL(find_library('c'))
+
+
+def sysctl_string(name):
+    '''Return a string sysctl value without forking /usr/sbin/sysctl'''
+    size = c_size_t(0)
+    if libc.sysctlbyname(name.encode('utf-8'), None, byref(size), None, 0):
+        return None
+    buf = create_string_buffer(size.value)
+    if libc.sysctlbyname(name.encode('utf-8'), buf, byref(size), None, 0):
+        return None
+    return buf.value.decode('utf-8')
+
+
+class MacFactsProvider(object):
+    '''Reads the device facts from the running Mac'''
+    def session_key(self):
+        # Cached facts are good until the next boot or OS build change
+        return [sysctl_string('kern.bootsessionuuid'),
+                sysctl_string('kern.osversion')]
+
+    def collect(self):
+        return {
+            'os_version': platform.mac_ver()[0],
+            'os_build': sysctl_string('kern.osversion'),
+            'serial': self.serial(),
+            'model': sysctl_string('hw.model'),
+        }
+
+    def serial(self):
+        '''Get system serial number'''
+        # Credit to Michael Lynn
+        import Foundation
+        import objc
+        IOKit_bundle = Foundation.NSBundle.bundleWithIdentifier_(
+            'com.apple.framework.IOKit')
+
+        functions = [("IOServiceGetMatchingService", b"II@"),
+                     ("IOServiceMatching", b"@*"),
+                     ("IORegistryEntryCreateCFProperty", b"@I@@I"),
+                    ]
+
+        iokit = {}
+        objc.loadBundleFunctions(IOKit_bundle, iokit, functions)
+        serial = iokit['IORegistryEntryCreateCFProperty'](
+            iokit['IOServiceGetMatchingService'](
+                0,
+                iokit['IOServiceMatching'](
+                    "IOPlatformExpertDevice".encode("utf-8")
+                )),
+            Foundation.NSString.stringWithString_("IOPlatformSerialNumber"),
+            None,
+            0)
+        return str(serial)
+
+
+class DeviceFacts(object):
+    '''Facts about this device, collected once per run'''
+    def __init__(self, os_version, os_build, serial, model=None):
+        self.os_version = os_version
+        self.os_build = os_build
+        self.serial = serial
+        self.model = model
+
+    def __repr__(self):
+        return 'DeviceFacts(%r, %r, %r, %r)' % (
+            self.os_version, self.os_build, self.serial, self.model)
+
+
+def load(cache_path, provider=None):
+    '''Return the DeviceFacts for this device, from cache_path if it was
+    written during the same boot session and OS build. If either can't be
+    read, the facts are collected and not cached. provider defaults to
+    MacFactsProvider and can be swapped for a stand-in.'''
+    provider = provider or MacFactsProvider()
+    session_key = provider.session_key()
+    if None in session_key:
+        # A key that can't tell sessions apart would match forever
+        facts = provider.collect()
+        return DeviceFacts(facts['os_version'], facts['os_build'],
+                           facts['serial'], facts['model'])
+    try:
+        with open(cache_path) as f:
+            cached = json.load(f)
+        if cached.get('session') == session_key:
+            return DeviceFacts(
+                cached['os_version'], cached['os_build'], cached['serial'],
+                cached['model'])
+    except (IOError, OSError, ValueError, KeyError):
+        pass
+    facts = provider.collect()
+    cached = dict(facts, session=session_key)
+    try:
+        # Write then rename so a concurrent reader never sees a partial file
+        tmp_path = cache_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(cached, f)
+        os.rename(tmp_path, cache_path)
+    except (IOError, OSError):
+        pass
+    return DeviceFacts(facts['os_version'], facts['os_build'], facts['serial'],
+                       facts['model'])
@@ -0,0 +1,123 @@
+# Acceptable applications enforcement. Once the user has dismissed nudge too
+# many times, every application that isn't acceptable is hidden.
+# The running applications are swept once when enforcement starts, after that
+# only applications that launch, activate or unhide are looked at. Nothing in
+# here sleeps, so it is safe to call from the main run loop. Applications are
+# resolved once and remembered by pid and launch date, so a pid the system
+# hands to a new process is resolved again.
+#
+# The workspace and applications are duck typed on NSWorkspace and
+# NSRunningApplication, so a stand-in can be used off macOS.
+
+import collections
+import os
+from urllib.parse import urlparse, unquote
+
+
+# A running application, resolved once per process
+App = collections.namedtuple('App', ['pid', 'bundle_id', 'path'])
+
+
+class AppPolicy(object):
+    '''A set of applications, by bundle identifier, bundle path or bundle
+    path prefix'''
+    def __init__(self, bundle_ids=(), paths=(), prefixes=()):
+        self.bundle_ids = frozenset(bundle_ids)
+        self.paths = frozenset(path.rstrip('/') for path in paths)
+        self.prefixes = tuple(prefixes)
+
+    def matches(self, app):
+        return (app.bundle_id in self.bundle_ids or app.path in self.paths or
+                bool(self.prefixes and app.path.startswith(self.prefixes)))
+
+
+def app_key(running_app):
+    '''Return what tells a process apart from a later one with the same
+    pid, its pid and launch date. The launch date is None for processes
+    not launched by LaunchServices.'''
+    launch_date = running_app.launchDate()
+    if launch_date is not None:
+        launch_date = launch_date.timeIntervalSince1970()
+    return running_app.processIdentifier(), launch_date
+
+
+def bundle_path(running_app):
+    '''Return the bundle path of a running application, or an empty string
+    for applications without a bundle'''
+    bundle_url = running_app.bundleURL()
+    if bundle_url is None:
+        return ''
+    # The app bundle contains file://, quoted path and trailing slashes
+    return unquote(urlparse(str(bundle_url)).path).rstrip('/')
+
+
+class Enforcer(object):
+    '''Hides every application that isn't acceptable.
+    acceptable is the AppPolicy of applications that may be in front of
+    nudge. keep is the AppPolicy of the update mechanism, like the macOS
+    upgrade app, which is acceptable too. nudge itself is never hidden.'''
+    def __init__(self, workspace, acceptable, keep, log):
+        self.own_pid = os.getpid()
+        self.workspace = workspace
+        self.acceptable = acceptable
+        self.keep = keep
+        self.log = log
+        self.active = False
+        self.apps = {}
+        self.hidden = 0
+
+    def resolve(self, running_app):
+        '''Return the App for a running application, cached by app_key()'''
+        key = app_key(running_app)
+        app = self.apps.get(key)
+        if app is None:
+            bundle_id = running_app.bundleIdentifier()
+            app = App(key[0],
+                      str(bundle_id) if bundle_id is not None else None,
+                      bundle_path(running_app))
+            self.apps[key] = app
+        return app
+
+    def is_acceptable(self, running_app):
+        '''True if a running application may be in front of nudge'''
+        app = self.resolve(running_app)
+        return self.acceptable.matches(app) or self.keep.matches(app)
+
+    def start(self):
+        '''Hide everything that isn't acceptable. Only the first call
+        sweeps the running applications, after that app_changed() does the
+        work. Returns True on the first call.'''
+        if self.active:
+            return False
+        self.active = True
+        for running_app in self.workspace.runningApplications():
+            self.app_changed(running_app)
+        self.log('Enforcing acceptable applications: hid %s of %s' % (
+            self.hidden, len(self.apps)))
+        return True
+
+    def stop(self):
+        '''Stop hiding applications. Applications are no longer followed,
+        so what is known about them is dropped. Returns True if enforcement
+        was active.'''
+        if not self.active:
+            return False
+        self.active = False
+        self.apps = {}
+        self.hidden = 0
+        self.log('Stopped enforcing acceptable applications')
+        return True
+
+    def app_changed(self, running_app):
+        '''Hide an application that launched, activated or unhid, unless it
+        is acceptable'''
+        if not self.active:
+            return
+        app = self.resolve(running_app)
+        if app.pid != self.own_pid and not self.is_acceptable(running_app):
+            running_app.hide()
+            self.hidden += 1
+
+    def app_terminated(self, running_app):
+        '''Forget an application that quit'''
+        self.apps.pop(app_key(running_app), None)
@@ -0,0 +1,462 @@
+# A pure-Python stand-in for gurl.Gurl, built on http.client. It takes the
+# same options dict and has the same attributes once done, so downloadfile()
+# can use either. Unlike gurl it:
+#  - keeps connections open and reuses them for the next request to the same
+#    host
+#  - returns the body in memory, as .body, when no 'file' is given. save_body()
+#    writes it out with the headers gurl would have stored
+#  - runs the request on a thread, so it can be waited on with wait() or
+#    finish by calling the 'completion_handler' option, instead of polling
+#    isDone()
+# Stored headers are kept in the same xattr and format as gurl, so a file
+# downloaded by one can be resumed or revalidated by the other. System proxy
+# settings and the keychain are not used, which is why gurl is the default.
+
+import http.client
+import os
+import plistlib
+import socket
+import ssl
+import tempfile
+import threading
+from urllib.parse import urljoin, urlparse
+
+try:
+    import xattr
+except ImportError:
+    # Off macOS, where Linux only allows user. xattrs
+    xattr = None
+
+
+GURL_XATTR = 'com.googlecode.munki.downloadData'
+MAX_REDIRECTS = 10
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+# Idle connections kept per host
+MAX_IDLE_PER_HOST = 4
+CHUNK_SIZE = 64 * 1024
+# Same as NSURLResponseUnknownLength
+UNKNOWN_LENGTH = -1
+# How long isDone() waits for the request to finish before returning
+POLL_INTERVAL = 0.1
+
+# NSURLError codes, so errors log the same as they do with gurl
+ERROR_CANCELLED = -999
+ERROR_TIMED_OUT = -1001
+ERROR_TOO_MANY_REDIRECTS = -1007
+ERROR_SECURE_CONNECTION_FAILED = -1200
+ERROR_UNKNOWN = -1
+
+
+class FetchError(Exception):
+    '''A failed request, with the NSError methods nudge logs'''
+    def __init__(self, error_code, description):
+        Exception.__init__(self, description)
+        self.error_code = error_code
+        self.description = description
+
+    def code(self):
+        return self.error_code
+
+    def localizedDescription(self):
+        return self.description
+
+
+class ConnectionPool(object):
+    '''Idle keep-alive connections, by scheme, host, port and SSL context'''
+    def __init__(self, max_idle=MAX_IDLE_PER_HOST):
+        self.max_idle = max_idle
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        '''Return an idle connection for key, or None'''
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop()
+        return None
+
+    def put(self, key, connection):
+        '''Keep a connection that is done with its response for reuse'''
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def clear(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+
+POOL = ConnectionPool()
+_default_context = None
+_default_context_lock = threading.Lock()
+
+
+def default_context():
+    '''The SSL context for https, made once as loading the CA certificates
+    takes a while'''
+    global _default_context
+    with _default_context_lock:
+        if _default_context is None:
+            _default_context = ssl.create_default_context()
+    return _default_context
+
+
+def get_stored_headers(path):
+    '''Return the headers gurl or HTTPGurl stored with a downloaded file'''
+    try:
+        if xattr is not None:
+            data = xattr.getxattr(path, GURL_XATTR)
+        else:
+            data = os.getxattr(path, 'user.' + GURL_XATTR)
+        return plistlib.loads(data)
+    except (KeyError, IOError, OSError, ValueError):
+        return {}
+
+
+def store_headers(path, headers):
+    data = plistlib.dumps(headers)
+    if xattr is not None:
+        xattr.setxattr(path, GURL_XATTR, data)
+    else:
+        os.setxattr(path, 'user.' + GURL_XATTR, data)
+
+
+def save_body(connection, path):
+    '''Write the in-memory body of a finished HTTPGurl to path, with the
+    headers gurl would have stored for it. The body is written to a temporary
+    file next to path and renamed over it, so path is always a whole file.'''
+    headers = connection.normalizeHeaderDict_(connection.headers or {})
+    download_data = dict((name, headers[name])
+                         for name in ('last-modified', 'etag')
+                         if name in headers)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.',
+                                    prefix='.' + os.path.basename(path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(connection.body)
+        try:
+            store_headers(tmp_path, download_data)
+        except (IOError, OSError) as err:
+            connection.log('Could not store metadata to %s: %s' % (path, err))
+        os.rename(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class HTTPGurl(object):
+    '''Gets content from a URL with http.client. Made the same way as a
+    gurl.Gurl: HTTPGurl.alloc().initWithOptions_(options).'''
+
+    GURL_XATTR = GURL_XATTR
+
+    @classmethod
+    def alloc(cls):
+        return cls.__new__(cls)
+
+    def initWithOptions_(self, options):
+        '''Set up from a gurl options dict. Also takes 'completion_handler',
+        called with the connection once it is done, and 'ssl_context'.'''
+        self.follow_redirects = options.get('follow_redirects', False)
+        self.destination_path = options.get('file')
+        self.can_resume = options.get('can_resume', False)
+        self.url = options.get('url')
+        self.additional_headers = options.get('additional_headers', {})
+        self.download_only_if_changed = options.get(
+            'download_only_if_changed', False)
+        self.cache_data = options.get('cache_data')
+        self.connection_timeout = options.get('connection_timeout', 60)
+        self.completion_handler = options.get('completion_handler')
+        self.ssl_context = options.get('ssl_context')
+        self.log = options.get('logging_function', lambda message: None)
+        self.pool = POOL
+
+        self.resume = False
+        self.response = None
+        self.headers = None
+        self.status = None
+        self.error = None
+        self.SSLerror = None
+        self.done = False
+        self.redirection = []
+        self.body = None
+        self.bytesReceived = 0
+        self.expectedLength = UNKNOWN_LENGTH
+        self.percentComplete = 0
+        self._connection = None
+        self._cancelled = False
+        self._finished = threading.Event()
+        self._thread = None
+        return self
+
+    def start(self):
+        '''Start the request on a background thread'''
+        self._thread = threading.Thread(target=self._run, name='httpgurl')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def wait(self, timeout=None):
+        '''Block until the request is done, or timeout seconds have passed.
+        Returns True if it is done.'''
+        self._finished.wait(timeout)
+        return self.done
+
+    def cancel(self):
+        '''Cancel the request and wait for it to stop'''
+        if self._thread is None or self.done:
+            return
+        self._cancelled = True
+        connection = self._connection
+        if connection is not None and connection.sock is not None:
+            # Wakes up a read that is waiting on the server
+            try:
+                connection.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self._finished.wait()
+
+    def isDone(self):
+        '''Check if the request is complete. Waits up to POLL_INTERVAL
+        for it, like gurl, but returns as soon as it finishes.'''
+        if self._thread is None:
+            return True
+        return self._finished.wait(POLL_INTERVAL)
+
+    def getStoredHeaders(self):
+        '''Returns any stored headers for self.destination_path'''
+        return get_stored_headers(self.destination_path)
+
+    def storeHeaders_(self, headers):
+        '''Store dictionary data as an xattr for self.destination_path'''
+        try:
+            store_headers(self.destination_path, headers)
+        except (IOError, OSError) as err:
+            self.log('Could not store metadata to %s: %s'
+                     % (self.destination_path, err))
+
+    def normalizeHeaderDict_(self, a_dict):
+        '''Return a_dict with the header names in lower case'''
+        return dict((key.lower(), value) for key, value in a_dict.items())
+
+    def removeExpectedSizeFromStoredHeaders(self):
+        '''If a successful transfer, clear the expected size so we
+        don't attempt to resume the download next time'''
+        if str(self.status).startswith('2'):
+            headers = self.getStoredHeaders()
+            if 'expected-length' in headers:
+                del headers['expected-length']
+                self.storeHeaders_(headers)
+
+    def allowRedirect_(self, new_url):
+        '''True if follow_redirects allows a redirect to new_url'''
+        if (self.follow_redirects is True or self.follow_redirects == 'all' or
+                (self.follow_redirects == 'https' and
+                 urlparse(new_url).scheme == 'https')):
+            self.log('Allowing redirect to: %s' % new_url)
+            return True
+        self.log('Denying redirect to: %s' % new_url)
+        return False
+
+    def _run(self):
+        try:
+            self._fetch()
+        except FetchError as err:
+            self.error = err
+        except ssl.SSLError as err:
+            self.SSLerror = (getattr(err, 'verify_code', None) or err.errno,
+                             getattr(err, 'verify_message', None) or
+                             err.reason or str(err))
+            self.error = FetchError(ERROR_SECURE_CONNECTION_FAILED, str(err))
+        except socket.timeout:
+            self.error = FetchError(ERROR_TIMED_OUT, 'The request timed out.')
+        except Exception as err:
+            if self._cancelled:
+                self.error = FetchError(ERROR_CANCELLED, 'cancelled')
+            else:
+                self.error = FetchError(
+                    getattr(err, 'errno', None) or ERROR_UNKNOWN, str(err))
+        finally:
+            self._connection = None
+            self.done = True
+            self._finished.set()
+            if self.completion_handler is not None:
+                self.completion_handler(self)
+
+    def _request_headers(self):
+        headers = dict(self.additional_headers)
+        self.resume = False
+        # does the file already exist? See if we can resume a partial download
+        if self.destination_path and os.path.isfile(self.destination_path):
+            stored_data = self.getStoredHeaders()
+            if (self.can_resume and 'expected-length' in stored_data and
+                    ('last-modified' in stored_data or 'etag' in stored_data)):
+                self.resume = True
+                headers['Range'] = 'bytes=%s-' % os.path.getsize(
+                    self.destination_path)
+        if self.download_only_if_changed and not self.resume:
+            stored_data = self.cache_data
+            if stored_data is None and self.destination_path:
+                stored_data = self.getStoredHeaders()
+            stored_data = stored_data or {}
+            if 'last-modified' in stored_data:
+                headers['If-Modified-Since'] = stored_data['last-modified']
+            if 'etag' in stored_data:
+                headers['If-None-Match'] = stored_data['etag']
+        return headers
+
+    def _send(self, url, headers):
+        '''Send a GET for url, on a pooled connection if there is one.
+        Returns the pool key, the connection and the response.'''
+        parsed = urlparse(url)
+        if parsed.scheme not in ('http', 'https'):
+            raise FetchError(ERROR_UNKNOWN, 'Unsupported URL: %s' % url)
+        context = None
+        if parsed.scheme == 'https':
+            context = self.ssl_context or default_context()
+        key = (parsed.scheme, parsed.hostname, parsed.port, context)
+        path = parsed.path or '/'
+        if parsed.query:
+            path += '?' + parsed.query
+        while True:
+            connection = self.pool.get(key)
+            reused = connection is not None
+            if connection is None:
+                if context is None:
+                    connection = http.client.HTTPConnection(
+                        parsed.hostname, parsed.port,
+                        timeout=self.connection_timeout)
+                else:
+                    connection = http.client.HTTPSConnection(
+                        parsed.hostname, parsed.port,
+                        timeout=self.connection_timeout, context=context)
+            elif connection.sock is not None:
+                connection.sock.settimeout(self.connection_timeout)
+            self._connection = connection
+            try:
+                connection.request('GET', path, headers=headers)
+                return key, connection, connection.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError,
+                    BrokenPipeError):
+                connection.close()
+                # The server closed an idle connection, try a new one
+                if not reused or self._cancelled:
+                    raise
+            except BaseException:
+                connection.close()
+                raise
+
+    def _release(self, key, connection, response):
+        '''Finish with a response, keeping the connection if it can be
+        reused'''
+        if not response.isclosed():
+            response.read()
+        if response.will_close:
+            connection.close()
+        else:
+            self.pool.put(key, connection)
+
+    def _fetch(self):
+        headers = self._request_headers()
+        url = self.url
+        for _ in range(MAX_REDIRECTS + 1):
+            key, connection, response = self._send(url, headers)
+            location = response.getheader('Location')
+            if response.status in REDIRECT_STATUSES and location:
+                new_url = urljoin(url, location)
+                self.redirection.append([new_url, dict(response.getheaders())])
+                if self.allowRedirect_(new_url):
+                    self._release(key, connection, response)
+                    url = new_url
+                    continue
+            self._handle_response(key, connection, response)
+            return
+        raise FetchError(ERROR_TOO_MANY_REDIRECTS, 'too many HTTP redirects')
+
+    def _handle_response(self, key, connection, response):
+        self.response = response
+        self.status = response.status
+        self.headers = dict(response.getheaders())
+        normalized_headers = self.normalizeHeaderDict_(self.headers)
+        self.bytesReceived = 0
+        self.percentComplete = -1
+        try:
+            self.expectedLength = int(normalized_headers['content-length'])
+        except (KeyError, ValueError):
+            self.expectedLength = UNKNOWN_LENGTH
+        download_data = {'expected-length': self.expectedLength}
+        for name in ('last-modified', 'etag'):
+            if name in normalized_headers:
+                download_data[name] = normalized_headers[name]
+
+        destination = None
+        body = None
+        if not self.destination_path:
+            body = bytearray()
+        elif self.status == 206 and self.resume:
+            stored_data = self.getStoredHeaders()
+            if (stored_data.get('etag') != download_data.get('etag') or
+                    stored_data.get('last-modified') != download_data.get(
+                        'last-modified')):
+                # file on server is different than the one we have a
+                # partial for, start over
+                self.log('Can\'t resume download; file on server has changed.')
+                connection.close()
+                self.log('Removing %s' % self.destination_path)
+                os.unlink(self.destination_path)
+                self.log('Restarting download of %s' % self.destination_path)
+                self._fetch()
+                return
+            self.log('Resuming download for %s' % self.destination_path)
+            local_filesize = os.path.getsize(self.destination_path)
+            self.bytesReceived = local_filesize
+            if self.expectedLength != UNKNOWN_LENGTH:
+                self.expectedLength += local_filesize
+            destination = open(self.destination_path, 'ab')
+        elif str(self.status).startswith('2'):
+            destination = open(self.destination_path, 'wb')
+            # store some headers with the file for use if we need to resume
+            # the download and for future checking if the file on the server
+            # has changed
+            self.storeHeaders_(download_data)
+
+        try:
+            while not self._cancelled:
+                chunk = response.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                if destination is not None:
+                    destination.write(chunk)
+                elif body is not None:
+                    body.extend(chunk)
+                self.bytesReceived += len(chunk)
+                if self.expectedLength != UNKNOWN_LENGTH:
+                    self.percentComplete = int(
+                        float(self.bytesReceived) /
+                        float(self.expectedLength) * 100.0)
+        finally:
+            if destination is not None:
+                destination.close()
+        if self._cancelled:
+            connection.close()
+            raise FetchError(ERROR_CANCELLED, 'cancelled')
+        self._release(key, connection, response)
+        if body is not None:
+            self.body = bytes(body)
+        if destination is not None:
+            self.removeExpectedSizeFromStoredHeaders()
+
+
+def fetch(options):
+    '''Get a URL with the gurl options dict and wait for it. Returns the
+    finished HTTPGurl.'''
+    connection = HTTPGurl.alloc().initWithOptions_(options)
+    connection.start()
+    connection.wait()
+    return connection
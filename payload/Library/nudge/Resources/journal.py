@@ -0,0 +1,188 @@
+# A journal of how the user has dealt with nudge: the window being shown,
+# dismissed, the update and ok buttons, and enforcement. Events are appended
+# to a JSON lines file, one per line, and never rewritten in place.
+#
+# Running aggregates are kept alongside: per event, how many there have been
+# and the last one, since the current cycle started and in total. A cycle
+# starts again once the device no longer needs an update. The aggregates are
+# checkpointed to a state file with the journal size they cover, so loading
+# only replays what was appended after the checkpoint. Counting dismissals or
+# finding the last time nudge was shown never reads the journal.
+#
+# Once the journal grows past max_bytes, it is compacted to its most recent
+# events followed by a snapshot of the aggregates. Replaying a journal lets a
+# snapshot replace everything counted before it, so the journal alone is
+# always enough to rebuild the aggregates.
+
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+JOURNAL_NAME = 'journal.jsonl'
+# Compact once the journal is bigger than this
+MAX_BYTES = 64 * 1024
+# Events kept by compaction, for looking back at
+KEEP_EVENTS = 200
+
+IMPRESSION = 'impression'
+DISMISSAL = 'dismissal'
+UPDATE_CLICK = 'update_click'
+OK_CLICK = 'ok_click'
+ENFORCEMENT = 'enforcement'
+# Starts a new cycle
+RESET = 'reset'
+# Written by compaction, holds the aggregates
+SNAPSHOT = 'snapshot'
+
+
+def empty_aggregates():
+    return {'cycle_started': None, 'counts': {}, 'last': {}, 'totals': {}}
+
+
+def apply_event(aggregates, entry):
+    '''Add one journal entry to the aggregates'''
+    event = entry.get('event')
+    if event == SNAPSHOT:
+        aggregates.clear()
+        aggregates.update(entry['aggregates'])
+        return
+    at = entry.get('time')
+    if event == RESET:
+        aggregates['cycle_started'] = at
+        aggregates['counts'] = {}
+        aggregates['last'] = {}
+        return
+    counts = aggregates['counts']
+    counts[event] = counts.get(event, 0) + 1
+    aggregates['last'][event] = at
+    totals = aggregates['totals']
+    totals[event] = totals.get(event, 0) + 1
+
+
+class Journal(object):
+    '''The journal at path and its aggregates'''
+    def __init__(self, path, max_bytes=MAX_BYTES, keep_events=KEEP_EVENTS,
+                 clock=time.time):
+        self.path = path
+        self.state_path = path + '.state'
+        self.max_bytes = max_bytes
+        self.keep_events = keep_events
+        self.clock = clock
+        self.aggregates = empty_aggregates()
+        self._lock = threading.Lock()
+        self.load()
+
+    def count(self, event):
+        '''Return how many times event happened in this cycle'''
+        return self.aggregates['counts'].get(event, 0)
+
+    def last(self, event):
+        '''Return when event last happened in this cycle, in seconds since
+        the epoch, or None'''
+        return self.aggregates['last'].get(event)
+
+    def total(self, event):
+        '''Return how many times event happened since the journal was
+        started'''
+        return self.aggregates['totals'].get(event, 0)
+
+    def record(self, event, **fields):
+        '''Append event to the journal'''
+        entry = dict(fields, event=event, time=int(self.clock()))
+        with self._lock:
+            apply_event(self.aggregates, entry)
+            try:
+                with open(self.path, 'a') as f:
+                    f.write(json.dumps(entry, sort_keys=True) + '\n')
+                if os.path.getsize(self.path) > self.max_bytes:
+                    self._compact()
+                self._checkpoint()
+            except (IOError, OSError):
+                pass
+
+    def reset(self):
+        '''Start a new cycle, if anything happened in this one'''
+        if self.aggregates['counts']:
+            self.record(RESET)
+
+    def load(self):
+        '''Load the aggregates from the checkpoint, then replay what was
+        appended after it. The whole journal is replayed if the checkpoint
+        is missing or was for another journal.'''
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return
+        offset = 0
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+            if (state['inode'] == stat.st_ino and
+                    state['offset'] <= stat.st_size):
+                self.aggregates = state['aggregates']
+                offset = state['offset']
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            pass
+        if offset == stat.st_size:
+            return
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(offset)
+                tail = f.read()
+        except (IOError, OSError):
+            return
+        if not tail.endswith(b'\n'):
+            # A crash in the middle of a write, drop the partial line so the
+            # next one starts on a line of its own
+            complete = tail.rfind(b'\n') + 1
+            tail = tail[:complete]
+            try:
+                with open(self.path, 'rb+') as f:
+                    f.truncate(offset + complete)
+            except (IOError, OSError):
+                pass
+        for line in tail.splitlines():
+            try:
+                apply_event(self.aggregates, json.loads(line.decode('utf-8')))
+            except (ValueError, KeyError, TypeError, AttributeError):
+                continue
+        with self._lock:
+            try:
+                self._checkpoint()
+            except (IOError, OSError):
+                pass
+
+    def _checkpoint(self):
+        '''Write the aggregates and the journal size they cover'''
+        stat = os.stat(self.path)
+        replace_file(self.state_path, json.dumps({
+            'inode': stat.st_ino, 'offset': stat.st_size,
+            'aggregates': self.aggregates}))
+
+    def _compact(self):
+        '''Rewrite the journal as its last keep_events events and a
+        snapshot of the aggregates'''
+        with open(self.path) as f:
+            kept = f.read().splitlines()[-self.keep_events:]
+        # The new snapshot comes last, so it replaces whatever the kept
+        # events and any older snapshot among them add up to
+        kept.append(json.dumps({'event': SNAPSHOT, 'time': int(self.clock()),
+                                'aggregates': self.aggregates},
+                               sort_keys=True))
+        replace_file(self.path, '\n'.join(kept) + '\n')
+
+
+def replace_file(path, text):
+    '''Replace the file at path with text in one rename'''
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path), prefix='.' + os.path.basename(path))
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
@@ -0,0 +1,201 @@
+# Logging for nudge. Records are written as JSON lines to a size rotated file
+# per user in /Library/nudge/Logs, and optionally to NSLog, by a background
+# thread so logging never waits on the disk. The LaunchAgent sends stdout and
+# stderr to nudge.log in the same directory, which is left to launchd. The
+# queue in between is bounded. If it fills up, records are dropped and the
+# number dropped is logged later. Queued records are only written out by
+# LogWriter.stop(), which has to be called before NSApp.terminate_, as
+# atexit doesn't run after it.
+# Repetitive records, like download progress, carry a rate_key and are only
+# written once per RATE_LIMIT_SECONDS for that key.
+
+import json
+import logging
+import logging.handlers
+import os
+import pwd
+import queue
+import threading
+import time
+from datetime import datetime
+
+
+LOG_DIR = '/Library/nudge/Logs'
+# Formatted with the user name, each user writes and rotates their own file
+LOG_NAME = 'nudge-%s.jsonl'
+MAX_BYTES = 1024 * 1024
+BACKUP_COUNT = 3
+QUEUE_SIZE = 1000
+RATE_LIMIT_SECONDS = 5
+
+LEVELS = {
+    'debug': logging.DEBUG,
+    'info': logging.INFO,
+    'warning': logging.WARNING,
+    'error': logging.ERROR,
+}
+
+logger = logging.getLogger('nudge')
+logger.propagate = False
+
+
+class JSONFormatter(logging.Formatter):
+    '''Formats a record as one line of JSON'''
+    def format(self, record):
+        entry = {
+            'time': datetime.utcfromtimestamp(record.created).strftime(
+                '%Y-%m-%dT%H:%M:%S.%fZ'),
+            'level': record.levelname.lower(),
+            'pid': record.process,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class NSLogHandler(logging.Handler):
+    '''Sends the message to NSLog, as nudge always has'''
+    def emit(self, record):
+        try:
+            import Foundation
+            # Pass the message as an argument so a % in it isn't taken as a
+            # format string
+            Foundation.NSLog('%@', '[Nudge] ' + record.getMessage())
+        except Exception:
+            self.handleError(record)
+
+
+class RateLimitFilter(logging.Filter):
+    '''Lets a record with a rate_key through at most once per interval for
+    that key. The next record let through says how many were held back.'''
+    def __init__(self, interval=RATE_LIMIT_SECONDS, clock=time.time):
+        logging.Filter.__init__(self)
+        self.interval = interval
+        self.clock = clock
+        self.last = {}
+        self.suppressed = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        key = getattr(record, 'rate_key', None)
+        if key is None:
+            return True
+        now = self.clock()
+        with self._lock:
+            if now - self.last.get(key, -self.interval) < self.interval:
+                self.suppressed[key] = self.suppressed.get(key, 0) + 1
+                return False
+            self.last[key] = now
+            suppressed = self.suppressed.pop(key, 0)
+        if suppressed:
+            record.fields = dict(getattr(record, 'fields', {}),
+                                 suppressed=suppressed)
+        return True
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    '''Hands records to the writer thread, dropping them if it is behind'''
+    def __init__(self, log_queue):
+        logging.handlers.QueueHandler.__init__(self, log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record):
+        if self.dropped:
+            record.fields = dict(getattr(record, 'fields', {}),
+                                 dropped=self.dropped)
+            self.dropped = 0
+        return logging.handlers.QueueHandler.prepare(self, record)
+
+
+class QueueListener(logging.handlers.QueueListener):
+    '''Writes out queued records on a background thread'''
+    def enqueue_sentinel(self):
+        # Wait for room rather than fail when the queue is full on exit
+        self.queue.put(self._sentinel)
+
+
+def current_user():
+    return pwd.getpwuid(os.getuid()).pw_name
+
+
+def can_write(path):
+    '''True if the file at path can be written, and rotated or created in
+    its directory'''
+    if os.path.exists(path) and not os.access(path, os.W_OK):
+        return False
+    return os.access(os.path.dirname(path), os.W_OK)
+
+
+class LogWriter(object):
+    '''The background writer and the handlers it writes to'''
+    def __init__(self, log_dir=LOG_DIR, level='info', nslog=True,
+                 max_bytes=MAX_BYTES, backup_count=BACKUP_COUNT,
+                 queue_size=QUEUE_SIZE, user=None):
+        self.handlers = []
+        self.file_handler = None
+        self.path = os.path.join(log_dir, LOG_NAME % (user or current_user()))
+        # postinstall makes the Logs directory writable by everyone, fall
+        # back to NSLog only if the log file can't be written
+        if can_write(self.path):
+            self.file_handler = logging.handlers.RotatingFileHandler(
+                self.path, maxBytes=max_bytes, backupCount=backup_count,
+                delay=True)
+            self.file_handler.setFormatter(JSONFormatter())
+            self.handlers.append(self.file_handler)
+        self.nslog_handler = NSLogHandler()
+        if nslog or self.file_handler is None:
+            self.handlers.append(self.nslog_handler)
+        self.queue_handler = BoundedQueueHandler(queue.Queue(queue_size))
+        self.queue_handler.addFilter(RateLimitFilter())
+        self.running = False
+        self.listener = QueueListener(
+            self.queue_handler.queue, *self.handlers,
+            respect_handler_level=True)
+        self.set_level(level)
+
+    def set_level(self, level):
+        logger.setLevel(LEVELS.get(level, logging.INFO))
+
+    def set_nslog(self, nslog):
+        '''Turn the NSLog sink on or off. It stays on if there is no log
+        file to write to.'''
+        if self.file_handler is None:
+            return
+        if nslog and self.nslog_handler not in self.handlers:
+            self.handlers.append(self.nslog_handler)
+        elif not nslog and self.nslog_handler in self.handlers:
+            self.handlers.remove(self.nslog_handler)
+        self.listener.handlers = tuple(self.handlers)
+
+    def start(self):
+        logger.addHandler(self.queue_handler)
+        self.listener.start()
+        self.running = True
+
+    def stop(self):
+        '''Write out everything queued and stop the writer thread. Only the
+        first call does anything, so it can also be registered with
+        atexit.'''
+        if not self.running:
+            return
+        self.running = False
+        logger.removeHandler(self.queue_handler)
+        self.listener.stop()
+        for handler in self.handlers:
+            handler.close()
+
+
+def log(text, level='info', rate_key=None, **fields):
+    '''Log text at level. Extra keyword arguments are added to the JSON
+    record.'''
+    logger.log(LEVELS.get(level, logging.INFO), '%s', text,
+               extra={'fields': fields, 'rate_key': rate_key})
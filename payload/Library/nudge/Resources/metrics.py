@@ -0,0 +1,127 @@
+# Field diagnostics for slow launches. RunMetrics times the phases of a run
+# and appends one JSON line per run to the user's metrics file. Timing a
+# phase costs two clock reads, so it is always on. Profiler is only used
+# with --profile, and writes a cProfile dump and a tracemalloc snapshot for
+# the run. It imports cProfile and tracemalloc when it starts, so runs
+# without --profile never load them.
+
+import contextlib
+import json
+import os
+import time
+from datetime import datetime
+
+
+# Formatted with the user name. nudge runs as the console user, and a file
+# per user keeps one user's metrics from blocking the next user's writes.
+METRICS_NAME = 'metrics-%s.jsonl'
+# The metrics file is rotated to metrics-<user>.jsonl.1 past this size
+MAX_BYTES = 1024 * 1024
+# Stack frames kept for each traced allocation
+TRACEMALLOC_FRAMES = 25
+
+# Metrics files a write has failed for, each is only logged once
+_failed_paths = set()
+
+
+class RunMetrics(object):
+    '''Wall clock time spent in each phase of one run. log is called if
+    the record can't be written.'''
+    def __init__(self, path, clock=time.time, log=None):
+        self.path = path
+        self.clock = clock
+        self.log = log or (lambda text: None)
+        self.started = clock()
+        self.phases = []
+        self.fields = {}
+        self._written = False
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        '''Time the body of a with statement as the phase called name'''
+        started = self.clock()
+        try:
+            yield
+        finally:
+            self.phases.append((name, self.clock() - started))
+
+    def since(self, name, started):
+        '''Record the time since started, a reading of clock, as the phase
+        called name'''
+        self.phases.append((name, self.clock() - started))
+
+    def set(self, **fields):
+        '''Add fields to the run's record'''
+        self.fields.update(fields)
+
+    def record(self, outcome, steps=()):
+        '''Return the run's record. steps are preflight Tasks.'''
+        phases = {}
+        for name, seconds in self.phases:
+            phases[name] = round(phases.get(name, 0) + seconds, 4)
+        record = {
+            'time': datetime.utcfromtimestamp(self.started).strftime(
+                '%Y-%m-%dT%H:%M:%SZ'),
+            'pid': os.getpid(),
+            'outcome': outcome,
+            'total': round(self.clock() - self.started, 4),
+            'phases': phases,
+            'steps': dict((task.name, {
+                'elapsed': (None if task.elapsed is None
+                            else round(task.elapsed, 4)),
+                'waited': round(task.waited, 4)}) for task in steps),
+        }
+        record.update(self.fields)
+        return record
+
+    def write(self, outcome, steps=()):
+        '''Append the run's record to the metrics file. Only the first call
+        writes, so it can also be registered with atexit.'''
+        if self._written:
+            return
+        self._written = True
+        try:
+            if (os.path.isfile(self.path) and
+                    os.path.getsize(self.path) > MAX_BYTES):
+                os.rename(self.path, self.path + '.1')
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(self.record(outcome, steps),
+                                   default=str) + '\n')
+        except (IOError, OSError) as err:
+            if self.path not in _failed_paths:
+                _failed_paths.add(self.path)
+                self.log('Could not write metrics to %s: %s' % (
+                    self.path, err))
+
+
+class Profiler(object):
+    '''A cProfile profile of the main thread and a tracemalloc snapshot,
+    written to out_dir as nudge-<time>-<pid>.prof and .tracemalloc'''
+    def __init__(self, out_dir):
+        self.base_path = os.path.join(out_dir, 'nudge-%s-%s' % (
+            datetime.utcnow().strftime('%Y%m%d%H%M%S'), os.getpid()))
+        self.profile = None
+
+    def start(self):
+        import cProfile
+        import tracemalloc
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+
+    def stop(self):
+        '''Stop profiling and write out the results. Returns the paths
+        written, only the first call does anything.'''
+        if self.profile is None:
+            return []
+        import tracemalloc
+        self.profile.disable()
+        paths = [self.base_path + '.prof', self.base_path + '.tracemalloc']
+        try:
+            self.profile.dump_stats(paths[0])
+            tracemalloc.take_snapshot().dump(paths[1])
+        except (IOError, OSError):
+            paths = []
+        tracemalloc.stop()
+        self.profile = None
+        return paths
@@ -4,6 +4,9 @@
 
 from Foundation import NSObject, NSBundle
 from AppKit import NSNib, NSApp, NSApplication
+import hashlib
+import json
+import mmap
 import objc
 import os
 import os.path
@@ -25,27 +28,110 @@ TransformProcessType = ApplicationServices.TransformProcessType
 TransformProcessType.argtypes = [POINTER(ProcessSerialNumber), c_uint32]
 
 
-def views_recursive(view_obj):
-    yield view_obj
-    for x in view_obj.subviews():
-        for y in views_recursive(x):
-            yield y
+def walk_views(view_obj):
+    '''Yield (view, path) for view_obj and everything below it, parents
+    first. path is the list of subview indexes leading to the view.'''
+    stack = [(view_obj, [])]
+    while stack:
+        view, path = stack.pop()
+        yield view, path
+        subviews = view.subviews()
+        for i in range(len(subviews) - 1, -1, -1):
+            stack.append((subviews[i], path + [i]))
 
 
-def views_dict(nib_obj):
-    # Find the NSWindow instance at the top level
-    all_windows = [x for x in nib_obj if x.className() == 'NSWindow']
-    win = all_windows[0]
-    # Now find all the views within the window where the identifier is defined
-    top_view = win.contentView()
-    v_dict = dict()
-    for v in views_recursive(top_view):
+def view_paths(top_view):
+    '''Return a dict of identifier to path for every view someone gave an
+    identifier to'''
+    paths = dict()
+    for v, path in walk_views(top_view):
         ident = v.identifier()
         if ident is not None:
             if not ident.startswith('_'):
                 # Someone has customized it, remember it
-                v_dict[ident] = v
-    return v_dict
+                paths[str(ident)] = path
+    return paths
+
+
+def find_window(nib_obj):
+    # Find the NSWindow instance at the top level
+    return [x for x in nib_obj if x.className() == 'NSWindow'][0]
+
+
+def views_dict(nib_obj):
+    # Now find all the views within the window where the identifier is defined
+    top_view = find_window(nib_obj).contentView()
+    return ViewIndex(top_view, view_paths(top_view)).load_all()
+
+
+class ViewIndex(object):
+    '''Views by identifier. Each view is found by following its path from
+    the top view the first time it is asked for.'''
+    def __init__(self, top_view, paths):
+        self.top_view = top_view
+        self.paths = paths
+        self._views = dict()
+
+    def __getitem__(self, ident):
+        if ident not in self._views:
+            view = self.top_view
+            try:
+                for i in self.paths[ident]:
+                    view = view.subviews()[i]
+            except IndexError:
+                view = None
+            if view is None or view.identifier() != ident:
+                # The index doesn't match this nib after all
+                self.paths = view_paths(self.top_view)
+                return self.load_all()[ident]
+            self._views[ident] = view
+        return self._views[ident]
+
+    def __contains__(self, ident):
+        return ident in self.paths
+
+    def __iter__(self):
+        return iter(self.paths)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def keys(self):
+        return self.paths.keys()
+
+    def load_all(self):
+        '''Find every view in one walk and return them as a dict'''
+        self._views = dict()
+        for v, path in walk_views(self.top_view):
+            ident = v.identifier()
+            if ident is not None and str(ident) in self.paths:
+                self._views[str(ident)] = v
+        return self._views
+
+
+def load_index(index_path, digest):
+    '''Return the identifier paths stored in index_path for the nib with
+    this digest, or None'''
+    try:
+        with open(index_path) as f:
+            index = json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+    if index.get('sha256') != digest:
+        return None
+    return index.get('paths')
+
+
+def save_index(index_path, digest, paths):
+    try:
+        # Write then rename so a concurrent reader never sees a partial file
+        tmp_path = '%s.%s.tmp' % (index_path, os.getpid())
+        with open(tmp_path, 'w') as f:
+            json.dump({'sha256': digest, 'paths': paths}, f)
+        os.rename(tmp_path, index_path)
+    except (IOError, OSError):
+        # The index is optional
+        pass
 
 
 def quit_app():
@@ -68,7 +154,9 @@ def func_to_controller_selector(f_obj):
 
 
 class Nibbler(object):
-    def __init__(self, path):
+    '''Loads the nib at path. With index_dir, the identifier paths of its
+    views are kept there, so later loads don't walk the views.'''
+    def __init__(self, path, index_dir=None):
         bundle = NSBundle.mainBundle()
         info = bundle.localizedInfoDictionary() or bundle.infoDictionary()
         # Did you know you can override parts of infoDictionary (Info.plist,
@@ -84,18 +172,31 @@ class Nibbler(object):
             # let's fix the path
             path = os.path.join(path, 'keyedobjects.nib')
         with open(path, 'rb') as f:
-            # get nib bytes
-            buffer = memoryview
-            d = buffer(f.read())
+            # Map the nib bytes rather than reading them. The map has to
+            # outlive the NSNib made from it.
+            self._nib_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        d = memoryview(self._nib_map)
         n_obj = NSNib.alloc().initWithNibData_bundle_(d, None)
         placeholder_obj = NSObject.alloc().init()
         result, n = n_obj.instantiateWithOwner_topLevelObjects_(
             placeholder_obj, None)
         self.hidden = True
         self.nib_contents = n
-        self.win = [
-            x for x in self.nib_contents if x.className() == 'NSWindow'][0]
-        self.views = views_dict(self.nib_contents)
+        self.win = find_window(self.nib_contents)
+        # The identifier paths only change with the nib, so they are stored
+        # keyed by its hash. Views are then looked up as needed.
+        top_view = self.win.contentView()
+        paths = None
+        if index_dir is not None:
+            digest = hashlib.sha256(d).hexdigest()
+            index_path = os.path.join(index_dir,
+                                      'nib-%s.index.json' % digest[:16])
+            paths = load_index(index_path, digest)
+        if paths is None:
+            paths = view_paths(top_view)
+            if index_dir is not None:
+                save_index(index_path, digest, paths)
+        self.views = ViewIndex(top_view, paths)
         self._attached = []
 
     def attach(self, func, identifier_label):
@@ -113,7 +214,7 @@ class Nibbler(object):
             # signature='v@:'))
             o.setAction_(temp.doTheThing_)
 
-    def run(self):
+    def run(self, show=True):
         if self.hidden:
             psn = ProcessSerialNumber(0, kCurrentProcess)
             ApplicationServices.TransformProcessType(
@@ -122,9 +223,10 @@ class Nibbler(object):
             psn = ProcessSerialNumber(0, kCurrentProcess)
             ApplicationServices.TransformProcessType(
                 psn, kProcessTransformToForegroundApplication)
-        self.win.makeKeyAndOrderFront_(None)
-        self.win.display()
-        NSApp.activateIgnoringOtherApps_(True)
+        if show:
+            self.win.makeKeyAndOrderFront_(None)
+            self.win.display()
+            NSApp.activateIgnoringOtherApps_(True)
         NSApp.run()
 
     def quit(self):
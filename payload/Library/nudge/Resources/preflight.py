@@ -0,0 +1,79 @@
+# Runs the independent, I/O bound startup steps of nudge (config download,
+# device facts, softwareupdate, image loading) concurrently. Each step runs on
+# a daemon thread so an early exit never waits for outstanding work - it is
+# simply abandoned along with the process.
+
+import threading
+import time
+
+
+class Task(object):
+    '''A single preflight step running on its own thread'''
+    def __init__(self, name, func, args):
+        self.name = name
+        self.started = time.time()
+        self.elapsed = None
+        self.waited = 0
+        self._result = None
+        self._error = None
+        self._thread = threading.Thread(
+            target=self._run, args=(func, args), name=name)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self, func, args):
+        try:
+            self._result = func(*args)
+        except BaseException as err:
+            # Includes SystemExit, so an exit() inside the step still exits
+            # once the main thread asks for the result
+            self._error = err
+        finally:
+            self.elapsed = time.time() - self.started
+
+    def result(self):
+        '''Wait for the step to finish and return its result, re-raising
+        anything it raised'''
+        wait_started = time.time()
+        self._thread.join()
+        self.waited += time.time() - wait_started
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+
+class Preflight(object):
+    '''Starts preflight steps and keeps track of how long each one took'''
+    def __init__(self):
+        self.started = time.time()
+        self.tasks = []
+        self._by_name = {}
+        self._logged = False
+
+    def start(self, name, func, *args):
+        '''Run func(*args) in the background as the step called name'''
+        task = Task(name, func, args)
+        self.tasks.append(task)
+        self._by_name[name] = task
+        return task
+
+    def result(self, name):
+        '''Wait for the step called name and return its result'''
+        return self._by_name[name].result()
+
+    def log_timings(self, log):
+        '''Log the wall clock time so far and a per step breakdown. Time the
+        main thread spent waiting on a step is what that step added to the
+        critical path.'''
+        if self._logged:
+            return
+        self._logged = True
+        steps = []
+        for task in self.tasks:
+            if task.elapsed is None:
+                steps.append('%s abandoned' % task.name)
+            else:
+                steps.append('%s %.2fs (waited %.2fs)' % (
+                    task.name, task.elapsed, task.waited))
+        log('Preflight timings: %.2fs total, %s' % (
+            time.time() - self.started, ', '.join(steps) or 'no steps'))
@@ -0,0 +1,152 @@
+# Preferences for one run of nudge. Each preference is read from the backend
+# once and then served from memory. Writes are held back and flushed together,
+# with one synchronize per domain, at exit or when flush() is called.
+#
+# The backend is swappable. CFPreferencesBackend is what nudge uses, and
+# PlistBackend keeps each domain in a plist file so the store can be used
+# off macOS.
+
+import os
+import plistlib
+import tempfile
+import threading
+from datetime import datetime
+
+
+NUDGE_DOMAIN = 'com.erikng.nudge'
+# How a date preference reads back from CFPreferences
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S +0000'
+
+
+def as_read(value):
+    '''Return value the way the backend returns it once written, dates
+    become strings'''
+    if isinstance(value, datetime):
+        return value.strftime(DATE_FORMAT)
+    return value
+
+
+class CFPreferencesBackend(object):
+    '''Reads and writes preferences with CoreFoundation'''
+    def __init__(self):
+        import CoreFoundation
+        import Foundation
+        self.CoreFoundation = CoreFoundation
+        self.NSDate = Foundation.NSDate
+        self.syncs = 0
+
+    def read(self, name, domain):
+        value = self.CoreFoundation.CFPreferencesCopyAppValue(name, domain)
+        if isinstance(value, self.NSDate):
+            # convert NSDate/CFDates to strings
+            value = str(value)
+        return value
+
+    def write(self, name, value, domain):
+        self.CoreFoundation.CFPreferencesSetAppValue(name, value, domain)
+
+    def synchronize(self, domain):
+        self.syncs += 1
+        self.CoreFoundation.CFPreferencesAppSynchronize(domain)
+
+
+class PlistBackend(object):
+    '''Keeps each domain in <directory>/<domain>.plist. A domain that is a
+    path, like /Library/Preferences/com.apple.SoftwareUpdate, is read from
+    that path instead.'''
+    def __init__(self, directory):
+        self.directory = directory
+        self.domains = {}
+        self.syncs = 0
+
+    def path(self, domain):
+        if os.path.isabs(domain):
+            return domain + '.plist'
+        return os.path.join(self.directory, domain + '.plist')
+
+    def load(self, domain):
+        if domain not in self.domains:
+            try:
+                with open(self.path(domain), 'rb') as f:
+                    self.domains[domain] = plistlib.load(f)
+            except (IOError, OSError, ValueError):
+                self.domains[domain] = {}
+        return self.domains[domain]
+
+    def read(self, name, domain):
+        return as_read(self.load(domain).get(name))
+
+    def write(self, name, value, domain):
+        values = self.load(domain)
+        if value is None:
+            values.pop(name, None)
+        else:
+            values[name] = value
+
+    def synchronize(self, domain):
+        '''Write the domain out. The file is replaced in one rename, so a
+        crash leaves either the old or the new one.'''
+        self.syncs += 1
+        path = self.path(domain)
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(path), prefix='.' + os.path.basename(path))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                plistlib.dump(self.load(domain), f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+class PreferenceStore(object):
+    '''Preferences read once and written in batches. With flush_delay, a
+    write also flushes after that many seconds, for long running
+    processes.'''
+    def __init__(self, backend, flush_delay=None):
+        self.backend = backend
+        self.flush_delay = flush_delay
+        self._values = {}
+        self._pending = {}
+        self._timer = None
+        self._lock = threading.RLock()
+
+    def get(self, name, domain=NUDGE_DOMAIN):
+        with self._lock:
+            key = (domain, name)
+            if key not in self._values:
+                self._values[key] = self.backend.read(name, domain)
+            return self._values[key]
+
+    def set(self, name, value, domain=NUDGE_DOMAIN):
+        '''Set a preference, None removes it. It is written out by the next
+        flush().'''
+        with self._lock:
+            self._values[(domain, name)] = as_read(value)
+            self._pending.setdefault(domain, {})[name] = value
+            if self.flush_delay is not None and self._timer is None:
+                self._timer = threading.Timer(self.flush_delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def forget(self):
+        '''Drop what has been read, so the next get() reads it again.
+        Preferences waiting to be flushed are kept.'''
+        with self._lock:
+            self._values = dict(
+                (key, value) for key, value in self._values.items()
+                if key[1] in self._pending.get(key[0], ()))
+
+    def flush(self):
+        '''Write out everything set since the last flush'''
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            pending, self._pending = self._pending, {}
+            for domain, values in pending.items():
+                for name, value in values.items():
+                    self.backend.write(name, value, domain)
+                self.backend.synchronize(domain)
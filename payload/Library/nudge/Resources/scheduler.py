@@ -0,0 +1,73 @@
+# When an open nudge window should next wake up. Instead of a repeating
+# timer with the interval picked at launch, every wake re-evaluates the plan
+# and sets a single shot timer for whichever comes first: the current tier's
+# timer, or the deadline crossing into the next, more aggressive tier.
+
+import collections
+from datetime import datetime
+
+
+# Timers may fire up to this share of their delay late, so the system can
+# coalesce wake ups
+TOLERANCE = 0.1
+MAX_TOLERANCE = 60
+# Wake this long after a tier boundary, so the plan is evaluated on the far
+# side of it
+BOUNDARY_SLACK = 1
+
+Wake = collections.namedtuple('Wake', [
+    'plan',         # The plan as of this wake
+    'delay',        # Seconds until the next wake, or None for no more wakes
+    'tolerance',    # Seconds the next wake may be late by
+    'nudge',        # True if the next wake is for the timer, not a boundary
+])
+
+
+def seconds_to_next_tier(seconds_remaining, warning_seconds):
+    '''Return the seconds until the plan moves to the next tier, or None if
+    the deadline has passed. See the tiers in decision.evaluate().'''
+    if seconds_remaining is None or seconds_remaining <= 0:
+        return None
+    # day_3 starts below the warning, the other tiers at their threshold
+    if warning_seconds > 86400 and seconds_remaining >= warning_seconds:
+        return seconds_remaining - warning_seconds + BOUNDARY_SLACK
+    for threshold in (86400, 3600, 0):
+        if seconds_remaining > threshold:
+            return seconds_remaining - threshold + BOUNDARY_SLACK
+    return None
+
+
+class Scheduler(object):
+    '''Works out the next wake. evaluate is called with the current UTC
+    datetime and returns a decision.Plan. clock returns the current UTC
+    datetime and can be swapped for a stand-in.'''
+    def __init__(self, evaluate, warning_seconds, clock=datetime.utcnow):
+        self.evaluate = evaluate
+        self.warning_seconds = warning_seconds
+        self.clock = clock
+        self.last_nudge = clock()
+
+    def nudged(self):
+        '''Record that the timer brought nudge back'''
+        self.last_nudge = self.clock()
+
+    def next_wake(self):
+        '''Re-evaluate the plan and return the next Wake'''
+        now = self.clock()
+        plan = self.evaluate(now)
+        if not plan.show:
+            return Wake(plan, None, 0, False)
+        timer_delay = None
+        if plan.timer:
+            # Keep the cadence since the last nudge, a shorter timer in a
+            # new tier can mean the next nudge is already due
+            timer_delay = max(
+                0, plan.timer - (now - self.last_nudge).total_seconds())
+        tier_delay = seconds_to_next_tier(plan.seconds_remaining,
+                                          self.warning_seconds)
+        delays = [d for d in (timer_delay, tier_delay) if d is not None]
+        if not delays:
+            return Wake(plan, None, 0, False)
+        delay = min(delays)
+        return Wake(plan, delay, min(delay * TOLERANCE, MAX_TOLERANCE),
+                    timer_delay is not None and timer_delay <= delay)
@@ -0,0 +1,208 @@
+# Wrappers around /usr/sbin/softwareupdate. A scan can take minutes, so the
+# results are cached per OS build and only refreshed once they are older than
+# the configured ttl.
+
+import collections
+import fcntl
+import json
+import os
+import re
+import subprocess
+import time
+
+
+SOFTWAREUPDATE = '/usr/sbin/softwareupdate'
+
+# A pending update as listed by softwareupdate -l
+Update = collections.namedtuple('Update', [
+    'label', 'title', 'version', 'size', 'recommended', 'restart_required'])
+
+# 10.15+: Title: Safari, Version: 14.0.3, Size: 68473K, Recommended: YES, ...
+DETAIL_FIELD_SPLIT = re.compile(r',\s*(?=[A-Z][A-Za-z ]*: )')
+# 10.14 and earlier: Safari (14.0.3), 68473K [recommended] [restart]
+LEGACY_DETAIL = re.compile(
+    r'^(?P<title>.*?) \((?P<version>[^)]*)\), (?P<size>\S+)(?P<flags>.*)$')
+
+
+def parse_detail(label, detail):
+    '''Return an Update from an update's label and its detail line'''
+    if detail.startswith('Title: '):
+        fields = {}
+        for field in DETAIL_FIELD_SPLIT.split(detail.rstrip(',')):
+            key, _, value = field.partition(': ')
+            fields[key] = value.strip()
+        return Update(label, fields.get('Title', ''),
+                      fields.get('Version', ''), fields.get('Size', ''),
+                      fields.get('Recommended', '').upper() == 'YES',
+                      'restart' in fields.get('Action', '').lower())
+    match = LEGACY_DETAIL.match(detail)
+    if match:
+        flags = match.group('flags').lower()
+        return Update(label, match.group('title'), match.group('version'),
+                      match.group('size'), '[recommended]' in flags,
+                      '[restart]' in flags)
+    # Unknown format, fall back to looking for the word
+    return Update(label, detail, '', '', False, 'restart' in detail.lower())
+
+
+def parse_updates(lines):
+    '''Yield an Update for each pending update in softwareupdate -l output,
+    as soon as its lines have been read'''
+    label = None
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', 'replace')
+        line = line.strip()
+        if line.startswith('* '):
+            label = line[2:]
+            if label.startswith('Label: '):
+                label = label[len('Label: '):]
+        elif label is not None and line:
+            yield parse_detail(label, line)
+            label = None
+
+
+class Runner(object):
+    '''Runs softwareupdate. Point path at a stand-in script for testing.'''
+    def __init__(self, path=SOFTWAREUPDATE):
+        self.path = path
+        self.invocations = 0
+
+    def run(self, args):
+        '''Return the output of softwareupdate, or None if it failed'''
+        self.invocations += 1
+        try:
+            return subprocess.check_output([self.path] + list(args))
+        except (subprocess.CalledProcessError, OSError):
+            return None
+
+    def stream(self, args):
+        '''Yield the output of softwareupdate line by line. Closing the
+        generator early stops softwareupdate. Raises CalledProcessError if
+        softwareupdate fails.'''
+        self.invocations += 1
+        cmd = [self.path] + list(args)
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL)
+        try:
+            for line in proc.stdout:
+                yield line
+            if proc.wait() != 0:
+                raise subprocess.CalledProcessError(proc.returncode, cmd)
+        finally:
+            if proc.poll() is None:
+                proc.terminate()
+            proc.stdout.close()
+            proc.wait()
+
+
+class ScanCache(object):
+    '''softwareupdate scan results for os_build, cached for ttl seconds.
+    softwareupdate is only run on a cache miss and failed runs are never
+    cached. With keep_stale, expired results are still served so the caller
+    can refresh them in the background.'''
+    def __init__(self, path, os_build, ttl, runner=None, keep_stale=False):
+        self.path = path
+        self.os_build = os_build
+        self.ttl = ttl
+        self.runner = runner or Runner()
+        self.results = {}
+        self.scanned_at = None
+        self.load()
+        if self.is_stale() and not keep_stale:
+            # The next scan is stamped when it is saved
+            self.results = {}
+            self.scanned_at = None
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                cached = json.load(f)
+        except (IOError, OSError, ValueError):
+            return
+        if cached.get('os_build') == self.os_build:
+            self.results = cached.get('results', {})
+            self.scanned_at = cached.get('scanned_at')
+
+    def save(self):
+        if not self.results:
+            return
+        if self.scanned_at is None:
+            self.scanned_at = time.time()
+        cached = {'os_build': self.os_build, 'scanned_at': self.scanned_at,
+                  'results': self.results}
+        try:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(cached, f)
+            os.rename(tmp_path, self.path)
+        except (IOError, OSError):
+            pass
+
+    def is_stale(self):
+        '''True if there are no results or they are older than the ttl'''
+        if not self.results or self.scanned_at is None:
+            return True
+        return time.time() - self.scanned_at >= self.ttl
+
+    def downloaded(self):
+        '''Download everything Softwareupdate has to offer'''
+        if 'downloaded' not in self.results:
+            if self.runner.run(['-da']) is None:
+                return False
+            self.results['downloaded'] = True
+            self.save()
+        return self.results['downloaded']
+
+    def updates(self):
+        '''Return a list of all pending Updates, or None if softwareupdate
+        failed'''
+        if 'updates' not in self.results:
+            try:
+                updates = list(parse_updates(self.runner.stream(['-la'])))
+            except (subprocess.CalledProcessError, OSError):
+                return None
+            self.results['updates'] = [dict(u._asdict()) for u in updates]
+            self.results['restart_required'] = any(
+                u.restart_required for u in updates)
+            self.save()
+        return self.known_updates()
+
+    def known_updates(self):
+        '''Return the cached list of pending Updates without scanning, or
+        None if there is none'''
+        if 'updates' not in self.results:
+            return None
+        return [Update(**u) for u in self.results['updates']]
+
+    def restart_required(self):
+        '''True if any pending update needs a restart. softwareupdate is
+        stopped as soon as the first one is listed.'''
+        if 'restart_required' not in self.results:
+            stream = self.runner.stream(['-la'])
+            restart_required = False
+            try:
+                for update in parse_updates(stream):
+                    if update.restart_required:
+                        restart_required = True
+                        break
+            except (subprocess.CalledProcessError, OSError):
+                # Can't tell, so assume the worst
+                return True
+            finally:
+                stream.close()
+            self.results['restart_required'] = restart_required
+            self.save()
+        return self.results['restart_required']
+
+    def refresh(self):
+        '''Run a new scan, unless another process is already running one'''
+        with open(self.path + '.lock', 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except (IOError, OSError):
+                return
+            self.results = {}
+            self.scanned_at = None
+            self.downloaded()
+            self.updates()
@@ -0,0 +1,145 @@
+# Rule sets in nudge.json, for cohorts and staged rollouts. A rule matches
+# devices by a percentage bucket of their serial number, their model, a range
+# of OS versions or a list of serial numbers, and lays its own preferences and
+# software_updates over the config for the devices it matches.
+#
+# The rules are compiled into a RuleIndex once per config, and kept with the
+# loaded config. Serials and models are looked up in dicts, the bucket in a
+# table of 100 and the OS version in a sorted list of boundaries. Each lookup
+# gives a bit mask of the rules that match, so matching a device is four
+# lookups and an AND, however many serials the rules list.
+
+import bisect
+import hashlib
+
+import versions
+
+
+# first: the first rule that matches wins. priority: the matching rule with
+# the highest priority wins, earlier rules winning ties.
+MATCH_ORDERS = ('first', 'priority')
+# The loaded config keeps its RuleIndex under this key
+INDEX_KEY = 'rule_index'
+# Keys only used to pick the rule, left out of the config for the device
+RULE_KEYS = ('rules', 'rule_match', 'rollout_seed', INDEX_KEY)
+BUCKETS = 100
+
+
+def bucket(serial, seed=''):
+    '''Return the device's rollout bucket, from 0 to 99. A serial always
+    lands in the same bucket for the same seed.'''
+    digest = hashlib.sha256((seed + str(serial)).encode('utf-8')).hexdigest()
+    return int(digest[:8], 16) % BUCKETS
+
+
+def percent_range(value):
+    '''Return the buckets a percent match covers as (start, end), end
+    excluded. A single number is that share of devices, from bucket 0.'''
+    if isinstance(value, (list, tuple)):
+        return value[0], value[1]
+    return 0, value
+
+
+def os_bound(os_version, after=False):
+    '''Return where os_version sorts among the OS boundaries. With after,
+    it sorts past every device on that version.'''
+    return (versions.version(os_version).key, 1 if after else 0)
+
+
+class RuleIndex(object):
+    '''The rules of a config, ready to match against device facts'''
+    def __init__(self, rules, order='first', seed=''):
+        if order == 'priority':
+            # sorted() is stable, so earlier rules win ties
+            rules = sorted(rules, key=lambda rule: -rule.get('priority', 0))
+        self.rules = list(rules)
+        self.seed = seed
+        everything = (1 << len(self.rules)) - 1
+        self.serials = {}
+        self.models = {}
+        # Rules that don't match on serial, model or OS, so match any
+        self.any_serial = everything
+        self.any_model = everything
+        self.any_os = everything
+        self.buckets = [everything] * BUCKETS
+        os_ranges = []
+        for position, rule in enumerate(self.rules):
+            bit = 1 << position
+            match = rule.get('match', {})
+            if 'serials' in match:
+                self.any_serial &= ~bit
+                for serial in match['serials']:
+                    self.serials[serial] = self.serials.get(serial, 0) | bit
+            if 'models' in match:
+                self.any_model &= ~bit
+                for model in match['models']:
+                    self.models[model] = self.models.get(model, 0) | bit
+            if 'percent' in match:
+                start, end = percent_range(match['percent'])
+                for number in range(BUCKETS):
+                    if not start <= number < end:
+                        self.buckets[number] &= ~bit
+            if 'os_min' in match or 'os_max' in match:
+                self.any_os &= ~bit
+                low = high = None
+                if 'os_min' in match:
+                    low = os_bound(match['os_min'])
+                if 'os_max' in match:
+                    high = os_bound(match['os_max'], after=True)
+                os_ranges.append((bit, low, high))
+
+        # The boundaries split the versions into segments that the same
+        # rules match. Segment i runs from boundary i - 1 up to boundary i.
+        self.os_bounds = sorted(set(
+            bound for _, low, high in os_ranges for bound in (low, high)
+            if bound is not None))
+        self.os_masks = []
+        for segment in range(len(self.os_bounds) + 1):
+            mask = self.any_os
+            for bit, low, high in os_ranges:
+                if low is not None and (
+                        segment == 0 or self.os_bounds[segment - 1] < low):
+                    continue
+                if high is not None and (
+                        segment == len(self.os_bounds) or
+                        self.os_bounds[segment] > high):
+                    continue
+                mask |= bit
+            self.os_masks.append(mask)
+
+    def match(self, facts):
+        '''Return the rule for the device, or None if none matches'''
+        if not self.rules:
+            return None
+        mask = ((self.serials.get(facts.serial, 0) | self.any_serial) &
+                (self.models.get(facts.model, 0) | self.any_model) &
+                self.buckets[bucket(facts.serial, self.seed)] &
+                self.os_masks[bisect.bisect_right(
+                    self.os_bounds, os_bound(facts.os_version))])
+        if not mask:
+            return None
+        # The lowest bit is the winning rule
+        return self.rules[(mask & -mask).bit_length() - 1]
+
+
+def select(nudge_json, facts):
+    '''Return the config for the device: nudge_json with the preferences
+    and software_updates of the rule that matches it laid over the top, and
+    the name of the rule as rule. The rules themselves are left out.'''
+    selected = dict((key, value) for key, value in nudge_json.items()
+                    if key not in RULE_KEYS)
+    index = nudge_json.get(INDEX_KEY)
+    if index is None:
+        index = RuleIndex(nudge_json.get('rules', []),
+                          nudge_json.get('rule_match', 'first'),
+                          nudge_json.get('rollout_seed', ''))
+    rule = index.match(facts)
+    if rule is None:
+        selected['rule'] = None
+        return selected
+    selected['preferences'] = dict(nudge_json['preferences'],
+                                   **rule.get('preferences', {}))
+    if 'software_updates' in rule:
+        selected['software_updates'] = rule['software_updates']
+    selected['rule'] = rule.get('name')
+    return selected
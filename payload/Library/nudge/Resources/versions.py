@@ -0,0 +1,145 @@
+# Comparable macOS versions and build numbers. Parsed values are memoized, so
+# comparing the same strings again on every run or every device costs a dict
+# lookup instead of a new parse.
+#
+# Versions compare on their numbers, ignoring trailing zeros so 10.15 and
+# 10.15.0 are equal. A Rapid Security Response suffix like '13.3.1 (a)' sorts
+# after the plain release.
+#
+# Builds look like 18G103: the Darwin major number, a train letter for the
+# minor release, a build number and an optional lowercase suffix. Within a
+# train, betas (20A5364e) sort before releases (20A2411). Security response
+# builds (22E772610a) carry a six digit number and sort after the release
+# they patch.
+#
+# Strings that are neither sort below every version or build that is, so an
+# OS version nudge can't read is never taken as new enough.
+
+import abc
+import functools
+import operator
+import re
+
+
+# 13.3.1, optionally followed by a security response suffix like (a)
+VERSION = re.compile(r'^(?P<numbers>\d+(?:\.\d+)*)(?:\s*\((?P<rsr>[a-z])\))?$')
+BUILD = re.compile(
+    r'^(?P<major>\d+)(?P<train>[A-Z])(?P<number>\d+)(?P<suffix>[a-z]?)$')
+FALLBACK_PART = re.compile(r'\d+|[A-Za-z]+')
+
+# Where an unparsed string sorts relative to a parsed one
+UNPARSED, PARSED = 0, 1
+# Kinds of build within the same train
+PRERELEASE, RELEASE = 0, 1
+
+# Security response builds have more digits than any beta or release
+RSR_BUILD_NUMBER = 100000
+
+
+def fallback_key(text):
+    '''Sort key for strings that don't look like a version or build. Numbers
+    sort before letters, like in LooseVersion, without mixing types.'''
+    return tuple((0, int(part), '') if part.isdigit() else (1, 0, part)
+                 for part in FALLBACK_PART.findall(text))
+
+
+class Comparable(abc.ABC):
+    '''A parsed string and its sort key. Compares against another instance
+    of the same class, or a string that is parsed the same way.'''
+    __slots__ = ('text', 'key')
+
+    def __init__(self, text, key):
+        self.text = text
+        self.key = key
+
+    @staticmethod
+    @abc.abstractmethod
+    def parse(text):
+        '''Return the instance for text, used to compare against strings'''
+
+    @property
+    def parsed(self):
+        '''False if the string didn't look like a version or build'''
+        return self.key[0] == PARSED
+
+    def _compare(self, other, op):
+        if isinstance(other, str):
+            other = self.parse(other)
+        if type(other) is not type(self):
+            return NotImplemented
+        return op(self.key, other.key)
+
+    def __eq__(self, other):
+        return self._compare(other, operator.eq)
+
+    def __ne__(self, other):
+        return self._compare(other, operator.ne)
+
+    def __lt__(self, other):
+        return self._compare(other, operator.lt)
+
+    def __le__(self, other):
+        return self._compare(other, operator.le)
+
+    def __gt__(self, other):
+        return self._compare(other, operator.gt)
+
+    def __ge__(self, other):
+        return self._compare(other, operator.ge)
+
+    def __hash__(self):
+        return hash((type(self), self.key))
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return '%s(%r)' % (type(self).__name__, self.text)
+
+
+class Version(Comparable):
+    '''A macOS version like 10.14.6 or 13.3.1 (a)'''
+    __slots__ = ()
+
+    @staticmethod
+    def parse(text):
+        return version(text)
+
+
+class Build(Comparable):
+    '''A macOS build like 18G103, 20A5364e or 22E772610a'''
+    __slots__ = ()
+
+    @staticmethod
+    def parse(text):
+        return build(text)
+
+
+@functools.lru_cache(maxsize=1024)
+def version(text):
+    '''Return the Version for text'''
+    text = str(text).strip()
+    match = VERSION.match(text)
+    if not match:
+        return Version(text, (UNPARSED, fallback_key(text), ''))
+    numbers = [int(part) for part in match.group('numbers').split('.')]
+    while len(numbers) > 1 and numbers[-1] == 0:
+        numbers.pop()
+    return Version(text, (PARSED, tuple(numbers), match.group('rsr') or ''))
+
+
+@functools.lru_cache(maxsize=1024)
+def build(text):
+    '''Return the Build for text'''
+    text = str(text).strip()
+    match = BUILD.match(text)
+    if not match:
+        return Build(text, (UNPARSED, fallback_key(text)))
+    number = int(match.group('number'))
+    suffix = match.group('suffix')
+    if suffix and number < RSR_BUILD_NUMBER:
+        kind = PRERELEASE
+    else:
+        kind = RELEASE
+    return Build(text, (PARSED, int(match.group('major')),
+                        match.group('train'), kind, number, suffix))
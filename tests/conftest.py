@@ -0,0 +1,26 @@
+# nudge's modules live next to the nudge script rather than in a package, so
+# put that directory on the path the way running nudge does.
+
+import importlib.machinery
+import os
+import sys
+import types
+
+import pytest
+
+
+RESOURCES_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    '..', 'payload', 'Library', 'nudge', 'Resources')
+sys.path.insert(0, os.path.abspath(RESOURCES_DIR))
+
+
+@pytest.fixture
+def nudge():
+    '''The nudge script, loaded as a module without running main()'''
+    path = os.path.join(os.path.abspath(RESOURCES_DIR), 'nudge')
+    loader = importlib.machinery.SourceFileLoader('nudge', path)
+    module = types.ModuleType(loader.name)
+    module.__file__ = path
+    loader.exec_module(module)
+    return module
@@ -0,0 +1,122 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import pytest
+
+import agent
+
+
+class Recorder(object):
+    '''A check that counts itself, and what was presented and reloaded'''
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.checks = 0
+        self.reloads = 0
+        self.presented = []
+        self.lock = threading.Lock()
+
+    def check(self):
+        with self.lock:
+            self.checks += 1
+            if self.checks == self.fail_on:
+                raise SystemExit(1)
+            return {'show': True, 'check': self.checks}
+
+    def reload(self):
+        with self.lock:
+            self.reloads += 1
+
+
+@pytest.fixture
+def directory():
+    # AF_UNIX paths are short, keep the socket out of pytest's tmp_path
+    path = tempfile.mkdtemp(prefix='nudge-agent')
+    yield path
+    shutil.rmtree(path)
+
+
+@pytest.fixture
+def running(directory, monkeypatch):
+    monkeypatch.setattr(agent, 'WATCH_INTERVAL', 0.05)
+    config = os.path.join(directory, 'nudge.json')
+    with open(config, 'w') as f:
+        f.write('{}')
+    recorder = Recorder()
+    resident = agent.Agent(
+        recorder.check, recorder.presented.append, recorder.reload,
+        os.path.join(directory, agent.SOCKET_NAME), interval=3600,
+        watch_paths=[config])
+    resident.start()
+    assert resident.wait(1, 5)
+    yield resident, recorder, config
+    resident.stop()
+
+
+def test_status(running):
+    resident, recorder, _ = running
+    status = agent.send_command(resident.socket_path, 'status', 5)
+    assert status['pid'] == os.getpid()
+    assert status['checks'] == 1
+    assert status['last_trigger'] == 'scheduled'
+    assert status['result'] == {'show': True, 'check': 1}
+    assert recorder.presented == [{'show': True, 'check': 1}]
+
+
+def test_check_answers_once_checked(running):
+    resident, recorder, _ = running
+    status = agent.send_command(resident.socket_path, 'check', 5)
+    assert status['checks'] == 2
+    assert status['last_trigger'] == 'requested'
+    assert recorder.reloads == 0
+
+
+def test_reload_reloads_before_checking(running):
+    resident, recorder, _ = running
+    status = agent.send_command(resident.socket_path, 'reload', 5)
+    assert status['last_trigger'] == 'reload'
+    assert recorder.reloads == 1
+
+
+def test_changed_config_is_reloaded(running):
+    resident, recorder, config = running
+    with open(config, 'w') as f:
+        f.write('{"preferences": {}}')
+    assert resident.wait(2, 5)
+    assert resident.status()['last_trigger'] == 'changed'
+    assert recorder.reloads == 1
+
+
+def test_unknown_command(running):
+    resident, _, _ = running
+    assert agent.send_command(resident.socket_path, 'bogus', 5) == {
+        'error': 'Unknown command: bogus'}
+
+
+def test_failed_check_keeps_the_agent_running(directory):
+    recorder = Recorder(fail_on=1)
+    resident = agent.Agent(
+        recorder.check, recorder.presented.append, recorder.reload,
+        os.path.join(directory, agent.SOCKET_NAME), interval=3600)
+    resident.start()
+    try:
+        assert resident.wait(1, 5)
+        assert resident.status()['error'] == 'SystemExit: 1'
+        assert recorder.presented == []
+        status = agent.send_command(resident.socket_path, 'check', 5)
+        assert status['error'] is None
+        assert recorder.presented == [{'show': True, 'check': 2}]
+    finally:
+        resident.stop()
+
+
+def test_stopped_agent_has_no_socket(directory):
+    resident = agent.Agent(lambda: None, None, None,
+                           os.path.join(directory, agent.SOCKET_NAME))
+    resident.start()
+    resident.stop()
+    time.sleep(0.01)
+    with pytest.raises(OSError):
+        agent.send_command(resident.socket_path, 'status', 5)
@@ -0,0 +1,163 @@
+import http.server
+import os
+import threading
+import time
+
+import pytest
+
+import assets
+import httpgurl
+
+
+class Connection(object):
+    '''What a finished gurl connection tells the cache'''
+    def __init__(self, status, headers=None, length=0, error=None):
+        self.status = status
+        self.headers = headers or {}
+        self.error = error
+        self.expectedLength = length
+        self.bytesReceived = length
+
+
+class Server(object):
+    '''A stand-in for the download function, serving images from a dict'''
+    def __init__(self):
+        self.images = {}
+        self.requests = []
+        self.up = True
+
+    def download(self, options):
+        self.requests.append(options)
+        if not self.up:
+            return Connection(None, error='offline')
+        body, etag = self.images[options['url']]
+        if options.get('cache_data', {}).get('etag') == etag:
+            return Connection(304)
+        with open(options['file'], 'wb') as f:
+            f.write(body)
+        return Connection(200, {'ETag': etag}, len(body))
+
+
+@pytest.fixture
+def server():
+    return Server()
+
+
+def cache(tmp_path, server, **limits):
+    return assets.AssetCache(str(tmp_path / 'assets'), server.download,
+                             lambda text: None, **limits)
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_a_download_is_cached_and_revalidated(tmp_path, server):
+    url = 'https://example.com/logo.png'
+    server.images[url] = (b'logo', '"v1"')
+    path = cache(tmp_path, server).path_for(url)
+    assert read(path) == b'logo'
+    # A new process, with the index read back from disk
+    assert cache(tmp_path, server).path_for(url) == path
+    assert server.requests[1]['cache_data'] == {'etag': '"v1"'}
+
+
+def test_a_changed_image_replaces_the_cached_one(tmp_path, server):
+    url = 'https://example.com/logo.png'
+    server.images[url] = (b'logo', '"v1"')
+    asset_cache = cache(tmp_path, server)
+    asset_cache.path_for(url)
+    server.images[url] = (b'new logo', '"v2"')
+    assert read(asset_cache.path_for(url)) == b'new logo'
+
+
+def test_the_cached_copy_is_used_offline(tmp_path, server):
+    url = 'https://example.com/logo.png'
+    server.images[url] = (b'logo', '"v1"')
+    asset_cache = cache(tmp_path, server)
+    path = asset_cache.path_for(url)
+    server.up = False
+    assert asset_cache.path_for(url) == path
+    assert asset_cache.path_for('https://example.com/other.png') is None
+
+
+def test_least_recently_used_images_are_evicted(tmp_path, server):
+    asset_cache = cache(tmp_path, server, max_cache_bytes=10)
+    urls = ['https://example.com/%s.png' % number for number in range(3)]
+    paths = []
+    for number, url in enumerate(urls):
+        server.images[url] = (str(number).encode() * 4, '"%s"' % number)
+        paths.append(asset_cache.path_for(url))
+    assert not os.path.exists(paths[0])
+    assert urls[0] not in asset_cache.index
+    assert all(os.path.exists(path) for path in paths[1:])
+
+
+def test_images_over_the_limit_are_not_cached(tmp_path, server):
+    url = 'https://example.com/logo.png'
+    server.images[url] = (b'x' * 100, '"v1"')
+    asset_cache = cache(tmp_path, server, max_asset_bytes=50)
+    assert asset_cache.path_for(url) is None
+    assert server.requests[0]['max_bytes'] == 50
+    assert asset_cache.index == {}
+    assert os.listdir(asset_cache.cache_dir) == []
+
+
+def test_using_an_evicted_entry_is_harmless(tmp_path, server):
+    url = 'https://example.com/logo.png'
+    server.images[url] = (b'logo', '"v1"')
+    asset_cache = cache(tmp_path, server)
+    path = asset_cache.path_for(url)
+    # Evicted by another thread between the download and _used()
+    del asset_cache.index[url]
+    assert asset_cache._used(url, path) == path
+
+
+CHUNK = b'x' * 65536
+CHUNKS = 100
+
+
+class StreamHandler(http.server.BaseHTTPRequestHandler):
+    '''Sends a large image slowly, with or without its Content-Length'''
+    def do_GET(self):
+        self.server.served = 0
+        self.send_response(200)
+        if self.path == '/sized.png':
+            self.send_header('Content-Length', str(len(CHUNK) * CHUNKS))
+        self.end_headers()
+        try:
+            for _ in range(CHUNKS):
+                self.wfile.write(CHUNK)
+                self.server.served += len(CHUNK)
+                time.sleep(0.01)
+        except (IOError, OSError):
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stream_server():
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), StreamHandler)
+    thread = threading.Thread(target=httpd.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+    httpgurl.POOL.clear()
+
+
+@pytest.mark.parametrize('name', ['sized.png', 'unsized.png'])
+def test_large_downloads_are_cancelled(nudge, tmp_path, stream_server, name):
+    nudge.HTTP_BACKEND = 'python'
+    asset_cache = assets.AssetCache(str(tmp_path / 'assets'),
+                                    nudge.downloadfile, lambda text: None,
+                                    max_asset_bytes=256 * 1024)
+    url = 'http://127.0.0.1:%d/%s' % (stream_server.server_address[1], name)
+    assert asset_cache.path_for(url) is None
+    # Stopped long before the server was done
+    assert stream_server.served < len(CHUNK) * CHUNKS // 2
+    assert os.listdir(asset_cache.cache_dir) == []
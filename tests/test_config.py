@@ -0,0 +1,54 @@
+import json
+
+import config
+import targeting
+
+
+RAW = json.dumps({
+    'preferences': {'minimum_os_version': '11.2.3',
+                    'cut_off_date': '2021-03-01-00:00',
+                    'bogus': 1},
+    'rules': [{'name': 'pilot', 'match': {'percent': 10}}],
+})
+
+
+def load(cache_path):
+    logged = []
+    return config.load(RAW, cache_path, logged.append), logged
+
+
+def test_compiled_config_is_cached(tmp_path):
+    cache_path = str(tmp_path / config.CACHE_NAME)
+    nudge_json, logged = load(cache_path)
+    assert logged == ['Config: Unknown preference: bogus']
+    assert nudge_json['preferences']['cut_off_date'].year == 2021
+    assert isinstance(nudge_json[targeting.INDEX_KEY], targeting.RuleIndex)
+
+    cached_json, logged = load(cache_path)
+    assert logged == []
+    assert cached_json['preferences'] == nudge_json['preferences']
+    assert cached_json['rules'] == nudge_json['rules']
+    assert isinstance(cached_json[targeting.INDEX_KEY], targeting.RuleIndex)
+
+
+def test_cache_from_another_format_is_compiled_again(tmp_path):
+    cache_path = str(tmp_path / config.CACHE_NAME)
+    load(cache_path)
+    with open(cache_path) as f:
+        cached = json.load(f)
+    cached['config'][config.COMPILED_KEY] = config.COMPILED_FORMAT - 1
+    del cached['config']['rules']
+    with open(cache_path, 'w') as f:
+        json.dump(cached, f)
+
+    nudge_json, logged = load(cache_path)
+    assert logged == ['Config: Unknown preference: bogus']
+    assert nudge_json['rules'][0]['name'] == 'pilot'
+
+
+def test_broken_cache_is_ignored(tmp_path):
+    cache_path = str(tmp_path / config.CACHE_NAME)
+    with open(cache_path, 'w') as f:
+        f.write('{"digest": ')
+    nudge_json, _ = load(cache_path)
+    assert nudge_json['preferences']['minimum_os_version'] == '11.2.3'
@@ -0,0 +1,119 @@
+from datetime import datetime, timedelta
+
+import decision
+import devicefacts
+
+
+NOW = datetime(2021, 3, 1, 12, 0)
+
+
+def facts(os_version='10.15.7', os_build='19H2'):
+    return devicefacts.DeviceFacts(os_version, os_build, 'C02TEST00001')
+
+
+def config(**preferences):
+    return {'preferences': dict({'minimum_os_version': '11.2.3'},
+                                **preferences),
+            'software_updates': []}
+
+
+def deadline(seconds):
+    return (NOW + timedelta(seconds=seconds)).strftime(decision.DATE_FORMAT)
+
+
+def test_compliant_device_is_skipped():
+    plan = decision.evaluate(config(), facts('11.2.3', '20D91'), NOW)
+    assert not plan.show
+    assert not plan.error
+
+
+def test_major_upgrade_without_a_deadline_only_shows_ok():
+    plan = decision.evaluate(config(), facts(), NOW)
+    assert plan.show
+    assert plan.upgrade == 'major'
+    assert plan.tier is None
+    assert plan.show_ok and not plan.show_understand
+
+
+def test_tiers_follow_the_cut_off_date():
+    cases = [
+        (10 * 86400, 'initial', True, False, 14400),
+        (2 * 86400, 'day_3', False, True, 7200),
+        (12 * 3600, 'day_1', False, True, 600),
+        (1800, 'final', False, False, 60),
+        (-60, 'elapsed', False, False, 10),
+    ]
+    for seconds, tier, show_ok, show_understand, timer in cases:
+        plan = decision.evaluate(config(cut_off_date=deadline(seconds)),
+                                 facts(), NOW)
+        assert (plan.tier, plan.show_ok, plan.show_understand,
+                plan.timer) == (tier, show_ok, show_understand, timer)
+
+
+def test_no_timer_keeps_the_tier_without_a_timer():
+    plan = decision.evaluate(
+        config(cut_off_date=deadline(3600 * 12), no_timer=True), facts(), NOW)
+    assert plan.tier == 'day_1'
+    assert plan.timer is None
+
+
+def test_big_sur_reporting_10_16_is_an_error():
+    plan = decision.evaluate(config(), facts('10.16', '20A2411'), NOW)
+    assert not plan.show
+    assert plan.error
+
+
+def minor_config(**preferences):
+    return config(minimum_os_version='11.2.3',
+                  minimum_os_sub_build_version='20D91', update_minor=True,
+                  **preferences)
+
+
+def test_minor_update_needs_a_scan_first():
+    plan = decision.evaluate(minor_config(), facts('11.2.1', '20D74'), NOW)
+    assert plan.needs_scan
+    assert plan.upgrade == 'minor'
+
+
+def test_minor_update_without_pending_updates_resets_seen():
+    scan = decision.ScanResult([], None, [])
+    plan = decision.evaluate(minor_config(), facts('11.2.1', '20D74'), NOW,
+                             scan)
+    assert not plan.show
+    assert plan.reset_seen
+
+
+def test_days_between_notifications_uses_last_seen():
+    scan = decision.ScanResult([{'Product Key': '071-00001'}], True, [])
+    nudge_json = minor_config(days_between_notifications=2)
+    seen = (NOW - timedelta(days=1)).strftime(decision.SEEN_FORMAT)
+    plan = decision.evaluate(nudge_json, facts('11.2.1', '20D74'), NOW, scan,
+                             seen, seen)
+    assert not plan.show
+    seen = (NOW - timedelta(days=3)).strftime(decision.SEEN_FORMAT)
+    plan = decision.evaluate(nudge_json, facts('11.2.1', '20D74'), NOW, scan,
+                             seen, seen)
+    assert plan.show
+
+
+def test_minor_deadline_comes_from_software_updates():
+    nudge_json = minor_config()
+    nudge_json['software_updates'] = [
+        {'name': '071-00001', 'force_install_date': deadline(2 * 86400)}]
+    scan = decision.ScanResult([{'Product Key': '071-00001'}], True, [])
+    plan = decision.evaluate(nudge_json, facts('11.2.1', '20D74'), NOW, scan)
+    assert plan.show
+    assert plan.tier == 'day_3'
+
+
+def test_unreadable_os_version_is_an_error():
+    for os_version in ('', 'unknown'):
+        plan = decision.evaluate(config(), facts(os_version), NOW)
+        assert not plan.show
+        assert plan.error
+
+
+def test_unreadable_os_build_is_an_error_for_minor_updates():
+    plan = decision.evaluate(minor_config(), facts('11.2.1', ''), NOW)
+    assert not plan.show
+    assert plan.error
@@ -0,0 +1,44 @@
+import os
+
+import devicefacts
+
+
+class Provider(object):
+    def __init__(self, session_key, serial='C02TEST00001'):
+        self.key = session_key
+        self.serial = serial
+        self.collected = 0
+
+    def session_key(self):
+        return self.key
+
+    def collect(self):
+        self.collected += 1
+        return {'os_version': '11.2.3', 'os_build': '20D91',
+                'serial': self.serial, 'model': 'Mac14,2'}
+
+
+def test_facts_are_cached_for_the_session(tmp_path):
+    path = str(tmp_path / 'device_facts.json')
+    provider = Provider(['boot-1', '20D91'])
+    assert devicefacts.load(path, provider).serial == 'C02TEST00001'
+    assert devicefacts.load(path, provider).model == 'Mac14,2'
+    assert provider.collected == 1
+
+    provider = Provider(['boot-2', '20D91'], serial='C02TEST00002')
+    assert devicefacts.load(path, provider).serial == 'C02TEST00002'
+    assert provider.collected == 1
+
+
+def test_unknown_session_is_not_cached(tmp_path):
+    path = str(tmp_path / 'device_facts.json')
+    provider = Provider([None, None])
+    devicefacts.load(path, provider)
+    devicefacts.load(path, provider)
+    assert provider.collected == 2
+    assert not os.path.exists(path)
+
+    # Nor is a cache from a known session used
+    devicefacts.load(path, Provider(['boot-1', '20D91']))
+    provider = Provider(['boot-1', None], serial='C02TEST00002')
+    assert devicefacts.load(path, provider).serial == 'C02TEST00002'
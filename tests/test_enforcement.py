@@ -0,0 +1,102 @@
+import os
+
+import enforcement
+
+
+class Date(object):
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def timeIntervalSince1970(self):
+        return self.seconds
+
+
+class RunningApp(object):
+    '''Duck typed on NSRunningApplication'''
+    def __init__(self, pid, bundle_id, path, launched=1000.0):
+        self.pid = pid
+        self.bundle_id = bundle_id
+        self.path = path
+        self.launched = launched
+        self.hidden = False
+
+    def processIdentifier(self):
+        return self.pid
+
+    def bundleIdentifier(self):
+        return self.bundle_id
+
+    def bundleURL(self):
+        return 'file://%s/' % self.path.replace(' ', '%20')
+
+    def launchDate(self):
+        return Date(self.launched) if self.launched is not None else None
+
+    def hide(self):
+        self.hidden = True
+
+
+class Workspace(object):
+    def __init__(self, apps):
+        self.apps = apps
+
+    def runningApplications(self):
+        return self.apps
+
+
+INSTALLER = '/Applications/Install macOS Big Sur.app'
+
+
+def enforcer(apps):
+    return enforcement.Enforcer(
+        Workspace(apps),
+        enforcement.AppPolicy(bundle_ids=['com.apple.systempreferences']),
+        enforcement.AppPolicy(paths=[INSTALLER]), lambda text: None)
+
+
+def test_start_hides_what_is_not_acceptable():
+    apps = [RunningApp(100, 'com.apple.Safari', '/Applications/Safari.app'),
+            RunningApp(101, 'com.apple.systempreferences',
+                       '/System/Applications/System Preferences.app'),
+            RunningApp(102, 'com.apple.InstallAssistant.BigSur', INSTALLER),
+            RunningApp(os.getpid(), 'org.python.python', '/usr/bin/python3')]
+    recorder = enforcer(apps)
+    assert recorder.start()
+    assert [app.hidden for app in apps] == [True, False, False, False]
+    assert not recorder.start()
+
+
+def test_nothing_is_hidden_once_stopped():
+    recorder = enforcer([])
+    recorder.start()
+    assert recorder.stop()
+    safari = RunningApp(100, 'com.apple.Safari', '/Applications/Safari.app')
+    recorder.app_changed(safari)
+    assert not safari.hidden
+    assert recorder.apps == {}
+
+
+def test_a_reused_pid_is_resolved_again():
+    recorder = enforcer([])
+    settings = RunningApp(100, 'com.apple.systempreferences',
+                          '/System/Applications/System Preferences.app')
+    # Before enforcement starts, nudge still asks what is in front
+    assert recorder.is_acceptable(settings)
+    # System Preferences quit unseen, and its pid went to another app
+    safari = RunningApp(100, 'com.apple.Safari', '/Applications/Safari.app',
+                        launched=2000.0)
+    assert not recorder.is_acceptable(safari)
+    recorder.start()
+    recorder.app_changed(safari)
+    assert safari.hidden
+
+
+def test_a_quit_app_is_forgotten():
+    safari = RunningApp(100, 'com.apple.Safari', '/Applications/Safari.app')
+    daemon = RunningApp(200, None, '/usr/libexec/daemon', launched=None)
+    recorder = enforcer([safari, daemon])
+    recorder.start()
+    assert len(recorder.apps) == 2
+    recorder.app_terminated(safari)
+    recorder.app_terminated(daemon)
+    assert recorder.apps == {}
@@ -0,0 +1,384 @@
+# The same cases run against gurl and httpgurl, so the two backends
+# downloadfile() can use stay interchangeable. gurl needs Foundation, so it is
+# loaded with the stand-ins in tools/pyobjc_fakes and driven the way
+# NSURLConnection would drive it: the request it builds is sent with
+# http.client, and the response is fed to its delegate methods. HTTPS is
+# only checked against httpgurl, gurl leaves TLS to the system.
+
+import http.client
+import http.server
+import importlib
+import os
+import shutil
+import ssl
+import subprocess
+import sys
+import threading
+from urllib.parse import urljoin, urlparse
+
+import pytest
+
+import httpgurl
+
+
+FAKES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                         'tools', 'pyobjc_fakes')
+BODY = b'{"preferences": {"minimum_os_version": "11.2.3"}}' * 20
+ETAG = '"v1"'
+LAST_MODIFIED = 'Mon, 01 Mar 2021 12:00:00 GMT'
+PARTIAL = 100
+
+
+@pytest.fixture(scope='module')
+def gurl():
+    saved_path = list(sys.path)
+    saved_modules = dict(sys.modules)
+    sys.path.insert(0, os.path.abspath(FAKES_DIR))
+    try:
+        yield importlib.import_module('gurl')
+    finally:
+        sys.path[:] = saved_path
+        for name in set(sys.modules) - set(saved_modules):
+            del sys.modules[name]
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.requests.append(self.headers)
+        if self.path == '/moved':
+            self.send_response(302)
+            self.send_header('Location', '/nudge.json')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if self.headers.get('If-None-Match') == self.server.etag:
+            self.send_response(304)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = self.server.body
+        start = 0
+        byte_range = self.headers.get('Range', '')
+        if byte_range.startswith('bytes=') and byte_range.endswith('-'):
+            start = int(byte_range[len('bytes='):-1])
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes %d-%d/%d' % (
+                start, len(body) - 1, len(body)))
+        else:
+            self.send_response(200)
+        self.send_header('ETag', self.server.etag)
+        self.send_header('Last-Modified', LAST_MODIFIED)
+        self.send_header('Content-Length', str(len(body) - start))
+        self.end_headers()
+        self.wfile.write(body[start:])
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(context=None):
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    if context is not None:
+        httpd.socket = context.wrap_socket(httpd.socket, server_side=True)
+    httpd.requests = []
+    httpd.etag = ETAG
+    httpd.body = BODY
+    thread = threading.Thread(target=httpd.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return httpd
+
+
+@pytest.fixture
+def server():
+    httpd = serve()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+    httpgurl.POOL.clear()
+
+
+def url(server, path='/nudge.json', scheme='http'):
+    return '%s://127.0.0.1:%d%s' % (scheme, server.server_address[1], path)
+
+
+class NSHTTPURLResponse(object):
+    '''What gurl reads from the response NSURLConnection hands it'''
+    def __init__(self, response):
+        self.response = response
+
+    def className(self):
+        return 'NSHTTPURLResponse'
+
+    def statusCode(self):
+        return self.response.status
+
+    def allHeaderFields(self):
+        return dict(self.response.getheaders())
+
+    def expectedContentLength(self):
+        length = self.response.getheader('Content-Length')
+        return -1 if length is None else int(length)
+
+
+def send(request):
+    parsed = urlparse(request.URL().absoluteString())
+    connection = http.client.HTTPConnection(parsed.hostname, parsed.port)
+    connection.request('GET', parsed.path,
+                       headers=request.allHTTPHeaderFields())
+    return connection, connection.getresponse()
+
+
+def fetch_with_gurl(gurl, options):
+    '''Run a gurl.Gurl the way NSURLConnection does, and return it done'''
+    import Foundation
+    connection = gurl.Gurl.alloc().initWithOptions_(options)
+    connection.start()
+    request = connection.connection.request
+    while True:
+        http_connection, response = send(request)
+        location = response.getheader('Location')
+        if response.status not in httpgurl.REDIRECT_STATUSES or not location:
+            break
+        response.read()
+        new_url = urljoin(request.URL().absoluteString(), location)
+        new_request = Foundation.NSMutableURLRequest(
+            Foundation.NSURL.URLWithString_(new_url))
+        new_request.headers = request.allHTTPHeaderFields()
+        if connection.handleRedirect_newRequest_withCompletionHandler_(
+                NSHTTPURLResponse(response), new_request, None) is None:
+            break
+        request = new_request
+    connection.handleResponse_withCompletionHandler_(
+        NSHTTPURLResponse(response), None)
+    data = response.read()
+    if data:
+        connection.handleReceivedData_(data)
+    http_connection.close()
+    connection.connectionDidFinishLoading_(None)
+    return connection
+
+
+def fetch_with_httpgurl(gurl, options):
+    return httpgurl.fetch(options)
+
+
+BACKENDS = [fetch_with_gurl, fetch_with_httpgurl]
+
+
+def request_headers(gurl, backend, options):
+    if backend is fetch_with_gurl:
+        connection = gurl.Gurl.alloc().initWithOptions_(options)
+        connection.start()
+        headers = connection.connection.request.allHTTPHeaderFields()
+    else:
+        connection = httpgurl.HTTPGurl.alloc().initWithOptions_(options)
+        headers = connection._request_headers()
+    return dict((name.lower(), value) for name, value in headers.items())
+
+
+def partial_file(path, stored):
+    with open(path, 'wb') as f:
+        f.write(BODY[:PARTIAL])
+    try:
+        httpgurl.store_headers(path, stored)
+    except OSError:
+        pytest.skip('no xattr support on %s' % os.path.dirname(path))
+
+
+# options, headers stored with an existing file or None, request headers
+HEADER_CASES = {
+    'plain': ({}, None, {}),
+    'additional headers': (
+        {'additional_headers': {'User-Agent': 'nudge'}}, None,
+        {'user-agent': 'nudge'}),
+    'cache data': (
+        {'download_only_if_changed': True,
+         'cache_data': {'etag': ETAG, 'last-modified': LAST_MODIFIED}},
+        None, {'if-none-match': ETAG, 'if-modified-since': LAST_MODIFIED}),
+    'stored headers': (
+        {'download_only_if_changed': True},
+        {'etag': ETAG, 'last-modified': LAST_MODIFIED},
+        {'if-none-match': ETAG, 'if-modified-since': LAST_MODIFIED}),
+    'resume': (
+        {'can_resume': True, 'download_only_if_changed': True},
+        {'etag': ETAG, 'expected-length': len(BODY)},
+        {'range': 'bytes=%d-' % PARTIAL}),
+    'no resume without expected length': (
+        {'can_resume': True},
+        {'etag': ETAG}, {}),
+}
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+@pytest.mark.parametrize('case', sorted(HEADER_CASES))
+def test_request_headers(gurl, backend, case, tmp_path):
+    options, stored, expected = HEADER_CASES[case]
+    path = str(tmp_path / 'nudge.json')
+    if stored is not None:
+        partial_file(path, stored)
+    options = dict(options, url='http://127.0.0.1/nudge.json', file=path)
+    assert request_headers(gurl, backend, options) == expected
+
+
+# follow_redirects, redirect target, allowed
+REDIRECT_CASES = [
+    (False, 'https://example.com/nudge.json', False),
+    (True, 'http://example.com/nudge.json', True),
+    ('all', 'http://example.com/nudge.json', True),
+    ('https', 'https://example.com/nudge.json', True),
+    ('https', 'http://example.com/nudge.json', False),
+    ('none', 'https://example.com/nudge.json', False),
+]
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+@pytest.mark.parametrize('follow_redirects,new_url,allowed', REDIRECT_CASES)
+def test_redirect_policy(gurl, backend, follow_redirects, new_url, allowed):
+    options = {'url': 'http://127.0.0.1/moved', 'file': '/nonexistent',
+               'follow_redirects': follow_redirects}
+    if backend is fetch_with_gurl:
+        import Foundation
+
+        class Response(object):
+            def allHeaderFields(self):
+                return {'Location': new_url}
+        connection = gurl.Gurl.alloc().initWithOptions_(options)
+        request = Foundation.NSMutableURLRequest(
+            Foundation.NSURL.URLWithString_(new_url))
+        result = connection.handleRedirect_newRequest_withCompletionHandler_(
+            Response(), request, None)
+        assert (result is request) == allowed
+    else:
+        connection = httpgurl.HTTPGurl.alloc().initWithOptions_(options)
+        assert connection.allowRedirect_(new_url) == allowed
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_download_stores_headers(gurl, backend, server, tmp_path):
+    path = str(tmp_path / 'nudge.json')
+    connection = backend(gurl, {'url': url(server), 'file': path})
+    assert connection.status == 200
+    assert connection.bytesReceived == len(BODY)
+    with open(path, 'rb') as f:
+        assert f.read() == BODY
+    stored = httpgurl.get_stored_headers(path)
+    if not stored:
+        pytest.skip('no xattr support on %s' % tmp_path)
+    assert stored == {'etag': ETAG, 'last-modified': LAST_MODIFIED}
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_unchanged_download_is_not_written(gurl, backend, server, tmp_path):
+    path = str(tmp_path / 'nudge.json')
+    with open(path, 'wb') as f:
+        f.write(b'cached')
+    connection = backend(gurl, {
+        'url': url(server), 'file': path, 'download_only_if_changed': True,
+        'cache_data': {'etag': ETAG}})
+    assert connection.status == 304
+    with open(path, 'rb') as f:
+        assert f.read() == b'cached'
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_partial_download_is_resumed(gurl, backend, server, tmp_path):
+    path = str(tmp_path / 'nudge.json')
+    partial_file(path, {'etag': ETAG, 'last-modified': LAST_MODIFIED,
+                        'expected-length': len(BODY)})
+    connection = backend(gurl, {'url': url(server), 'file': path,
+                                'can_resume': True})
+    assert server.requests[-1]['Range'] == 'bytes=%d-' % PARTIAL
+    assert connection.status == 206
+    assert connection.bytesReceived == len(BODY)
+    assert connection.expectedLength == len(BODY)
+    with open(path, 'rb') as f:
+        assert f.read() == BODY
+    # Complete, so the next run doesn't try to resume it
+    assert 'expected-length' not in httpgurl.get_stored_headers(path)
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+@pytest.mark.parametrize('follow_redirects,status', [(False, 302),
+                                                     (True, 200)])
+def test_redirect_is_followed_by_option(gurl, backend, server, tmp_path,
+                                        follow_redirects, status):
+    path = str(tmp_path / 'nudge.json')
+    connection = backend(gurl, {'url': url(server, '/moved'), 'file': path,
+                                'follow_redirects': follow_redirects})
+    assert connection.status == status
+    assert connection.redirection[0][0] == url(server)
+    assert os.path.isfile(path) == (status == 200)
+
+
+@pytest.mark.parametrize('writer,reader', [
+    (fetch_with_gurl, fetch_with_httpgurl),
+    (fetch_with_httpgurl, fetch_with_gurl)])
+def test_stored_headers_are_shared(gurl, writer, reader, server, tmp_path):
+    path = str(tmp_path / 'nudge.json')
+    writer(gurl, {'url': url(server), 'file': path})
+    if not httpgurl.get_stored_headers(path):
+        pytest.skip('no xattr support on %s' % tmp_path)
+    connection = reader(gurl, {'url': url(server), 'file': path,
+                               'download_only_if_changed': True})
+    assert connection.status == 304
+    assert server.requests[-1]['If-None-Match'] == ETAG
+
+
+def test_changed_file_is_downloaded_again(server, tmp_path):
+    # gurl unlinks the partial file twice on this path, so httpgurl only
+    path = str(tmp_path / 'nudge.json')
+    partial_file(path, {'etag': '"v0"', 'last-modified': LAST_MODIFIED,
+                        'expected-length': len(BODY)})
+    connection = httpgurl.fetch({'url': url(server), 'file': path,
+                                 'can_resume': True})
+    assert connection.status == 200
+    assert 'Range' not in server.requests[-1]
+    with open(path, 'rb') as f:
+        assert f.read() == BODY
+
+
+@pytest.fixture(scope='module')
+def certificate(tmp_path_factory):
+    '''A self-signed certificate and key for 127.0.0.1'''
+    openssl = shutil.which('openssl')
+    if openssl is None:
+        pytest.skip('openssl is not installed')
+    cert_dir = tmp_path_factory.mktemp('tls')
+    cert = str(cert_dir / 'cert.pem')
+    key = str(cert_dir / 'key.pem')
+    subprocess.check_call([
+        openssl, 'req', '-x509', '-newkey', 'rsa:2048', '-nodes',
+        '-keyout', key, '-out', cert, '-days', '1', '-subj', '/CN=127.0.0.1',
+        '-addext', 'subjectAltName=IP:127.0.0.1'],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return cert, key
+
+
+@pytest.fixture
+def https_server(certificate):
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(*certificate)
+    httpd = serve(context)
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+    httpgurl.POOL.clear()
+
+
+def test_untrusted_certificate_is_an_ssl_error(https_server):
+    connection = httpgurl.fetch({'url': url(https_server, scheme='https')})
+    assert connection.status is None
+    assert connection.error.code() == httpgurl.ERROR_SECURE_CONNECTION_FAILED
+    assert connection.SSLerror is not None
+
+
+def test_trusted_certificate_downloads(https_server, certificate):
+    context = ssl.create_default_context(cafile=certificate[0])
+    connection = httpgurl.fetch({'url': url(https_server, scheme='https'),
+                                 'ssl_context': context})
+    assert connection.error is None
+    assert connection.status == 200
+    assert connection.body == BODY
@@ -0,0 +1,122 @@
+import http.server
+import threading
+
+import pytest
+
+import httpgurl
+
+
+BODY = b'{"preferences": {"minimum_os_version": "11.2.3"}}'
+ETAG = '"v1"'
+LAST_MODIFIED = 'Mon, 01 Mar 2021 12:00:00 GMT'
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.requests.append(dict(self.headers))
+        self.server.ports.add(self.client_address[1])
+        if self.path == '/moved':
+            self.send_response(302)
+            self.send_header('Location', '/nudge.json')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if (self.headers.get('If-None-Match') == ETAG or
+                self.headers.get('If-Modified-Since') == LAST_MODIFIED):
+            self.send_response(304)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', ETAG)
+        self.send_header('Last-Modified', LAST_MODIFIED)
+        self.send_header('Content-Length', str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    httpd.requests = []
+    httpd.ports = set()
+    thread = threading.Thread(target=httpd.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+    httpgurl.POOL.clear()
+
+
+def url(server, path='/nudge.json'):
+    return 'http://127.0.0.1:%d%s' % (server.server_address[1], path)
+
+
+def test_body_is_returned_in_memory(server):
+    connection = httpgurl.fetch({'url': url(server)})
+    assert connection.error is None
+    assert connection.status == 200
+    assert connection.body == BODY
+    assert connection.bytesReceived == len(BODY)
+
+
+def test_conditional_get_with_cache_data(server):
+    connection = httpgurl.fetch({
+        'url': url(server), 'download_only_if_changed': True,
+        'cache_data': {'etag': ETAG}})
+    assert connection.status == 304
+    assert connection.body == b''
+    assert server.requests[-1]['If-None-Match'] == ETAG
+
+    connection = httpgurl.fetch({
+        'url': url(server), 'download_only_if_changed': True,
+        'cache_data': {'etag': '"v0"'}})
+    assert connection.status == 200
+    assert connection.body == BODY
+
+
+def test_conditional_get_with_stored_headers(server, tmp_path):
+    path = str(tmp_path / 'nudge.json')
+    connection = httpgurl.fetch({'url': url(server), 'file': path})
+    assert connection.status == 200
+    stored = httpgurl.get_stored_headers(path)
+    if not stored:
+        pytest.skip('no xattr support on %s' % tmp_path)
+    assert stored == {'etag': ETAG, 'last-modified': LAST_MODIFIED}
+
+    connection = httpgurl.fetch({'url': url(server), 'file': path,
+                                 'download_only_if_changed': True})
+    assert connection.status == 304
+    assert server.requests[-1]['If-Modified-Since'] == LAST_MODIFIED
+    with open(path, 'rb') as f:
+        assert f.read() == BODY
+
+
+def test_connections_are_reused(server):
+    for _ in range(3):
+        assert httpgurl.fetch({'url': url(server)}).status == 200
+    assert len(server.requests) == 3
+    assert len(server.ports) == 1
+
+
+def test_redirects_follow_the_option(server):
+    connection = httpgurl.fetch({'url': url(server, '/moved')})
+    assert connection.status == 302
+    connection = httpgurl.fetch({'url': url(server, '/moved'),
+                                 'follow_redirects': True})
+    assert connection.status == 200
+    assert connection.body == BODY
+    assert connection.redirection[0][0] == url(server)
+
+
+def test_failure_is_reported_as_an_error():
+    connection = httpgurl.fetch({'url': 'http://127.0.0.1:1/nudge.json'})
+    assert connection.done
+    assert connection.error is not None
+    assert connection.status is None
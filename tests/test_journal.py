@@ -0,0 +1,85 @@
+import json
+import os
+import random
+
+import journal
+
+
+EVENTS = [journal.IMPRESSION, journal.DISMISSAL, journal.UPDATE_CLICK,
+          journal.OK_CLICK, journal.ENFORCEMENT]
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 1600000000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_aggregates_survive_compaction_and_replay(tmp_path):
+    path = str(tmp_path / journal.JOURNAL_NAME)
+    clock = Clock()
+    rng = random.Random(3)
+    entries = journal.Journal(path, max_bytes=4096, keep_events=20,
+                              clock=clock)
+    counts, last, totals = {}, {}, {}
+    for step in range(2000):
+        clock.now += 1800
+        if rng.random() < 0.01:
+            entries.reset()
+            counts, last = {}, {}
+            continue
+        event = rng.choice(EVENTS)
+        entries.record(event)
+        counts[event] = counts.get(event, 0) + 1
+        last[event] = int(clock.now)
+        totals[event] = totals.get(event, 0) + 1
+        assert os.path.getsize(path) < 8192
+    for event in EVENTS:
+        assert entries.count(event) == counts.get(event, 0)
+        assert entries.last(event) == last.get(event)
+        assert entries.total(event) == totals.get(event, 0)
+
+    # From the checkpoint, then from the journal alone
+    assert journal.Journal(path).aggregates == entries.aggregates
+    os.unlink(entries.state_path)
+    assert journal.Journal(path).aggregates == entries.aggregates
+
+
+def test_events_after_the_checkpoint_are_replayed(tmp_path):
+    path = str(tmp_path / journal.JOURNAL_NAME)
+    entries = journal.Journal(path)
+    entries.record(journal.DISMISSAL)
+    with open(path, 'a') as f:
+        f.write(json.dumps({'event': journal.DISMISSAL, 'time': 1}) + '\n')
+    assert journal.Journal(path).count(journal.DISMISSAL) == 2
+
+
+def test_partial_line_is_dropped(tmp_path):
+    path = str(tmp_path / journal.JOURNAL_NAME)
+    entries = journal.Journal(path)
+    entries.record(journal.IMPRESSION)
+    with open(path, 'a') as f:
+        f.write('{"event": "dism')
+    entries = journal.Journal(path)
+    assert entries.count(journal.DISMISSAL) == 0
+    entries.record(journal.DISMISSAL)
+    os.unlink(entries.state_path)
+    entries = journal.Journal(path)
+    assert entries.count(journal.IMPRESSION) == 1
+    assert entries.count(journal.DISMISSAL) == 1
+
+
+def test_reset_starts_a_new_cycle(tmp_path):
+    path = str(tmp_path / journal.JOURNAL_NAME)
+    entries = journal.Journal(path)
+    entries.record(journal.DISMISSAL)
+    entries.reset()
+    assert entries.count(journal.DISMISSAL) == 0
+    assert entries.last(journal.DISMISSAL) is None
+    assert entries.total(journal.DISMISSAL) == 1
+    # Nothing happened since, so no new reset is written
+    size = os.path.getsize(path)
+    entries.reset()
+    assert os.path.getsize(path) == size
@@ -0,0 +1,39 @@
+import json
+
+import logwriter
+
+
+def test_records_go_to_a_file_per_user(tmp_path):
+    writer = logwriter.LogWriter(str(tmp_path), nslog=False, user='alice')
+    assert writer.path == str(tmp_path / 'nudge-alice.jsonl')
+    writer.start()
+    try:
+        logwriter.log('hello', count=2)
+        for _ in range(3):
+            logwriter.log('progress', rate_key='download')
+    finally:
+        writer.stop()
+    with open(writer.path) as f:
+        entries = [json.loads(line) for line in f]
+    assert [(entry['message'], entry['level']) for entry in entries] == [
+        ('hello', 'info'), ('progress', 'info')]
+    assert entries[0]['count'] == 2
+
+
+def test_missing_directory_falls_back_to_nslog(tmp_path):
+    writer = logwriter.LogWriter(str(tmp_path / 'missing'), nslog=False,
+                                 user='alice')
+    assert writer.file_handler is None
+    assert writer.handlers == [writer.nslog_handler]
+
+
+def test_stop_writes_out_the_queue_once(tmp_path):
+    writer = logwriter.LogWriter(str(tmp_path), nslog=False, user='alice')
+    writer.start()
+    for number in range(500):
+        logwriter.log('line %s' % number)
+    writer.stop()
+    with open(writer.path) as f:
+        assert len(f.readlines()) == 500
+    # atexit calls it again after quit_nudge() has
+    writer.stop()
@@ -0,0 +1,67 @@
+import json
+import os
+import pstats
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import metrics
+
+
+def test_one_record_per_run(tmp_path):
+    path = str(tmp_path / (metrics.METRICS_NAME % 'alice'))
+    run_metrics = metrics.RunMetrics(path)
+    with run_metrics.phase('config'):
+        pass
+    run_metrics.set(upgrade='major')
+    run_metrics.write('shown')
+    run_metrics.write('exited')
+    with open(path) as f:
+        records = [json.loads(line) for line in f]
+    assert len(records) == 1
+    assert records[0]['outcome'] == 'shown'
+    assert records[0]['upgrade'] == 'major'
+    assert 'config' in records[0]['phases']
+
+
+def test_failed_write_is_logged_once(tmp_path):
+    path = str(tmp_path / 'missing' / (metrics.METRICS_NAME % 'alice'))
+    logged = []
+    for _ in range(3):
+        metrics.RunMetrics(path, log=logged.append).write('shown')
+    assert len(logged) == 1
+    assert path in logged[0]
+
+
+def test_profiler_writes_a_profile_and_a_snapshot(tmp_path):
+    profiler = metrics.Profiler(str(tmp_path))
+    profiler.start()
+    sorted(range(1000))
+    paths = profiler.stop()
+    assert [os.path.splitext(path)[1] for path in paths] == [
+        '.prof', '.tracemalloc']
+    assert pstats.Stats(paths[0]).total_calls > 0
+    tracemalloc.Snapshot.load(paths[1])
+    assert not tracemalloc.is_tracing()
+    assert profiler.stop() == []
+
+
+def test_profiler_is_not_loaded_without_profile():
+    resources = os.path.dirname(metrics.__file__)
+    code = ('import sys; import metrics; '
+            'print(sorted({"cProfile", "tracemalloc"} & set(sys.modules)))')
+    output = subprocess.check_output([sys.executable, '-c', code],
+                                     cwd=resources, universal_newlines=True)
+    assert output.strip() == '[]'
+
+
+def test_timing_phases_costs_next_to_nothing(tmp_path):
+    run_metrics = metrics.RunMetrics(str(tmp_path / 'metrics.jsonl'))
+    started = time.perf_counter()
+    for _ in range(10000):
+        with run_metrics.phase('config'):
+            pass
+    # Under a millisecond for the ten or so phases of a run
+    assert (time.perf_counter() - started) / 10000 < 0.0001
+    assert not tracemalloc.is_tracing()
@@ -0,0 +1,90 @@
+import ctypes
+import importlib
+import os
+import sys
+
+import pytest
+
+
+FAKES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                         'tools', 'pyobjc_fakes')
+# Deeper than the recursion limit, which a recursive walk would hit
+DEPTH = sys.getrecursionlimit() * 2
+
+
+class FakeLibrary(object):
+    '''ApplicationServices, which find_library() doesn't find off macOS'''
+    def __getattr__(self, name):
+        function = lambda *args: 0
+        setattr(self, name, function)
+        return function
+
+
+@pytest.fixture(scope='module')
+def nibbler():
+    saved_path = list(sys.path)
+    saved_modules = dict(sys.modules)
+    real_cdll = ctypes.CDLL
+    sys.path.insert(0, os.path.abspath(FAKES_DIR))
+    ctypes.CDLL = lambda name, *args, **kwargs: (
+        FakeLibrary() if name is None else real_cdll(name, *args, **kwargs))
+    try:
+        yield importlib.import_module('nibbler')
+    finally:
+        ctypes.CDLL = real_cdll
+        sys.path[:] = saved_path
+        for name in set(sys.modules) - set(saved_modules):
+            del sys.modules[name]
+
+
+def deep_tree(depth, ident='button.ok'):
+    '''A view with ident at the bottom of depth nested views, each with an
+    unnamed sibling'''
+    import AppKit
+    view = AppKit.NSView(ident)
+    for level in range(depth):
+        view = AppKit.NSView(None, [AppKit.NSView('_NS:%d' % level), view])
+    return view
+
+
+def recursive_walk(view, path=()):
+    yield view, list(path)
+    for i, subview in enumerate(view.subviews()):
+        for found in recursive_walk(subview, path + (i,)):
+            yield found
+
+
+def test_walk_matches_a_recursive_walk(nibbler):
+    import AppKit
+    top_view = AppKit.build_window().contentView()
+    assert list(nibbler.walk_views(top_view)) == list(
+        recursive_walk(top_view))
+
+
+def test_deep_trees_dont_recurse(nibbler):
+    top_view = deep_tree(DEPTH)
+    assert sum(1 for _ in nibbler.walk_views(top_view)) == 2 * DEPTH + 1
+    paths = nibbler.view_paths(top_view)
+    assert paths == {'button.ok': [1] * DEPTH}
+    views = nibbler.ViewIndex(top_view, paths)
+    assert views['button.ok'].identifier() == 'button.ok'
+
+
+def test_index_finds_views_by_path(nibbler):
+    import AppKit
+    top_view = AppKit.build_window().contentView()
+    paths = nibbler.view_paths(top_view)
+    assert sorted(paths) == sorted(
+        ident for group in AppKit.NIB_LAYOUT for ident in group)
+    views = nibbler.ViewIndex(top_view, paths)
+    for ident in paths:
+        assert views[ident].identifier() == ident
+    assert views.load_all().keys() == paths.keys()
+
+
+def test_stale_index_is_rebuilt(nibbler):
+    top_view = deep_tree(3)
+    # Paths saved for a nib where button.ok was somewhere else
+    views = nibbler.ViewIndex(top_view, {'button.ok': [0, 1]})
+    assert views['button.ok'].identifier() == 'button.ok'
+    assert views.paths == {'button.ok': [1, 1, 1]}
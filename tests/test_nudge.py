@@ -0,0 +1,217 @@
+import http.server
+import json
+import optparse
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+
+import httpgurl
+
+
+CONFIG = b'{"preferences": {"minimum_os_version": "11.2.3"}}'
+ETAG = '"v1"'
+
+
+class ConfigHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.requests.append(self.headers)
+        if self.headers.get('If-None-Match') == ETAG:
+            self.server.statuses.append(304)
+            self.send_response(304)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.server.statuses.append(200)
+        self.send_response(200)
+        self.send_header('ETag', ETAG)
+        self.send_header('Content-Length', str(len(CONFIG)))
+        self.end_headers()
+        self.wfile.write(CONFIG)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), ConfigHandler)
+    httpd.requests = []
+    httpd.statuses = []
+    thread = threading.Thread(target=httpd.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+    httpgurl.POOL.clear()
+
+
+def test_fetch_offsets_spread_evenly_over_the_window(nudge):
+    window = 900
+    buckets = [0] * 30
+    for number in range(30000):
+        offset = nudge.fetch_offset('C02%09d' % number, window)
+        assert 0 <= offset < window
+        buckets[offset * len(buckets) // window] += 1
+    expected = 30000 / len(buckets)
+    chi_squared = sum((count - expected) ** 2 / expected for count in buckets)
+    # 29 degrees of freedom, uniform unless chi squared is past 58.3 (p=0.001)
+    assert chi_squared < 58.3
+
+
+def test_fetch_offset_is_stable_and_off_by_default(nudge):
+    assert nudge.fetch_offset('C02BENCH0001', 900) == nudge.fetch_offset(
+        'C02BENCH0001', 900)
+    assert nudge.fetch_offset('C02BENCH0001', 0) == 0
+
+
+def test_only_main_waits_for_the_fetch_offset(nudge, monkeypatch, tmp_path):
+    windows = []
+
+    def fetch(json_data, window, timeout):
+        windows.append(window)
+        with open(json_data['file'], 'w') as f:
+            json.dump({'preferences': {'minimum_os_version': '11.2.3'}}, f)
+        return True
+    monkeypatch.setattr(nudge, 'fetch_json_config', fetch)
+    monkeypatch.setattr(nudge, 'nudge_cache_dir', lambda: str(tmp_path))
+    opts = optparse.Values({'jsonurl': 'https://example.com/nudge.json',
+                            'headers': None, 'fetch_window': 900,
+                            'fetch_timeout': 300})
+    # --evaluate and the agent's checks
+    nudge.load_json_config(opts)
+    # main()
+    nudge.load_json_config(opts, opts.fetch_window)
+    assert windows == [0, 900]
+
+
+def test_config_is_downloaded_in_memory(nudge, monkeypatch, server,
+                                        tmp_path):
+    monkeypatch.setattr(nudge, 'HTTP_BACKEND', 'python')
+    downloads = []
+    downloadfile = nudge.downloadfile
+
+    def download(options):
+        downloads.append(options)
+        return downloadfile(options)
+    monkeypatch.setattr(nudge, 'downloadfile', download)
+    cache_path = str(tmp_path / 'nudge.json')
+    assert nudge.download_json_config({
+        'url': 'http://127.0.0.1:%d/nudge.json' % server.server_address[1],
+        'file': cache_path, 'name': 'nudge.json'})
+    assert 'file' not in downloads[0]
+    assert os.listdir(str(tmp_path)) == ['nudge.json']
+    with open(cache_path, 'rb') as f:
+        assert f.read() == CONFIG
+    stored = httpgurl.get_stored_headers(cache_path)
+    if stored:
+        assert stored == {'etag': ETAG}
+
+
+def remote_config(nudge, monkeypatch, server, tmp_path):
+    '''Options to load the config from server, cached in tmp_path'''
+    monkeypatch.setattr(nudge, 'HTTP_BACKEND', 'python')
+    monkeypatch.setattr(nudge, 'nudge_cache_dir', lambda: str(tmp_path))
+    monkeypatch.setattr(nudge, 'get_serial', lambda: 'C02TEST00001')
+    return optparse.Values({
+        'jsonurl': 'http://127.0.0.1:%d/nudge.json' % server.server_address[1],
+        'headers': None, 'fetch_window': 0, 'fetch_timeout': 0})
+
+
+def test_config_cache_path_is_per_url(nudge, monkeypatch, tmp_path):
+    monkeypatch.setattr(nudge, 'nudge_cache_dir', lambda: str(tmp_path))
+    path = nudge.config_cache_path('https://example.com/nudge.json')
+    assert os.path.dirname(path) == str(tmp_path)
+    assert path == nudge.config_cache_path('https://example.com/nudge.json')
+    assert path != nudge.config_cache_path('https://example.com/other.json')
+
+
+def test_config_is_cached_then_revalidated(nudge, monkeypatch, server,
+                                           tmp_path):
+    opts = remote_config(nudge, monkeypatch, server, tmp_path)
+    cache_path = nudge.config_cache_path(opts.jsonurl)
+    assert nudge.load_json_config(opts)['preferences'][
+        'minimum_os_version'] == '11.2.3'
+    assert server.statuses == [200]
+    with open(cache_path, 'rb') as f:
+        assert f.read() == CONFIG
+    if not httpgurl.get_stored_headers(cache_path):
+        pytest.skip('no xattr support on %s' % tmp_path)
+
+    assert nudge.load_json_config(opts)['preferences'][
+        'minimum_os_version'] == '11.2.3'
+    assert server.statuses == [200, 304]
+    assert server.requests[-1]['If-None-Match'] == ETAG
+
+
+def test_cached_config_is_used_when_the_server_is_down(nudge, monkeypatch,
+                                                       server, tmp_path):
+    opts = remote_config(nudge, monkeypatch, server, tmp_path)
+    nudge.load_json_config(opts)
+    server.shutdown()
+    server.server_close()
+    # Or the kept-alive connection is still answered
+    httpgurl.POOL.clear()
+    assert nudge.load_json_config(opts)['preferences'][
+        'minimum_os_version'] == '11.2.3'
+    assert server.statuses == [200]
+
+
+def test_no_config_without_the_server_or_a_cache(nudge, monkeypatch, server,
+                                                 tmp_path):
+    opts = remote_config(nudge, monkeypatch, server, tmp_path)
+    server.shutdown()
+    server.server_close()
+    with pytest.raises(SystemExit):
+        nudge.load_json_config(opts)
+    assert os.listdir(str(tmp_path)) == []
+
+
+# Loads nudge and checks for a running instance the way main() does. The one
+# that gets the lock holds it until its stdin is closed.
+INSTANCE_CHECK = '''
+import importlib.machinery, sys, types
+sys.path.insert(0, sys.argv[1])
+loader = importlib.machinery.SourceFileLoader('nudge', sys.argv[1] + '/nudge')
+nudge = types.ModuleType('nudge')
+nudge.__file__ = loader.path
+loader.exec_module(nudge)
+nudge.nudge_cache_dir = lambda: sys.argv[2]
+if nudge.nudge_already_loaded():
+    print('already loaded', flush=True)
+    sys.exit(0)
+print('locked', flush=True)
+sys.stdin.read()
+'''
+
+
+def check_instance(tmp_path):
+    return subprocess.Popen(
+        [sys.executable, '-c', INSTANCE_CHECK,
+         os.path.dirname(httpgurl.__file__), str(tmp_path)],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+        universal_newlines=True)
+
+
+def test_only_one_instance_gets_the_lock(tmp_path):
+    processes = [check_instance(tmp_path) for _ in range(2)]
+    results = [process.stdout.readline().strip() for process in processes]
+    assert sorted(results) == ['already loaded', 'locked']
+    holder = processes[results.index('locked')]
+    with open(str(tmp_path / 'nudge.lock')) as f:
+        assert f.read() == str(holder.pid)
+    # The other one exits straight away, the holder once it is let go
+    assert processes[results.index('already loaded')].wait(10) == 0
+    holder.stdin.close()
+    assert holder.wait(10) == 0
+
+    # The lock went with the holder, the file left behind isn't stale
+    process = check_instance(tmp_path)
+    assert process.stdout.readline().strip() == 'locked'
+    process.stdin.close()
+    process.wait(10)
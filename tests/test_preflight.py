@@ -0,0 +1,35 @@
+import time
+
+import pytest
+
+import preflight
+
+
+def test_steps_run_at_the_same_time():
+    steps = preflight.Preflight()
+    started = time.time()
+    steps.start('config', time.sleep, 0.1)
+    steps.start('facts', time.sleep, 0.1)
+    steps.result('config')
+    steps.result('facts')
+    # One step's worth of waiting, not two
+    assert time.time() - started < 0.18
+    assert all(task.elapsed >= 0.1 for task in steps.tasks)
+
+
+def test_errors_are_raised_by_result():
+    steps = preflight.Preflight()
+    steps.start('config', exit, 1)
+    with pytest.raises(SystemExit):
+        steps.result('config')
+
+
+def test_timings_are_logged_once():
+    steps = preflight.Preflight()
+    steps.start('config', time.sleep, 0)
+    steps.result('config')
+    logged = []
+    steps.log_timings(logged.append)
+    steps.log_timings(logged.append)
+    assert len(logged) == 1
+    assert 'config' in logged[0]
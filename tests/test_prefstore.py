@@ -0,0 +1,56 @@
+import plistlib
+from datetime import datetime
+
+import prefstore
+
+
+def write_plist(path, values):
+    with open(path, 'wb') as f:
+        plistlib.dump(values, f)
+
+
+def test_reads_once_and_writes_in_one_batch(tmp_path):
+    write_plist(str(tmp_path / 'com.erikng.nudge.plist'),
+                {'first_seen': 'a'})
+    backend = prefstore.PlistBackend(str(tmp_path))
+    store = prefstore.PreferenceStore(backend)
+    assert store.get('first_seen') == 'a'
+    write_plist(str(tmp_path / 'com.erikng.nudge.plist'),
+                {'first_seen': 'b'})
+    assert store.get('first_seen') == 'a'
+
+    store.set('first_seen', datetime(2021, 3, 1, 12, 0))
+    store.set('last_seen', datetime(2021, 3, 2, 12, 0))
+    store.set('other', 1, domain='com.example.other')
+    assert store.get('last_seen') == '2021-03-02 12:00:00 +0000'
+    assert backend.syncs == 0
+    store.flush()
+    assert backend.syncs == 2
+    store.flush()
+    assert backend.syncs == 2
+
+    with open(str(tmp_path / 'com.erikng.nudge.plist'), 'rb') as f:
+        assert plistlib.load(f) == {
+            'first_seen': datetime(2021, 3, 1, 12, 0),
+            'last_seen': datetime(2021, 3, 2, 12, 0)}
+
+
+def test_setting_none_removes(tmp_path):
+    write_plist(str(tmp_path / 'com.erikng.nudge.plist'), {'first_seen': 'a'})
+    store = prefstore.PreferenceStore(prefstore.PlistBackend(str(tmp_path)))
+    store.set('first_seen', None)
+    assert store.get('first_seen') is None
+    store.flush()
+    with open(str(tmp_path / 'com.erikng.nudge.plist'), 'rb') as f:
+        assert plistlib.load(f) == {}
+
+
+def test_forget_keeps_pending_writes(tmp_path):
+    backend = prefstore.PlistBackend(str(tmp_path))
+    store = prefstore.PreferenceStore(backend)
+    store.set('first_seen', 'a')
+    store.get('last_seen')
+    backend.domains[prefstore.NUDGE_DOMAIN]['last_seen'] = 'b'
+    store.forget()
+    assert store.get('first_seen') == 'a'
+    assert store.get('last_seen') == 'b'
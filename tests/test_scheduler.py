@@ -0,0 +1,111 @@
+from datetime import datetime, timedelta
+
+import decision
+import devicefacts
+import scheduler
+
+
+START = datetime(2021, 3, 1, 12, 0)
+FACTS = devicefacts.DeviceFacts('10.15.7', '19H2', 'C02TEST00001')
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = START
+
+    def __call__(self):
+        return self.now
+
+
+def make_scheduler(deadline_seconds, clock):
+    deadline = START + timedelta(seconds=deadline_seconds)
+    nudge_json = {'preferences': {
+        'minimum_os_version': '11.2.3',
+        'cut_off_date': deadline.strftime(decision.DATE_FORMAT)}}
+    return scheduler.Scheduler(
+        lambda now: decision.evaluate(nudge_json, FACTS, now), 3 * 86400,
+        clock)
+
+
+def test_seconds_to_next_tier():
+    assert scheduler.seconds_to_next_tier(None, 3 * 86400) is None
+    assert scheduler.seconds_to_next_tier(0, 3 * 86400) is None
+    assert scheduler.seconds_to_next_tier(4 * 86400, 3 * 86400) == 86401
+    assert scheduler.seconds_to_next_tier(2 * 86400, 3 * 86400) == 86401
+    assert scheduler.seconds_to_next_tier(7200, 3 * 86400) == 3601
+    assert scheduler.seconds_to_next_tier(60, 3 * 86400) == 61
+
+
+def test_wakes_at_the_timer_when_it_comes_first():
+    clock = Clock()
+    wake = make_scheduler(10 * 86400, clock).next_wake()
+    assert wake.plan.tier == 'initial'
+    # The initial timer is four hours, well before the warning starts
+    assert wake.delay == 14400
+    assert wake.nudge
+    assert wake.tolerance == scheduler.MAX_TOLERANCE
+
+
+def test_wakes_at_the_tier_boundary_when_it_comes_first():
+    clock = Clock()
+    wake = make_scheduler(86400 + 300, clock).next_wake()
+    assert wake.plan.tier == 'day_3'
+    assert wake.delay == 301
+    assert not wake.nudge
+    assert wake.tolerance == 30.1
+
+    clock.now += timedelta(seconds=wake.delay)
+    wake = make_scheduler(86400 + 300, clock).next_wake()
+    assert wake.plan.tier == 'day_1'
+
+
+def test_timer_keeps_its_cadence_since_the_last_nudge():
+    clock = Clock()
+    plan_scheduler = make_scheduler(12 * 3600, clock)
+    clock.now += timedelta(seconds=400)
+    wake = plan_scheduler.next_wake()
+    assert wake.delay == 200
+    assert wake.nudge
+    plan_scheduler.nudged()
+    assert plan_scheduler.next_wake().delay == 600
+
+
+def test_no_wake_once_compliant():
+    clock = Clock()
+    nudge_json = {'preferences': {'minimum_os_version': '10.15'}}
+    wake = scheduler.Scheduler(
+        lambda now: decision.evaluate(nudge_json, FACTS, now), 3 * 86400,
+        clock).next_wake()
+    assert not wake.plan.show
+    assert wake.delay is None
+
+
+def test_nine_day_countdown():
+    # Follow the wakes as nudge would, from nine days out to the deadline
+    clock = Clock()
+    plan_scheduler = make_scheduler(9 * 86400, clock)
+    deadline = START + timedelta(days=9)
+    entered = {}
+    nudges = []
+    for _ in range(1000):
+        wake = plan_scheduler.next_wake()
+        tier = wake.plan.tier
+        if tier not in entered:
+            entered[tier] = (deadline - clock.now).total_seconds()
+        if tier == 'elapsed':
+            break
+        clock.now += timedelta(seconds=wake.delay)
+        if wake.nudge:
+            plan_scheduler.nudged()
+            nudges.append((clock.now, wake.plan.timer))
+    assert list(entered) == ['initial', 'day_3', 'day_1', 'final', 'elapsed']
+    # Each tier starts at most BOUNDARY_SLACK after its boundary
+    for tier, boundary in [('day_3', 3 * 86400), ('day_1', 86400),
+                           ('final', 3600), ('elapsed', 0)]:
+        assert (boundary - scheduler.BOUNDARY_SLACK <= entered[tier] <=
+                boundary)
+    # Never longer between nudges than the timer of the tier
+    for (previous, _), (when, timer) in zip(nudges, nudges[1:]):
+        assert (when - previous).total_seconds() <= timer
+    # About one wake per timer period, plus one per boundary
+    assert len(nudges) < 300
@@ -0,0 +1,109 @@
+import csv
+import importlib.util
+import os
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+import decision
+import devicefacts
+
+pytest.importorskip('numpy')
+
+
+SIMULATE_FLEET = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              '..', 'tools', 'simulate_fleet.py')
+SEED = 20210301
+DEVICES = 300
+DAYS = 20
+START = datetime(2021, 3, 1)
+# Compliant, minor update and major upgrade devices
+OS_VERSIONS = [('11.2.3', '20D91'), ('11.2.1', '20D74'), ('11.1', '20C69'),
+               ('10.15.7', '19H2')]
+PRODUCT_KEYS = ['001-00001', '001-00002', '002-00010', '003-00100']
+
+
+@pytest.fixture(scope='module')
+def simulate_fleet():
+    spec = importlib.util.spec_from_file_location('simulate_fleet',
+                                                  SIMULATE_FLEET)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def config_date(days):
+    return (START + timedelta(days=days)).strftime('%Y-%m-%d-%H:%M')
+
+
+def nudge_config(cut_off_date=False):
+    return {
+        'preferences': {
+            'minimum_os_version': '11.2.3',
+            'minimum_os_sub_build_version': '20D91',
+            'update_minor': True,
+            'update_minor_days': 14,
+            'cut_off_date': cut_off_date and config_date(cut_off_date),
+        },
+        'software_updates': [
+            {'name': '001-00001', 'force_install_date': config_date(5)},
+            {'name': '002-*', 'force_install_date': config_date(9),
+             'grace_period_days': 2},
+        ],
+    }
+
+
+def inventory(path):
+    '''Write a random fleet, the same one every time, and return its rows'''
+    rng = random.Random(SEED)
+    rows = []
+    for number in range(DEVICES):
+        os_version, os_build = rng.choice(OS_VERSIONS)
+        pending = rng.sample(PRODUCT_KEYS, rng.randint(0, 2))
+        rows.append({'serial': 'C02%09d' % number, 'os_version': os_version,
+                     'os_build': os_build, 'pending': ';'.join(pending)})
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, ['serial', 'os_version', 'os_build',
+                                    'pending'])
+        writer.writeheader()
+        writer.writerows(rows)
+    return rows
+
+
+def expected_tier(nudge_json, row, when):
+    '''The tier decision.evaluate() gives the device, with a scan that
+    lists its pending updates as needing a restart'''
+    facts = devicefacts.DeviceFacts(row['os_version'], row['os_build'],
+                                    row['serial'])
+    pending = [{'Product Key': key}
+               for key in row['pending'].split(';') if key]
+    scan = decision.ScanResult(pending, True, None)
+    plan = decision.evaluate(nudge_json, facts, when, scan=scan)
+    if not plan.show:
+        return 'hidden'
+    return plan.tier or 'no_deadline'
+
+
+@pytest.mark.parametrize('cut_off_date', [False, 7])
+def test_histogram_matches_evaluate(simulate_fleet, tmp_path, cut_off_date):
+    path = str(tmp_path / 'inventory.csv')
+    rows = inventory(path)
+    nudge_json = nudge_config(cut_off_date)
+    fleet = simulate_fleet.load_fleet(path, nudge_json)
+    histogram = simulate_fleet.simulate(fleet, nudge_json, START, DAYS)
+    assert histogram.shape == (DAYS, len(simulate_fleet.TIERS))
+    for day in range(DAYS):
+        when = START + timedelta(days=day)
+        expected = [0] * len(simulate_fleet.TIERS)
+        for row in rows:
+            tier = expected_tier(nudge_json, row, when)
+            expected[simulate_fleet.TIERS.index(tier)] += 1
+        assert histogram[day].tolist() == expected, 'day %d' % day
+    # The window takes devices through the tiers up to their deadline
+    totals = histogram.sum(axis=0)
+    for tier in (simulate_fleet.HIDDEN, simulate_fleet.INITIAL,
+                 simulate_fleet.DAY_3, simulate_fleet.DAY_1):
+        assert totals[tier] > 0
+    if cut_off_date:
+        assert totals[simulate_fleet.ELAPSED] > 0
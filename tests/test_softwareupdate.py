@@ -0,0 +1,123 @@
+import os
+import stat
+
+import softwareupdate
+
+
+CATALINA_OUTPUT = b'''Software Update Tool
+
+Finding available software
+Software Update found the following new or updated software:
+* Label: Safari14.0.3CatalinaAuto-14.0.3
+\tTitle: Safari, Version: 14.0.3, Size: 68473K, Recommended: YES,
+* Label: macOS Catalina 10.15.7 Supplemental Update-
+\tTitle: macOS Catalina 10.15.7 Supplemental Update, Version: , Size: 1234567K, Recommended: YES, Action: restart,
+'''
+
+MOJAVE_OUTPUT = b'''Software Update found the following new or updated software:
+   * Safari14.0.3MojaveAuto-14.0.3
+\tSafari (14.0.3), 68473K [recommended]
+   * Security Update 2021-001-10.14.6
+\tSecurity Update 2021-001 (10.14.6), 1603443K [recommended] [restart]
+'''
+
+
+def test_parse_catalina_output():
+    updates = list(softwareupdate.parse_updates(CATALINA_OUTPUT.splitlines()))
+    assert [u.label for u in updates] == [
+        'Safari14.0.3CatalinaAuto-14.0.3',
+        'macOS Catalina 10.15.7 Supplemental Update-']
+    assert updates[0].title == 'Safari'
+    assert updates[0].version == '14.0.3'
+    assert updates[0].recommended
+    assert not updates[0].restart_required
+    assert updates[1].restart_required
+
+
+def test_parse_mojave_output():
+    updates = list(softwareupdate.parse_updates(MOJAVE_OUTPUT.splitlines()))
+    assert [(u.title, u.version, u.size) for u in updates] == [
+        ('Safari', '14.0.3', '68473K'),
+        ('Security Update 2021-001', '10.14.6', '1603443K')]
+    assert [u.restart_required for u in updates] == [False, True]
+
+
+def stand_in(tmp_path, output, exit_code=0):
+    '''Return a Runner for a script that prints output'''
+    (tmp_path / 'output').write_bytes(output)
+    script = tmp_path / 'softwareupdate'
+    script.write_text('#!/bin/sh\ncat "%s"\nexit %d\n' % (
+        tmp_path / 'output', exit_code))
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    return softwareupdate.Runner(str(script))
+
+
+def test_scan_is_cached_for_the_os_build(tmp_path):
+    path = str(tmp_path / 'scan.json')
+    runner = stand_in(tmp_path, CATALINA_OUTPUT)
+    cache = softwareupdate.ScanCache(path, '19H2', 3600, runner)
+    assert len(cache.updates()) == 2
+    assert cache.restart_required()
+    assert runner.invocations == 1
+
+    cache = softwareupdate.ScanCache(path, '19H2', 3600, runner)
+    assert not cache.is_stale()
+    assert len(cache.updates()) == 2
+    assert runner.invocations == 1
+
+    cache = softwareupdate.ScanCache(path, '19H15', 3600, runner)
+    assert cache.is_stale()
+    cache.updates()
+    assert runner.invocations == 2
+
+
+def test_expired_scan_is_run_again(tmp_path):
+    path = str(tmp_path / 'scan.json')
+    runner = stand_in(tmp_path, CATALINA_OUTPUT)
+    softwareupdate.ScanCache(path, '19H2', 3600, runner).updates()
+    old = os.path.getmtime(path) - 7200
+    cache = softwareupdate.ScanCache(path, '19H2', 3600, runner)
+    cache.scanned_at = old
+    cache.save()
+
+    cache = softwareupdate.ScanCache(path, '19H2', 3600, runner)
+    assert cache.is_stale()
+    cache.updates()
+    assert runner.invocations == 2
+
+    # The new scan is cached for the ttl from now
+    cache = softwareupdate.ScanCache(path, '19H2', 3600, runner)
+    assert not cache.is_stale()
+    cache.updates()
+    assert runner.invocations == 2
+
+    stale = softwareupdate.ScanCache(path, '19H2', 0, runner, keep_stale=True)
+    assert stale.known_updates() is not None
+
+
+def test_failed_scan_is_not_cached(tmp_path):
+    path = str(tmp_path / 'scan.json')
+    runner = stand_in(tmp_path, b'', exit_code=1)
+    cache = softwareupdate.ScanCache(path, '19H2', 3600, runner)
+    assert cache.updates() is None
+    assert not os.path.exists(path)
+
+
+def test_restart_check_stops_at_the_first_restart(tmp_path):
+    runner = stand_in(tmp_path, MOJAVE_OUTPUT)
+    cache = softwareupdate.ScanCache(str(tmp_path / 'scan.json'), '18G87',
+                                     3600, runner)
+    assert cache.restart_required()
+    assert cache.known_updates() is None
+
+
+def test_refresh_runs_a_new_scan(tmp_path):
+    path = str(tmp_path / 'scan.json')
+    runner = stand_in(tmp_path, CATALINA_OUTPUT)
+    cache = softwareupdate.ScanCache(path, '19H2', 3600, runner)
+    cache.restart_required()
+    cache.refresh()
+    assert runner.invocations == 3
+    assert cache.results['downloaded']
+    assert cache.results['restart_required']
+    assert len(cache.known_updates()) == 2
@@ -0,0 +1,97 @@
+import random
+
+import devicefacts
+import targeting
+import versions
+
+
+SERIALS = ['C02%09d' % number for number in range(2000)]
+RULES = [
+    {'name': 'pilot', 'priority': 5, 'match': {'serials': SERIALS[:500]}},
+    {'name': 'mbp-old', 'match': {'models': ['MacBookPro15,1'],
+                                  'os_min': '10.15', 'os_max': '11.1'}},
+    {'name': 'wave1', 'match': {'percent': 10}},
+    {'name': 'wave2', 'priority': 1, 'match': {'percent': [10, 50]}},
+    {'name': 'old-os', 'match': {'os_max': '10.15.7'}},
+    {'name': 'new-os', 'match': {'os_min': '11.2', 'models': ['Mac14,2']}},
+]
+OS_VERSIONS = ['10.14.6', '10.15', '10.15.0', '10.15.7', '11.0', '11.1',
+               '11.1.0', '11.2', '12.0.1']
+MODELS = ['MacBookPro15,1', 'Mac14,2', None]
+
+
+def matches(rule, facts, seed):
+    '''Whether rule matches facts, checked one condition at a time'''
+    match = rule['match']
+    if 'serials' in match and facts.serial not in match['serials']:
+        return False
+    if 'models' in match and facts.model not in match['models']:
+        return False
+    if 'percent' in match:
+        start, end = targeting.percent_range(match['percent'])
+        if not start <= targeting.bucket(facts.serial, seed) < end:
+            return False
+    os_version = versions.version(facts.os_version)
+    if 'os_min' in match and os_version < match['os_min']:
+        return False
+    if 'os_max' in match and os_version > match['os_max']:
+        return False
+    return True
+
+
+def brute_force(rules, order, facts, seed):
+    if order == 'priority':
+        rules = sorted(rules, key=lambda rule: -rule.get('priority', 0))
+    for rule in rules:
+        if matches(rule, facts, seed):
+            return rule
+    return None
+
+
+def test_index_agrees_with_brute_force():
+    rng = random.Random(1)
+    for order in targeting.MATCH_ORDERS:
+        index = targeting.RuleIndex(RULES, order, 'seed')
+        for number in range(3000):
+            facts = devicefacts.DeviceFacts(
+                rng.choice(OS_VERSIONS), '20A2411',
+                rng.choice(SERIALS + ['ZZ%d' % number]), rng.choice(MODELS))
+            assert (index.match(facts) is
+                    brute_force(RULES, order, facts, 'seed')), facts
+
+
+def test_buckets_are_stable_and_spread():
+    assert targeting.bucket('C02TEST00001', 'a') == targeting.bucket(
+        'C02TEST00001', 'a')
+    buckets = [targeting.bucket(serial, 'a') for serial in SERIALS]
+    assert min(buckets) == 0 and max(buckets) == 99
+    # Roughly 10% of devices in the first 10 buckets
+    assert 100 < sum(1 for b in buckets if b < 10) < 300
+
+
+def test_no_rules_match_nothing():
+    facts = devicefacts.DeviceFacts('11.0', '20A2411', 'C02TEST00001')
+    assert targeting.RuleIndex([]).match(facts) is None
+
+
+def test_select_lays_the_rule_over_the_config():
+    nudge_json = {
+        'preferences': {'minimum_os_version': '11.2.3',
+                        'cut_off_date': '2021-03-01-00:00'},
+        'software_updates': [],
+        'rules': [{'name': 'pilot', 'match': {'serials': ['C02TEST00001']},
+                   'preferences': {'cut_off_date': '2021-02-01-00:00'},
+                   'software_updates': [{'name': 'a'}]}],
+    }
+    facts = devicefacts.DeviceFacts('11.0', '20A2411', 'C02TEST00001')
+    selected = targeting.select(nudge_json, facts)
+    assert selected['rule'] == 'pilot'
+    assert selected['preferences'] == {'minimum_os_version': '11.2.3',
+                                       'cut_off_date': '2021-02-01-00:00'}
+    assert selected['software_updates'] == [{'name': 'a'}]
+    assert 'rules' not in selected
+
+    facts = devicefacts.DeviceFacts('11.0', '20A2411', 'C02TEST00002')
+    selected = targeting.select(nudge_json, facts)
+    assert selected['rule'] is None
+    assert selected['preferences'] == nudge_json['preferences']
@@ -0,0 +1,122 @@
+import random
+import string
+
+import pytest
+
+import versions
+
+
+def test_versions_compare_on_their_numbers():
+    assert versions.version('10.15') == versions.version('10.15.0')
+    assert versions.version('10.9') < versions.version('10.10')
+    assert versions.version('11') > versions.version('10.15.7')
+    assert versions.version('10.14.6') >= '10.14.6'
+
+
+def test_security_response_sorts_after_its_release():
+    assert versions.version('13.3.1 (a)') > versions.version('13.3.1')
+    assert versions.version('13.3.1 (a)') < versions.version('13.3.2')
+
+
+def test_builds_sort_betas_before_releases():
+    ordered = ['19H2', '20A5364e', '20A2411', '20B29', '20C69', '22E252',
+               '22E772610a', '22F66']
+    assert sorted(ordered, key=versions.build) == ordered
+
+
+def test_comparing_across_kinds_is_not_supported():
+    assert versions.version('11.0').__eq__(versions.build('20A2411')) is (
+        NotImplemented)
+
+
+def test_unparsed_sorts_below_everything():
+    assert not versions.version('').parsed
+    assert versions.version('') < versions.version('10.0')
+    assert versions.version('garbage') < '10.14.6'
+    assert versions.build('unknown') < versions.build('10A00')
+    assert versions.version('10.14.6').parsed
+
+
+def test_comparable_needs_a_parser():
+    with pytest.raises(TypeError):
+        versions.Comparable('10.14.6', (versions.PARSED, (10, 14, 6), ''))
+
+
+# Property checks over generated strings. Seeded, so a failure can be run
+# again.
+SEED = 20210301
+EXAMPLES = 500
+
+
+def random_numbers(rng):
+    return [rng.randint(0, 20) for _ in range(rng.randint(1, 4))]
+
+
+def test_versions_order_like_their_numbers():
+    rng = random.Random(SEED)
+    for _ in range(EXAMPLES):
+        a, b = random_numbers(rng), random_numbers(rng)
+        a_text = '.'.join(str(number) for number in a)
+        b_text = '.'.join(str(number) for number in b)
+        # Trailing zeros don't count, so pad both to the same length
+        width = max(len(a), len(b))
+        a_padded = a + [0] * (width - len(a))
+        b_padded = b + [0] * (width - len(b))
+        assert (versions.version(a_text) < versions.version(b_text)) == (
+            a_padded < b_padded)
+        assert (versions.version(a_text) == versions.version(b_text)) == (
+            a_padded == b_padded)
+
+
+def test_trailing_zeros_and_security_responses():
+    rng = random.Random(SEED)
+    for _ in range(EXAMPLES):
+        text = '.'.join(str(number) for number in random_numbers(rng))
+        assert versions.version(text) == versions.version(text + '.0')
+        rsr = rng.choice(string.ascii_lowercase)
+        assert versions.version(text) < '%s (%s)' % (text, rsr)
+        assert hash(versions.version(text)) == hash(
+            versions.version(text + '.0'))
+
+
+def random_build(rng):
+    major = rng.randint(15, 24)
+    train = rng.choice('ABCDEFGH')
+    kind = rng.choice(['beta', 'release', 'rsr'])
+    if kind == 'beta':
+        number = rng.randint(1000, 9999)
+        suffix = rng.choice('abcdef')
+    elif kind == 'release':
+        number = rng.randint(1, 9999)
+        suffix = ''
+    else:
+        number = rng.randint(versions.RSR_BUILD_NUMBER, 999999)
+        suffix = rng.choice('abc')
+    key = (major, train, kind != 'beta', number, suffix)
+    return '%d%s%d%s' % (major, train, number, suffix), key
+
+
+def test_builds_order_like_their_parts():
+    rng = random.Random(SEED)
+    builds = [random_build(rng) for _ in range(EXAMPLES)]
+    by_parts = [text for text, key in sorted(builds, key=lambda b: b[1])]
+    assert sorted(by_parts, key=versions.build) == by_parts
+
+
+def test_ordering_is_total_and_consistent():
+    rng = random.Random(SEED)
+    texts = ['.'.join(str(number) for number in random_numbers(rng))
+             for _ in range(100)]
+    texts += [''.join(rng.choice('ab.1-') for _ in range(rng.randint(0, 6)))
+              for _ in range(20)]
+    parsed = [versions.version(text) for text in texts]
+    for a in parsed:
+        for b in parsed:
+            # Exactly one of <, == and > holds
+            assert [a < b, a == b, a > b].count(True) == 1
+            assert (a <= b) == (a < b or a == b)
+    ordered = sorted(parsed)
+    assert all(a <= b for a, b in zip(ordered, ordered[1:]))
+    # Unreadable strings sort below every readable one
+    first_parsed = [version.parsed for version in ordered].index(True)
+    assert all(version.parsed for version in ordered[first_parsed:])
@@ -0,0 +1,766 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''benchmark - time nudge's startup path, off macOS.
+
+Runs nudge's main() end to end for an already compliant device, a major
+upgrade and a minor update, plus the pieces of it that grow with the nib,
+the config or the pending updates: parsing softwareupdate -la output,
+Nibbler view lookups (also in a view tree nested deeper than the recursion
+limit), config loading, version comparisons, get_minimum_minor_update_days()
+(also for software_updates lists of several sizes, to show how it scales),
+the preference store, matching a device against the config's rules, opening
+the interaction journal and writing out a run's worth of log records.
+Version comparisons are also timed with LooseVersion, which nudge used
+before versions.py, for comparison. For each of the main() runs, it also
+measures the time a fresh process spends importing modules, as python -X
+importtime reports it. PyObjC is replaced by the stand-ins in
+tools/pyobjc_fakes, so this runs on a plain Linux box. What the stand-ins do
+costs next to nothing, so the times are nudge's own Python. The main() runs
+also fail if nudge synchronizes preferences more than once.
+
+Each benchmark is the best of several rounds. Times are divided by the time
+of a calibration loop of plain Python, run right after each benchmark, and
+these ratios are compared to benchmark_baseline.json. Anything slower than
+the baseline by more than the threshold fails the run. The ratios hold from
+one machine to the next far better than times do, but a baseline recorded
+on the same machine is still the most reliable, use --save to record one
+before making a change.
+
+nudge runs against a copy of the Resources directory and a temporary home
+directory, with caches warmed by one untimed run, as on a device that has
+run nudge before.
+'''
+import atexit
+import ctypes
+import json
+import math
+import optparse
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import types
+import warnings
+from datetime import datetime, timedelta
+
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+RESOURCES_DIR = os.path.join(
+    TOOLS_DIR, '..', 'payload', 'Library', 'nudge', 'Resources')
+FAKES_DIR = os.path.join(TOOLS_DIR, 'pyobjc_fakes')
+BASELINE_PATH = os.path.join(TOOLS_DIR, 'benchmark_baseline.json')
+
+# Slower than the baseline by more than this share is a regression
+DEFAULT_THRESHOLD = 0.5
+# Rounds per benchmark, the best one counts
+DEFAULT_ROUNDS = 5
+# Each round loops until it has taken at least this long
+MIN_ROUND_SECONDS = 0.2
+# Iterations of calibrate(), the unit results are stored in
+CALIBRATION_LOOPS = 100000
+
+# Sizes of the generated configs
+SOFTWARE_UPDATES = 500
+PENDING_UPDATES = 20
+# software_updates sizes for the catalog scaling benchmarks
+CATALOG_SIZES = [100, 1000, 10000]
+# Versions compared with each other, about what a run sees between the OS,
+# the config and its rules
+VERSION_STRINGS = ['10.14.6', '10.15', '10.15.7', '11.0', '11.2.3', '11.5.2',
+                   '12.6', '13.3.1', '13.3.1 (a)', '14.0']
+# Updates listed in the softwareupdate transcripts
+TRANSCRIPT_UPDATES = 20
+# Nesting of the deep view tree, twice the default recursion limit
+DEEP_VIEWS = 2000
+# Rules, and the serials they list between them
+RULES = 20
+RULE_SERIALS = 50000
+# Days of interaction journal, with a run every half hour
+JOURNAL_DAYS = 90
+# Records logged by the log writer benchmark, about a verbose run's worth
+LOG_RECORDS = 1000
+# Preference synchronizes a run may make. nudge writes its preferences out
+# in one go.
+MAX_SYNCHRONIZE_CALLS = 1
+# Printed by the import time run before nudge starts, imports before it are
+# the harness's own
+IMPORT_MARKER = 'nudge-benchmark: start'
+
+
+class FakeFunction(object):
+    '''Stands in for a C function of a macOS framework'''
+    def __call__(self, *args):
+        return 0
+
+
+class FakeLibrary(object):
+    '''Stands in for a macOS framework loaded with ctypes. On Linux
+    find_library() doesn't find them and returns None.'''
+    def __getattr__(self, name):
+        function = FakeFunction()
+        setattr(self, name, function)
+        return function
+
+
+def install_fake_libraries():
+    real_cdll = ctypes.CDLL
+
+    def cdll(name, *args, **kwargs):
+        if name is None:
+            return FakeLibrary()
+        return real_cdll(name, *args, **kwargs)
+    ctypes.CDLL = cdll
+
+
+class BenchFactsProvider(object):
+    '''Device facts for devicefacts.load(), set by each scenario'''
+    facts = {'os_version': '11.2.3', 'os_build': '20D91',
+             'serial': 'C02BENCH0001'}
+
+    def session_key(self):
+        return ['benchmark', self.facts['os_build']]
+
+    def collect(self):
+        return dict(self.facts)
+
+
+def date_string(days):
+    '''A config date this many days from now'''
+    return (datetime.utcnow() + timedelta(days=days)).strftime(
+        '%Y-%m-%d-%H:%M')
+
+
+def software_updates(count):
+    '''A software_updates list with some wildcard entries, like a fleet that
+    has kept adding to it'''
+    updates = []
+    for i in range(count):
+        if i % 10 == 0:
+            name = '%03d-*' % (i // 10)
+        else:
+            name = '%03d-%05d' % (i // 10, i)
+        updates.append({'name': name, 'force_install_date': date_string(
+            30 + i % 60), 'grace_period_days': i % 3})
+    return updates
+
+
+def pending_updates(count):
+    '''RecommendedUpdates entries, some of them in software_updates'''
+    return [{'Product Key': '%03d-%05d' % (i, i * 10 + 1),
+             'Display Name': 'Update %s' % i,
+             'Display Version': '1.0'} for i in range(count)]
+
+
+class Scenario(object):
+    '''One way a run of nudge can go, with the device and config for it'''
+    def __init__(self, name, outcome, facts, preferences,
+                 updates=(), pending=None):
+        self.name = name
+        self.outcome = outcome
+        self.facts = facts
+        self.preferences = preferences
+        self.software_updates = list(updates)
+        self.pending = pending
+        self.config_path = None
+
+    def prepare(self, work_dir):
+        self.config_path = os.path.join(work_dir, '%s.json' % self.name)
+        with open(self.config_path, 'w') as f:
+            json.dump({'preferences': self.preferences,
+                       'software_updates': self.software_updates}, f)
+
+    def activate(self, home_dir):
+        '''Point the stand-ins at this scenario's device'''
+        import CoreFoundation
+        BenchFactsProvider.facts = self.facts
+        CoreFoundation.PREFERENCES.clear()
+        if self.pending is None:
+            return
+        CoreFoundation.PREFERENCES[
+            ('com.apple.SoftwareUpdate', 'RecommendedUpdates')] = self.pending
+        for name in ('AutomaticCheckEnabled', 'AutomaticDownload',
+                     'AutomaticallyInstallMacOSUpdates'):
+            CoreFoundation.PREFERENCES[
+                ('/Library/Preferences/com.apple.SoftwareUpdate', name)] = True
+        # A fresh softwareupdate scan, softwareupdate itself is never run
+        updates = [{'label': item['Product Key'], 'title': item['Display Name'],
+                    'version': '1.0', 'size': '1024K', 'recommended': True,
+                    'restart_required': True} for item in self.pending]
+        with open(os.path.join(cache_dir(home_dir),
+                               'softwareupdate_scan.json'), 'w') as f:
+            json.dump({'os_build': self.facts['os_build'],
+                       'scanned_at': time.time(),
+                       'results': {'downloaded': True, 'updates': updates,
+                                   'restart_required': True}}, f)
+
+
+def scenarios(work_dir):
+    app_path = os.path.join(work_dir, 'Install macOS Big Sur.app')
+    os.makedirs(app_path, exist_ok=True)
+    shown = {'cut_off_date': date_string(30), 'more_info_url':
+             'https://example.com', 'path_to_app': app_path}
+    return [
+        Scenario('compliant', 0,
+                 {'os_version': '11.2.3', 'os_build': '20D91',
+                  'serial': 'C02BENCH0001', 'model': 'MacBookPro16,1'},
+                 {'minimum_os_version': '11.2.3'}),
+        Scenario('major', 'shown',
+                 {'os_version': '10.15.7', 'os_build': '19H2',
+                  'serial': 'C02BENCH0001', 'model': 'MacBookPro16,1'},
+                 dict(shown, minimum_os_version='11.2.3')),
+        Scenario('minor', 'shown',
+                 {'os_version': '11.2.1', 'os_build': '20D74',
+                  'serial': 'C02BENCH0001', 'model': 'MacBookPro16,1'},
+                 {'minimum_os_version': '11.2.3',
+                  'minimum_os_sub_build_version': '20D91',
+                  'update_minor': True, 'path_to_app': app_path},
+                 software_updates(SOFTWARE_UPDATES),
+                 pending_updates(PENDING_UPDATES)),
+    ]
+
+
+def cache_dir(home_dir):
+    path = os.path.join(home_dir, 'Library', 'Caches', 'com.erikng.nudge')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+class NudgeRunner(object):
+    '''Runs the nudge script's main() as if it had just been launched'''
+    def __init__(self, resources_dir):
+        self.path = os.path.join(resources_dir, 'nudge')
+        with open(self.path) as f:
+            self.source = f.read()
+
+    def run(self, scenario):
+        '''Return the exit code of the run, or 'shown' if it got as far as
+        showing the window'''
+        sys.argv = ['nudge', '--jsonurl', 'file://' + scenario.config_path]
+        # Compiled on every run, as python does for a script
+        code = compile(self.source, self.path, 'exec')
+        module = types.ModuleType('nudge')
+        module.__file__ = self.path
+        outcome = 'shown'
+        try:
+            exec(code, module.__dict__)
+            module.main()
+        except SystemExit as err:
+            outcome = err.code
+        finally:
+            # What would happen as the process exits
+            atexit._run_exitfuncs()
+            if getattr(module, 'NUDGE_LOCK', None) is not None:
+                module.NUDGE_LOCK.close()
+        return outcome
+
+
+def calibrate():
+    '''A fixed amount of the dict, string and arithmetic work nudge's Python
+    does, to measure how fast this machine runs it'''
+    table = {}
+    total = 0
+    for number in range(CALIBRATION_LOOPS):
+        key = number % 64
+        table[key] = str(number)
+        total += len(table[key])
+    return total
+
+
+def time_function(func, rounds):
+    '''Return the best time of one call to func, in seconds'''
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= MIN_ROUND_SECONDS:
+            break
+        number *= 2
+    best = elapsed / number
+    for _ in range(rounds - 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - started) / number)
+    return best
+
+
+def main_benchmarks(work_dir, home_dir, resources_dir):
+    runner = NudgeRunner(resources_dir)
+    benchmarks = []
+    for scenario in scenarios(work_dir):
+        scenario.prepare(work_dir)
+
+        def run(scenario=scenario):
+            import CoreFoundation
+            scenario.activate(home_dir)
+            syncs = CoreFoundation.SYNCHRONIZE_CALLS
+            outcome = runner.run(scenario)
+            if outcome != scenario.outcome:
+                raise RuntimeError('main %s: expected %r, got %r' % (
+                    scenario.name, scenario.outcome, outcome))
+            syncs = CoreFoundation.SYNCHRONIZE_CALLS - syncs
+            if syncs > MAX_SYNCHRONIZE_CALLS:
+                raise RuntimeError('main %s: %s preference synchronizes' % (
+                    scenario.name, syncs))
+        benchmarks.append(('main_%s' % scenario.name, run))
+    return benchmarks
+
+
+def import_run(work_dir, home_dir, resources_dir, name):
+    '''Run nudge once for the named scenario, for import_benchmarks()'''
+    sys.path[:0] = [FAKES_DIR, resources_dir]
+    install_fake_libraries()
+    import devicefacts
+    devicefacts.MacFactsProvider = BenchFactsProvider
+    scenario = [scenario for scenario in scenarios(work_dir)
+                if scenario.name == name][0]
+    scenario.prepare(work_dir)
+    scenario.activate(home_dir)
+    sys.stderr.write(IMPORT_MARKER + '\n')
+    sys.stderr.flush()
+    outcome = NudgeRunner(resources_dir).run(scenario)
+    if outcome != scenario.outcome:
+        raise RuntimeError('import %s: expected %r, got %r' % (
+            name, scenario.outcome, outcome))
+
+
+def import_time(output):
+    '''Return the seconds of the top level imports after IMPORT_MARKER in
+    python -X importtime output'''
+    lines = output.splitlines()
+    total = 0
+    for line in lines[lines.index(IMPORT_MARKER) + 1:]:
+        # import time: self [us] | cumulative | imported package
+        fields = line.split('|')
+        if not line.startswith('import time:') or len(fields) != 3:
+            continue
+        # Nested imports are indented, and counted in their parent's total
+        if fields[2].startswith('  ') or not fields[1].strip().isdigit():
+            continue
+        total += int(fields[1])
+    return total / 1000000.0
+
+
+def import_benchmarks(work_dir, home_dir, resources_dir):
+    '''The import time of each main() run, in a fresh process so nothing
+    is imported yet. These are measured rather than timed.'''
+    benchmarks = []
+    for scenario in scenarios(work_dir):
+        code = ('import sys; sys.path.insert(0, %r); import benchmark; '
+                'benchmark.import_run(%r, %r, %r, %r)' % (
+                    TOOLS_DIR, work_dir, home_dir, resources_dir,
+                    scenario.name))
+
+        def measure(code=code, name=scenario.name):
+            process = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-c', code],
+                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                universal_newlines=True)
+            if process.returncode:
+                raise RuntimeError('import %s failed:\n%s' % (
+                    name, process.stderr[-2000:]))
+            return import_time(process.stderr)
+        benchmarks.append(('import_%s' % scenario.name, measure))
+    return benchmarks
+
+
+def nibbler_benchmarks(resources_dir, work_dir):
+    import AppKit
+    import nibbler
+    nib_path = os.path.join(resources_dir, 'nudge.nib')
+    identifiers = [ident for group in AppKit.NIB_LAYOUT for ident in group]
+
+    def load():
+        nib = nibbler.Nibbler(nib_path, work_dir)
+        for ident in identifiers:
+            nib.views[ident]
+
+    def view_paths():
+        nibbler.view_paths(AppKit.build_window().contentView())
+
+    # A view at the bottom of nested views, each with a sibling, past the
+    # depth a recursive walk could go
+    deep_view = AppKit.NSView('button.ok')
+    for level in range(DEEP_VIEWS):
+        deep_view = AppKit.NSView(None, [AppKit.NSView('_NS:%d' % level),
+                                         deep_view])
+
+    def deep_tree():
+        views = nibbler.ViewIndex(deep_view, nibbler.view_paths(deep_view))
+        views['button.ok']
+    return [('nibbler_load', load), ('nibbler_view_paths', view_paths),
+            ('nibbler_deep_tree', deep_tree)]
+
+
+def config_benchmarks(work_dir):
+    import config
+    nudge_json = {'preferences': {'minimum_os_version': '11.2.3',
+                                  'cut_off_date': date_string(30)},
+                  'software_updates': software_updates(SOFTWARE_UPDATES)}
+    json_raw = json.dumps(nudge_json)
+    cache_path = os.path.join(work_dir, config.CACHE_NAME)
+    log = lambda text: None
+
+    def parse():
+        config.parse_dates(config.compile_config(json.loads(json_raw)))
+        config.validate(json.loads(json_raw))
+
+    def load_cached():
+        config.load(json_raw, cache_path, log)
+    load_cached()
+    return [('config_parse', parse), ('config_load_cached', load_cached)]
+
+
+def versions_benchmarks():
+    import versions
+    pairs = [(a, b) for a in VERSION_STRINGS for b in VERSION_STRINGS]
+
+    def memoized():
+        for a, b in pairs:
+            versions.version(a) < versions.version(b)
+    benchmarks = [('versions_compare', memoized)]
+    # Both the import and LooseVersion() warn that distutils is deprecated
+    warnings.filterwarnings('ignore', '.*distutils', DeprecationWarning)
+    try:
+        from distutils.version import LooseVersion
+    except ImportError:
+        # distutils is gone from Python 3.12 on
+        return benchmarks
+
+    def loose():
+        for a, b in pairs:
+            LooseVersion(a) < LooseVersion(b)
+    return benchmarks + [('versions_compare_looseversion', loose)]
+
+
+def transcript(count, legacy=False):
+    '''softwareupdate -la output listing count updates, the last of which
+    needs a restart, in the 10.15+ format or the legacy one'''
+    lines = [b'Software Update Tool', b'', b'Finding available software',
+             b'Software Update found the following new or updated software:']
+    for i in range(count):
+        action = i == count - 1
+        if legacy:
+            lines += [b'   * Update%d-10.14.6' % i,
+                      b'\tUpdate %d (10.14.6), %dK [recommended]%s' % (
+                          i, 1000 + i, b' [restart]' if action else b'')]
+        else:
+            lines += [b'* Label: Update%d-10.15.7' % i,
+                      b'\tTitle: Update %d, Version: 10.15.7, Size: %dK, '
+                      b'Recommended: YES,%s' % (
+                          i, 1000 + i, b' Action: restart,' if action
+                          else b'')]
+    return lines
+
+
+def transcript_benchmarks():
+    import softwareupdate
+    catalina = transcript(TRANSCRIPT_UPDATES)
+    mojave = transcript(TRANSCRIPT_UPDATES, legacy=True)
+
+    def parse(lines):
+        updates = list(softwareupdate.parse_updates(lines))
+        if not updates[-1].restart_required:
+            raise RuntimeError('transcript: restart update not parsed')
+    return [('transcript_parse', lambda: parse(catalina)),
+            ('transcript_parse_legacy', lambda: parse(mojave))]
+
+
+def minor_update_days_benchmarks():
+    import decision
+    updates = software_updates(SOFTWARE_UPDATES)
+    pending = pending_updates(PENDING_UPDATES)
+    now = datetime.utcnow()
+
+    def cached():
+        decision.get_minimum_minor_update_days(14, pending, updates, now=now)
+
+    def uncached():
+        # A new list every time, so the catalog is built again
+        decision.get_minimum_minor_update_days(14, pending, list(updates),
+                                               now=now)
+    return [('minor_update_days', cached),
+            ('minor_update_days_uncached', uncached)]
+
+
+def catalog_scaling_benchmarks():
+    '''get_minimum_minor_update_days() for each of CATALOG_SIZES, with the
+    catalog built once and with it built on every call'''
+    import decision
+    pending = pending_updates(PENDING_UPDATES)
+    now = datetime.utcnow()
+    benchmarks = []
+    for size in CATALOG_SIZES:
+        updates = software_updates(size)
+
+        def cached(updates=updates):
+            decision.get_minimum_minor_update_days(14, pending, updates,
+                                                   now=now)
+
+        def uncached(updates=updates):
+            decision.get_minimum_minor_update_days(14, pending, list(updates),
+                                                   now=now)
+        benchmarks += [('catalog_lookup_%d' % size, cached),
+                       ('catalog_build_%d' % size, uncached)]
+    return benchmarks
+
+
+def report_scaling(results):
+    '''Print how the catalog scaling benchmarks grow with the size of
+    software_updates, as k in time = c * size ** k. 1 is linear, 0 is
+    constant.'''
+    for prefix in ('catalog_lookup', 'catalog_build'):
+        sizes = [size for size in CATALOG_SIZES
+                 if '%s_%d' % (prefix, size) in results]
+        if len(sizes) < 2:
+            continue
+        times = [results['%s_%d' % (prefix, size)] for size in sizes]
+        exponent = (math.log(times[-1] / times[0]) /
+                    math.log(float(sizes[-1]) / sizes[0]))
+        print('%s grows as size ** %.2f (%s)' % (prefix, exponent, ', '.join(
+            '%d: %.3fms' % (size, seconds * 1000)
+            for size, seconds in zip(sizes, times))))
+
+
+def preferences_benchmarks(work_dir):
+    import prefstore
+    plist_dir = os.path.join(work_dir, 'preferences')
+    os.makedirs(plist_dir, exist_ok=True)
+    pending = pending_updates(PENDING_UPDATES)
+    prefstore.PlistBackend(plist_dir).write(
+        'RecommendedUpdates', pending, 'com.apple.SoftwareUpdate')
+
+    def run():
+        # What the minor update path reads and writes
+        store = prefstore.PreferenceStore(prefstore.PlistBackend(plist_dir))
+        for _ in range(3):
+            store.get('RecommendedUpdates', 'com.apple.SoftwareUpdate')
+        store.get('first_seen')
+        store.set('first_seen', datetime.utcnow())
+        store.get('first_seen')
+        store.set('last_seen', datetime.utcnow())
+        store.get('last_seen')
+        store.flush()
+        if store.backend.syncs > MAX_SYNCHRONIZE_CALLS:
+            raise RuntimeError('preferences: %s synchronizes' % (
+                store.backend.syncs))
+    return [('preferences', run)]
+
+
+def rules_benchmarks():
+    import devicefacts
+    import targeting
+    serials = ['C02%09d' % number for number in range(RULE_SERIALS)]
+    per_rule = RULE_SERIALS // RULES
+    rules = []
+    for number in range(RULES):
+        # Half the rules list serials, some with models, the rest match on
+        # an OS range or a rollout wave
+        match = {'serials': serials[number * per_rule:(number + 1) * per_rule]}
+        if number % 4 == 1:
+            match['models'] = ['MacBookPro16,%s' % model for model in range(4)]
+        elif number % 4 == 2:
+            match = {'os_min': '10.15.%s' % number, 'os_max': '11.%s' % number}
+        elif number % 4 == 3:
+            match = {'percent': [number, number + 5]}
+        rules.append({'name': 'rule%s' % number, 'priority': number % 3,
+                      'match': match,
+                      'preferences': {'minimum_os_version': '11.2.3'}})
+    nudge_json = {'preferences': {'minimum_os_version': '11.2.2'},
+                  'software_updates': [], 'rule_match': 'priority',
+                  'rollout_seed': 'bench', 'rules': rules}
+    nudge_json[targeting.INDEX_KEY] = targeting.RuleIndex(
+        rules, 'priority', 'bench')
+    # A device listed by one of the last rules
+    facts = devicefacts.DeviceFacts('11.1', '20C69', serials[-per_rule * 4],
+                                    'MacBookPro16,1')
+
+    def match():
+        targeting.select(nudge_json, facts)
+
+    def index():
+        targeting.RuleIndex(rules, 'priority', 'bench')
+    return [('rules_match', match), ('rules_index', index)]
+
+
+def journal_benchmarks(work_dir):
+    import journal
+    path = os.path.join(work_dir, journal.JOURNAL_NAME)
+    now = [time.time() - JOURNAL_DAYS * 86400]
+    recorder = journal.Journal(path, clock=lambda: now[0])
+    dismissals = 0
+    for run in range(JOURNAL_DAYS * 48):
+        now[0] += 1800
+        if run % (14 * 48) == 0:
+            # An update gets installed every two weeks
+            recorder.reset()
+            dismissals = 0
+        recorder.record(journal.IMPRESSION)
+        recorder.record(journal.DISMISSAL)
+        dismissals += 1
+    if os.path.getsize(path) > journal.MAX_BYTES:
+        raise RuntimeError('journal: %s bytes' % os.path.getsize(path))
+
+    def load():
+        # What a launch does, from the checkpoint
+        if journal.Journal(path).count(journal.DISMISSAL) != dismissals:
+            raise RuntimeError('journal: dismissals miscounted')
+    return [('journal_load', load)]
+
+
+def logwriter_benchmarks(work_dir):
+    import logwriter
+    log_dir = os.path.join(work_dir, 'logs')
+    os.makedirs(log_dir, exist_ok=True)
+
+    def throughput():
+        # Queue the records, then write them all out as nudge does on exit
+        writer = logwriter.LogWriter(log_dir, nslog=False, user='bench')
+        writer.start()
+        for number in range(LOG_RECORDS):
+            logwriter.log('Downloading nudge.json', number=number)
+        writer.stop()
+    return [('logwriter_throughput', throughput)]
+
+
+def load_baseline(path):
+    '''Return the baseline's ratios to the calibration loop. Baselines
+    of times, from before there was a calibration loop, have none.'''
+    try:
+        with open(path) as f:
+            return json.load(f).get('ratios', {})
+    except (IOError, OSError, ValueError):
+        return {}
+
+
+def save_baseline(path, ratios, calibration):
+    with open(path, 'w') as f:
+        json.dump({'python': platform.python_version(),
+                   'machine': platform.machine(),
+                   'calibration_seconds': calibration,
+                   'ratios': ratios}, f, indent=4, sort_keys=True)
+        f.write('\n')
+
+
+def compare(results, calibrations, baseline, threshold):
+    '''Print each result against the baseline and return the names of the
+    regressions. The baseline's ratios are shown as times on this
+    machine.'''
+    regressions = []
+    print('%-28s %12s %12s %8s' % ('benchmark', 'time', 'baseline', 'change'))
+    for name, seconds in results.items():
+        base = baseline.get(name)
+        calibration = calibrations[name]
+        if base:
+            change = seconds / calibration / base - 1
+            flag = ''
+            if change > threshold:
+                regressions.append(name)
+                flag = '  REGRESSION'
+            print('%-28s %10.3fms %10.3fms %+7.1f%%%s' % (
+                name, seconds * 1000, base * calibration * 1000,
+                change * 100, flag))
+        else:
+            print('%-28s %10.3fms %12s %8s' % (
+                name, seconds * 1000, '-', '-'))
+    return regressions
+
+
+def main():
+    usage = '%prog [options] [benchmark ...]'
+    parser = optparse.OptionParser(usage=usage)
+    parser.add_option('--baseline', default=BASELINE_PATH,
+                      help='Baseline file. Default: %default')
+    parser.add_option('--save', action='store_true', default=False,
+                      help='Record the results as the new baseline.')
+    parser.add_option('--threshold', type='float', default=DEFAULT_THRESHOLD,
+                      help=('Fail if slower than the baseline by more than '
+                            'this share. Default: %default'))
+    parser.add_option('--rounds', type='int', default=DEFAULT_ROUNDS,
+                      help='Rounds per benchmark. Default: %default')
+    parser.add_option('--list', action='store_true', default=False,
+                      help='List the benchmarks and exit.')
+    opts, args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='nudge-benchmark-')
+    try:
+        # A copy, so nothing nudge writes lands in the repo
+        resources_dir = os.path.join(work_dir, 'Resources')
+        shutil.copytree(RESOURCES_DIR, resources_dir,
+                        ignore=shutil.ignore_patterns(
+                            '__pycache__', '*.index.json', 'nudge.json'))
+        home_dir = os.path.join(work_dir, 'home')
+        os.environ['HOME'] = home_dir
+        cache_dir(home_dir)
+        sys.path[:0] = [FAKES_DIR, resources_dir]
+        install_fake_libraries()
+        import devicefacts
+        devicefacts.MacFactsProvider = BenchFactsProvider
+
+        measured = import_benchmarks(work_dir, home_dir, resources_dir)
+        benchmarks = (main_benchmarks(work_dir, home_dir, resources_dir) +
+                      measured +
+                      nibbler_benchmarks(resources_dir, work_dir) +
+                      config_benchmarks(work_dir) +
+                      versions_benchmarks() +
+                      transcript_benchmarks() +
+                      minor_update_days_benchmarks() +
+                      catalog_scaling_benchmarks() +
+                      preferences_benchmarks(work_dir) +
+                      rules_benchmarks() +
+                      journal_benchmarks(work_dir) +
+                      logwriter_benchmarks(work_dir))
+        if opts.list:
+            for name, _ in benchmarks:
+                print(name)
+            return 0
+        if args:
+            unknown = set(args) - set(name for name, _ in benchmarks)
+            if unknown:
+                parser.error('Unknown benchmark: %s' %
+                             ', '.join(sorted(unknown)))
+            benchmarks = [(name, func) for name, func in benchmarks
+                          if name in args]
+
+        measured = dict(measured)
+        results = {}
+        calibrations = {}
+        for name, func in benchmarks:
+            # Warm the caches, as on a device that has run nudge before
+            func()
+            if name in measured:
+                results[name] = min(func() for _ in range(opts.rounds))
+            else:
+                results[name] = time_function(func, opts.rounds)
+            # Right after, so both see the machine in the same state
+            calibrations[name] = time_function(calibrate, opts.rounds)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if opts.save:
+        baseline = load_baseline(opts.baseline)
+        baseline.update((name, seconds / calibrations[name])
+                        for name, seconds in results.items())
+        save_baseline(opts.baseline, baseline,
+                      min(calibrations.values()))
+        compare(results, calibrations, {}, opts.threshold)
+        report_scaling(results)
+        print('Baseline saved to %s' % opts.baseline)
+        return 0
+    regressions = compare(results, calibrations,
+                          load_baseline(opts.baseline), opts.threshold)
+    report_scaling(results)
+    if regressions:
+        print('Slower than the baseline by more than %d%%: %s' % (
+            opts.threshold * 100, ', '.join(regressions)))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''nudge_compile - validate a nudge.json and write its compiled form.
+
+Every key is checked for its type, and dates, versions and builds for their
+format. Unknown keys are reported, as they are usually typos. If nothing is
+wrong, the config is written out with every default filled in and marked as
+compiled, so nudge loads it without validating it again. Serve or bundle the
+compiled file in place of the original.
+'''
+import json
+import optparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    '..', 'payload', 'Library', 'nudge', 'Resources'))
+import config
+
+
+def get_parsed_options():
+    '''Return the parsed options and args for this application.'''
+    usage = '%prog [options] nudge.json [compiled.json]'
+    options = optparse.OptionParser(usage=usage)
+    options.add_option('--check', action='store_true', default=False,
+                       help=('Optional: Only validate, do not write the '
+                             'compiled config.'))
+    return options.parse_args()
+
+
+def main():
+    '''Main thread'''
+    opts, args = get_parsed_options()
+    if len(args) not in (1, 2):
+        print('Usage: nudge_compile.py [options] nudge.json [compiled.json]',
+              file=sys.stderr)
+        exit(1)
+    with open(args[0]) as f:
+        try:
+            nudge_json = json.load(f)
+        except ValueError as err:
+            print('%s: %s' % (args[0], err), file=sys.stderr)
+            exit(1)
+
+    errors = config.validate(nudge_json)
+    for error in errors:
+        print('%s: %s' % (args[0], error), file=sys.stderr)
+    if errors:
+        exit(1)
+    if opts.check:
+        exit(0)
+
+    compiled = json.dumps(config.compile_config(nudge_json),
+                          separators=(',', ':'), sort_keys=True)
+    if len(args) == 2:
+        with open(args[1], 'w') as f:
+            f.write(compiled)
+    else:
+        print(compiled)
+
+
+if __name__ == '__main__':
+    main()
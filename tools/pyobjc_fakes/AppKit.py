@@ -0,0 +1,207 @@
+# Stand-in for the parts of AppKit nudge uses, so nudge can run off macOS.
+# NSNib doesn't read the nib it is given, it always makes a window with the
+# views nudge.nib has, grouped the same way. See tools/benchmark.py.
+
+from Foundation import NSObject, NSNotificationCenter
+
+
+NSWorkspaceApplicationKey = 'NSWorkspaceApplicationKey'
+NSWorkspaceDidLaunchApplicationNotification = (
+    'NSWorkspaceDidLaunchApplicationNotification')
+NSWorkspaceDidActivateApplicationNotification = (
+    'NSWorkspaceDidActivateApplicationNotification')
+NSWorkspaceDidUnhideApplicationNotification = (
+    'NSWorkspaceDidUnhideApplicationNotification')
+NSWorkspaceDidTerminateApplicationNotification = (
+    'NSWorkspaceDidTerminateApplicationNotification')
+
+# The identified views of nudge.nib, by the box they are in
+NIB_LAYOUT = [
+    ['image.companylogo', 'field.titletext', 'field.subtitletext'],
+    ['field.username', 'field.serialnumber', 'field.updated',
+     'field.daysremainingtext', 'field.daysremaining', 'field.deferralcount'],
+    ['field.updatetext', 'field.paragraph1', 'field.paragraph2',
+     'field.paragraph3', 'image.updatess'],
+    ['field.h1text', 'field.h2text', 'button.update', 'button.moreinfo',
+     'button.ok', 'button.understand'],
+]
+# Unnamed labels next to each identified view, as Interface Builder leaves
+LABELS_PER_VIEW = 2
+
+
+class NSView(NSObject):
+    def __init__(self, identifier=None, subviews=()):
+        self._identifier = identifier
+        self._subviews = list(subviews)
+        self.hidden = False
+        self.enabled = True
+        self.value = None
+
+    def identifier(self):
+        return self._identifier
+
+    def subviews(self):
+        return self._subviews
+
+    def setHidden_(self, hidden):
+        self.hidden = hidden
+
+    def setEnabled_(self, enabled):
+        self.enabled = enabled
+
+    def setStringValue_(self, value):
+        self.value = value
+
+    def setImage_(self, image):
+        self.value = image
+
+
+class NSBox(NSView):
+    pass
+
+
+class NSTextField(NSView):
+    pass
+
+
+class NSImageView(NSView):
+    pass
+
+
+class NSButton(NSView):
+    def setTarget_(self, target):
+        self.target = target
+
+    def setAction_(self, action):
+        self.action = action
+
+
+class NSWindow(NSObject):
+    def __init__(self, content_view):
+        self.content_view = content_view
+        self.visible = False
+
+    def contentView(self):
+        return self.content_view
+
+    def makeKeyAndOrderFront_(self, sender):
+        self.visible = True
+
+    def orderOut_(self, sender):
+        self.visible = False
+
+    def isVisible(self):
+        return self.visible
+
+    def display(self):
+        pass
+
+
+def build_window():
+    '''Return a window laid out like nudge.nib'''
+    view_classes = {'button': NSButton, 'field': NSTextField,
+                    'image': NSImageView}
+    count = 0
+    boxes = []
+    for group in NIB_LAYOUT:
+        subviews = []
+        for ident in group:
+            for _ in range(LABELS_PER_VIEW):
+                count += 1
+                subviews.append(NSTextField('_NS:%s' % count))
+            subviews.append(view_classes[ident.split('.')[0]](ident))
+        count += 1
+        boxes.append(NSBox('_NS:%s' % count, subviews))
+    return NSWindow(NSView(None, boxes))
+
+
+class NSNib(NSObject):
+    def initWithNibData_bundle_(self, data, bundle):
+        self.data = data
+        return self
+
+    def instantiateWithOwner_topLevelObjects_(self, owner, objects):
+        return True, [NSObject.alloc().init(), build_window()]
+
+
+class NSImage(NSObject):
+    def initWithData_(self, data):
+        self.data = data
+        return self
+
+
+class NSRunningApplication(NSObject):
+    def __init__(self, pid, bundle_id, bundle_url, launch_date=None):
+        self.pid = pid
+        self.bundle_id = bundle_id
+        self.bundle_url = bundle_url
+        self.launch_date = launch_date
+        self.hidden = False
+
+    def processIdentifier(self):
+        return self.pid
+
+    def launchDate(self):
+        return self.launch_date
+
+    def bundleIdentifier(self):
+        return self.bundle_id
+
+    def bundleURL(self):
+        return self.bundle_url
+
+    def hide(self):
+        self.hidden = True
+        return True
+
+
+class NSWorkspace(NSObject):
+    _shared = None
+
+    def __init__(self):
+        self.applications = []
+        self.center = NSNotificationCenter()
+
+    @classmethod
+    def sharedWorkspace(cls):
+        if cls._shared is None:
+            cls._shared = cls()
+        return cls._shared
+
+    def runningApplications(self):
+        return self.applications
+
+    def frontmostApplication(self):
+        return self.applications[0] if self.applications else None
+
+    def notificationCenter(self):
+        return self.center
+
+
+class NSApplication(NSObject):
+    _shared = None
+
+    def __init__(self):
+        self.active = True
+
+    @classmethod
+    def sharedApplication(cls):
+        if cls._shared is None:
+            cls._shared = cls()
+        return cls._shared
+
+    def isActive(self):
+        return self.active
+
+    def activateIgnoringOtherApps_(self, flag):
+        self.active = True
+
+    def run(self):
+        '''Returns straight away, there are no events to wait for'''
+        pass
+
+    def terminate_(self, sender):
+        pass
+
+
+NSApp = NSApplication.sharedApplication()
@@ -0,0 +1,27 @@
+# Stand-in for the CoreFoundation preferences functions, backed by a dict.
+# See tools/benchmark.py.
+
+import Foundation
+
+
+# (domain, name) to value
+PREFERENCES = {}
+# Calls to CFPreferencesAppSynchronize, each one is a round trip to cfprefsd
+SYNCHRONIZE_CALLS = 0
+
+
+def CFPreferencesCopyAppValue(name, domain):
+    return PREFERENCES.get((domain, name))
+
+
+def CFPreferencesSetAppValue(name, value, domain):
+    if value is None:
+        PREFERENCES.pop((domain, name), None)
+    else:
+        PREFERENCES[(domain, name)] = Foundation.NSDate.from_value(value)
+
+
+def CFPreferencesAppSynchronize(domain):
+    global SYNCHRONIZE_CALLS
+    SYNCHRONIZE_CALLS += 1
+    return True
@@ -0,0 +1,224 @@
+# Stand-in for the parts of Foundation nudge uses, so nudge can run off macOS.
+# Objects only do what nudge needs from them. See tools/benchmark.py.
+
+import plistlib
+from datetime import datetime
+
+
+class NSObject(object):
+    @classmethod
+    def alloc(cls):
+        return cls.__new__(cls)
+
+    def init(self):
+        return self
+
+    def className(self):
+        return type(self).__name__
+
+    def performSelector_withObject_afterDelay_(self, selector, obj, delay):
+        pass
+
+    @classmethod
+    def cancelPreviousPerformRequestsWithTarget_(cls, target):
+        pass
+
+    def performSelectorOnMainThread_withObject_waitUntilDone_(
+            self, selector, obj, wait):
+        # There is no run loop, call it straight away on this thread
+        getattr(self, selector.replace(':', '_'))(obj)
+
+
+class NSString(str):
+    @classmethod
+    def stringWithString_(cls, value):
+        return cls(value)
+
+
+class NSDate(NSObject):
+    '''Converts to a string the way a CFDate preference does'''
+    def __init__(self, value):
+        self.value = value
+
+    @classmethod
+    def from_value(cls, value):
+        if isinstance(value, datetime):
+            return cls(value)
+        return value
+
+    def __str__(self):
+        return self.value.strftime('%Y-%m-%d %H:%M:%S +0000')
+
+    def timeIntervalSince1970(self):
+        return (self.value - datetime(1970, 1, 1)).total_seconds()
+
+
+class NSBundle(NSObject):
+    def __init__(self):
+        self.info = {}
+
+    @classmethod
+    def mainBundle(cls):
+        return cls()
+
+    @classmethod
+    def bundleWithIdentifier_(cls, identifier):
+        return cls()
+
+    def localizedInfoDictionary(self):
+        return None
+
+    def infoDictionary(self):
+        return self.info
+
+
+class NSURL(NSObject):
+    def __init__(self, path, url=None):
+        self.file_path = path
+        self.url = url or 'file://' + path
+
+    @classmethod
+    def fileURLWithPath_(cls, path):
+        return cls(path)
+
+    @classmethod
+    def URLWithString_(cls, url):
+        return cls(None, url)
+
+    def path(self):
+        return self.file_path
+
+    def absoluteString(self):
+        return self.url
+
+
+class NSData(NSObject):
+    @classmethod
+    def dataWithContentsOfURL_(cls, url):
+        try:
+            with open(url.path(), 'rb') as f:
+                return f.read()
+        except (IOError, OSError):
+            return None
+
+    @classmethod
+    def dataWithBytes_length_(cls, data, length):
+        return bytes(data[:length])
+
+
+# What gurl needs to build a request. Nothing is sent, the request is kept
+# so tests can look at it and drive gurl's delegate methods themselves.
+NSURLRequestReloadIgnoringLocalCacheData = 1
+NSURLResponseUnknownLength = -1
+NSURLCredentialPersistenceNone = 0
+NSPropertyListMutableContainersAndLeaves = 2
+NSPropertyListXMLFormat_v1_0 = 100
+
+
+class NSMutableURLRequest(NSObject):
+    def __init__(self, url):
+        self.url = url
+        self.headers = {}
+
+    @classmethod
+    def requestWithURL_cachePolicy_timeoutInterval_(cls, url, policy,
+                                                    timeout):
+        return cls(url)
+
+    def URL(self):
+        return self.url
+
+    def setValue_forHTTPHeaderField_(self, value, field):
+        self.headers[field] = value
+
+    def allHTTPHeaderFields(self):
+        return dict(self.headers)
+
+
+class NSURLConnection(NSObject):
+    def initWithRequest_delegate_(self, request, delegate):
+        self.request = request
+        self.delegate = delegate
+        self.cancelled = False
+        return self
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class NSURLCredential(NSObject):
+    pass
+
+
+class NSRunLoop(NSObject):
+    @classmethod
+    def currentRunLoop(cls):
+        return cls()
+
+    def runUntilDate_(self, date):
+        pass
+
+
+class NSPropertyListSerialization(NSObject):
+    @classmethod
+    def propertyListFromData_mutabilityOption_format_errorDescription_(
+            cls, data, option, plist_format, error):
+        try:
+            return plistlib.loads(bytes(data)), plist_format, None
+        except Exception as err:
+            return None, plist_format, str(err)
+
+    @classmethod
+    def dataFromPropertyList_format_errorDescription_(
+            cls, plist, plist_format, error):
+        return plistlib.dumps(plist), None
+
+
+class NSTimer(NSObject):
+    def __init__(self, interval, target, selector):
+        self.interval = interval
+        self.target = target
+        self.selector = selector
+        self.tolerance = 0
+
+    @classmethod
+    def scheduledTimerWithTimeInterval_target_selector_userInfo_repeats_(
+            cls, interval, target, selector, user_info, repeats):
+        return cls(interval, target, selector)
+
+    def setTolerance_(self, tolerance):
+        self.tolerance = tolerance
+
+    def invalidate(self):
+        pass
+
+
+class NSNotificationCenter(NSObject):
+    def __init__(self):
+        self.observers = []
+
+    def addObserver_selector_name_object_(self, observer, selector, name,
+                                          obj):
+        self.observers.append((observer, selector, name))
+
+    def removeObserver_(self, observer):
+        self.observers = [entry for entry in self.observers
+                          if entry[0] is not observer]
+
+    def postNotificationName_object_userInfo_deliverImmediately_(
+            self, name, obj, user_info, immediately):
+        pass
+
+
+class NSDistributedNotificationCenter(NSNotificationCenter):
+    _default = None
+
+    @classmethod
+    def defaultCenter(cls):
+        if cls._default is None:
+            cls._default = cls()
+        return cls._default
+
+
+def NSLog(format_string, *args):
+    pass
@@ -0,0 +1,8 @@
+# Stand-in for SystemConfiguration. See tools/benchmark.py.
+
+# (user name, uid, gid) of the console user
+CONSOLE_USER = ('bench', 501, 20)
+
+
+def SCDynamicStoreCopyConsoleUser(store, uid, gid):
+    return CONSOLE_USER
@@ -0,0 +1,14 @@
+# Stand-in for the parts of PyObjC's objc module nudge uses, so nudge can run
+# off macOS. See tools/benchmark.py.
+
+import builtins
+
+
+super = builtins.super
+
+
+def loadBundleFunctions(bundle, module_globals, functions):
+    '''Fill module_globals with a stand-in for each function, returning
+    None'''
+    for name, _ in functions:
+        module_globals[name] = lambda *args: None
@@ -0,0 +1,12 @@
+# Stand-in for the xattr module gurl uses, so gurl can run off macOS. Linux
+# only allows user. attributes, so names are stored under user.
+
+import os
+
+
+def getxattr(path, name):
+    return os.getxattr(path, 'user.' + name)
+
+
+def setxattr(path, name, value):
+    os.setxattr(path, 'user.' + name, value)
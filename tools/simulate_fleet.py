@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''simulate_fleet - show how a proposed nudge.json would hit a fleet.
+
+Reads an inventory CSV with serial, os_version, os_build and pending columns
+(pending is a space or semicolon separated list of Apple product keys) and
+prints, for each day of the rollout window, how many devices would be
+prompted at each timer tier.
+
+The version checks are the ones in decision.evaluate(), run once per unique
+OS version and build. The deadline and timer tier logic is then applied to
+the whole fleet at once with NumPy arrays. Pending updates are assumed to
+need a restart and days_between_notifications is not simulated, as both
+depend on the device at run time.
+'''
+import csv
+import json
+import optparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    '..', 'payload', 'Library', 'nudge', 'Resources'))
+import decision
+import devicefacts
+
+
+# Histogram columns, least to most aggressive
+TIERS = ['hidden', 'no_deadline', 'initial', 'day_3', 'day_1', 'final',
+         'elapsed']
+HIDDEN, NO_DEADLINE, INITIAL, DAY_3, DAY_1, FINAL, ELAPSED = range(len(TIERS))
+
+# What the version checks decided for a device
+COMPLIANT, MAJOR, MINOR = range(3)
+
+
+class Fleet(object):
+    '''Inventory as arrays, one entry per device'''
+    def __init__(self, status, earliest_force, has_pending):
+        self.status = status
+        self.earliest_force = earliest_force
+        self.has_pending = has_pending
+
+    def __len__(self):
+        return len(self.status)
+
+
+def epoch(date):
+    '''Seconds since the epoch for a naive UTC datetime'''
+    return (date - datetime(1970, 1, 1)).total_seconds()
+
+
+def load_fleet(inventory_path, nudge_json):
+    '''Read the inventory and classify each device. The version checks and
+    the software_updates lookup only run once per unique value.'''
+    catalog = decision.update_catalog(nudge_json.get('software_updates', []))
+
+    now = datetime.utcnow()
+    statuses = {}
+    earliest = {}
+    status, earliest_force, has_pending = [], [], []
+    with open(inventory_path, newline='') as f:
+        for row in csv.DictReader(f):
+            version_key = (row['os_version'], row['os_build'])
+            if version_key not in statuses:
+                facts = devicefacts.DeviceFacts(
+                    row['os_version'], row['os_build'], row['serial'])
+                plan = decision.evaluate(nudge_json, facts, now)
+                if plan.needs_scan:
+                    statuses[version_key] = MINOR
+                elif plan.show:
+                    statuses[version_key] = MAJOR
+                else:
+                    statuses[version_key] = COMPLIANT
+            status.append(statuses[version_key])
+
+            pending = row.get('pending') or ''
+            if pending not in earliest:
+                deadline = catalog.earliest(pending.replace(';', ' ').split())
+                earliest[pending] = np.inf if deadline is None else epoch(
+                    deadline)
+            earliest_force.append(earliest[pending])
+            has_pending.append(bool(pending.strip()))
+
+    return Fleet(np.array(status, dtype=np.int8),
+                 np.array(earliest_force, dtype=np.float64),
+                 np.array(has_pending, dtype=bool))
+
+
+def tiers_on(fleet, nudge_json, when):
+    '''Return each device's tier index at the UTC datetime when'''
+    nudge_prefs = nudge_json['preferences']
+    now = epoch(when)
+    shown = (fleet.status == MAJOR) | (
+        (fleet.status == MINOR) & fleet.has_pending)
+
+    # get_minimum_minor_update_days(): the earliest forced date of a pending
+    # update, capped at update_minor_days
+    update_minor_days = nudge_prefs.get('update_minor_days', 14)
+    with np.errstate(invalid='ignore'):
+        minimum_days = np.minimum(
+            update_minor_days,
+            np.rint((fleet.earliest_force - now) / 86400))
+
+    cut_off_date = nudge_prefs.get('cut_off_date', False)
+    if cut_off_date:
+        seconds = np.full(len(fleet),
+                          epoch(decision.parse_date(cut_off_date)) - now)
+        has_deadline = shown
+    else:
+        seconds = minimum_days * 86400
+        has_deadline = shown & (fleet.status == MINOR) & (minimum_days > 0)
+
+    warning = int(nudge_prefs.get('cut_off_date_warning', 3)) * 86400
+    tiers = np.select(
+        [~shown, ~has_deadline, seconds <= 0, seconds <= 3600,
+         seconds <= 86400, seconds < warning],
+        [HIDDEN, NO_DEADLINE, ELAPSED, FINAL, DAY_1, DAY_3],
+        default=INITIAL)
+    return tiers
+
+
+def simulate(fleet, nudge_json, start, days):
+    '''Return a days x tiers array of device counts'''
+    histogram = np.zeros((days, len(TIERS)), dtype=np.int64)
+    for day in range(days):
+        tiers = tiers_on(fleet, nudge_json, start + timedelta(days=day))
+        histogram[day] = np.bincount(tiers, minlength=len(TIERS))
+    return histogram
+
+
+def get_parsed_options():
+    '''Return the parsed options and args for this application.'''
+    usage = '%prog [options] nudge.json inventory.csv'
+    options = optparse.OptionParser(usage=usage)
+    options.add_option('--start', help=('Optional: First day of the window, '
+                                        'YYYY-MM-DD. Defaults to today.'))
+    options.add_option('--days', type='int', default=30,
+                       help=('Optional: Length of the window in days.'))
+    options.add_option('--json', action='store_true', default=False,
+                       help=('Optional: Print the histogram as JSON.'))
+    return options.parse_args()
+
+
+def main():
+    '''Main thread'''
+    opts, args = get_parsed_options()
+    if len(args) != 2:
+        print('Usage: simulate_fleet.py [options] nudge.json inventory.csv',
+              file=sys.stderr)
+        exit(1)
+    with open(args[0]) as f:
+        nudge_json = json.load(f)
+    if opts.start:
+        start = datetime.strptime(opts.start, '%Y-%m-%d')
+    else:
+        start = datetime.utcnow().replace(
+            hour=0, minute=0, second=0, microsecond=0)
+
+    started = time.time()
+    fleet = load_fleet(args[1], nudge_json)
+    loaded = time.time()
+    histogram = simulate(fleet, nudge_json, start, opts.days)
+    finished = time.time()
+
+    dates = [(start + timedelta(days=day)).strftime('%Y-%m-%d')
+             for day in range(opts.days)]
+    if opts.json:
+        print(json.dumps([dict(zip(['date'] + TIERS, [date] + row.tolist()))
+                          for date, row in zip(dates, histogram)], indent=4))
+    else:
+        print(','.join(['date'] + TIERS))
+        for date, row in zip(dates, histogram):
+            print(','.join([date] + [str(count) for count in row]))
+    print('Simulated %s devices x %s days: %.2fs loading, %.2fs simulating'
+          % (len(fleet), opts.days, loaded - started, finished - loaded),
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()